@@ -1,6 +1,7 @@
 # app.py
 import os
 import asyncio
+import json
 import logging
 import uuid
 from typing import List, Optional
@@ -24,6 +25,7 @@ from models.messages import (
     PlanWithSteps,
 )
 from helpers.utils import initialize_runtime_and_context, retrieve_all_agent_tools, rai_success
+from helpers.gexcollector import GexLevelStore, GEX_LEVEL_KINDS, run_gex_collector
 import asyncio
 from fastapi.middleware.cors import CORSMiddleware
 from event_utils import track_event_if_configured
@@ -81,6 +83,27 @@ app.add_middleware(
 app.add_middleware(HealthCheckMiddleware, password="", checks={})
 logging.info("Added health check middleware")
 
+# Levels stored by the GEX collector (helpers/gexcollector.py)
+gex_level_store = GexLevelStore(Config.GEX_DATA_PATH)
+gex_collector_task = None
+
+
+@app.on_event("startup")
+async def start_gex_collector():
+    """Start the GEX collector with the app (uvicorn app:app) when GEX_COLLECTOR_ENABLED is set."""
+    global gex_collector_task
+    if Config.GEX_COLLECTOR_ENABLED:
+        gex_collector_task = asyncio.create_task(
+            run_gex_collector(Config.GEX_WATCHLIST, Config.GEX_COLLECTOR_INTERVAL, dataPath=Config.GEX_DATA_PATH)
+        )
+        logging.info(f"GEX collector started for {Config.GEX_WATCHLIST}")
+
+
+@app.on_event("shutdown")
+async def stop_gex_collector():
+    if gex_collector_task is not None:
+        gex_collector_task.cancel()
+
 
 @app.post("/input_task")
 async def input_task_endpoint(input_task: InputTask, request: Request):
@@ -776,6 +799,53 @@ async def get_agent_tools():
     return retrieve_all_agent_tools()
 
 
+@app.get("/api/gex-levels/{symbol}")
+def get_gex_levels(
+    symbol: str,
+    start: Optional[str] = Query(None),
+    end: Optional[str] = Query(None),
+    kind: str = Query("flow_levels"),
+):
+    """
+    Retrieve the GEX and flow levels stored by the collector for a symbol.
+
+    ---
+    tags:
+      - GEX Levels
+    parameters:
+      - name: symbol
+        in: path
+        type: string
+        required: true
+        description: CBOE symbol, e.g. _SPX or SPY
+      - name: start
+        in: query
+        type: string
+        description: Earliest processTime, e.g. 2025-01-02 09:30
+      - name: end
+        in: query
+        type: string
+        description: Latest processTime
+      - name: kind
+        in: query
+        type: string
+        description: flow_levels (one record per expiration bucket) or gex_ladder
+    responses:
+      200:
+        description: Stored level records, oldest first
+      400:
+        description: Unknown kind
+      404:
+        description: Symbol not in the collector watchlist
+    """
+    if symbol not in Config.GEX_WATCHLIST:
+        raise HTTPException(status_code=404, detail=f"{symbol} is not collected, symbols: {Config.GEX_WATCHLIST}")
+    if kind not in GEX_LEVEL_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {GEX_LEVEL_KINDS}")
+    levels = gex_level_store.get_levels(symbol, start, end, kind)
+    return json.loads(levels.to_json(orient="records"))
+
+
 # Serve the frontend from the backend
 # app.mount("/", StaticFiles(directory="wwwroot"), name="wwwroot")
 
@@ -0,0 +1,249 @@
+"""
+Benchmark of the options pipeline on synthetic CBOE chains, without hitting CBOE.
+
+Run from src/backend:
+    python -m benchmarks.optionsbench                      # compare with the stored baseline
+    python -m benchmarks.optionsbench --save               # store a new baseline
+    python -m benchmarks.optionsbench --sizes 1000 10000   # only some chain sizes
+
+Every run also times a fixed numpy/pandas reference kernel, and each case is compared
+by its time relative to that kernel, so a baseline measured on one machine still
+holds on a faster or slower one. Exits with status 1 when a case is slower relative
+to the kernel, or uses more memory, than its baseline by more than the tolerance, or
+when there is no baseline.
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+import contextlib
+import numpy as np
+import pandas as pd
+from datetime import date, timedelta
+from scipy.special import ndtr
+from scipy.stats import norm
+from helpers.options import (BUCKET_SUFFIXES, get_cboe_option_data, find_zero_gamma_levels, get_bucket_membership,
+                             calc_bucket_flip_pain_points, get_gex_and_flow_levels)
+
+BENCHMARK_SIZES = [1000, 10000, 100000, 500000]
+BENCHMARK_BASELINE = os.path.join(os.path.dirname(__file__), 'optionsbench_baseline.json')
+# Allowed slowdown relative to the reference kernel, and growth of the peak memory
+BENCHMARK_TOLERANCE = 0.25
+BENCHMARK_MEMORY_TOLERANCE = 0.25
+# Rows of the reference kernel
+REFERENCE_ROWS = 200000
+
+def make_cboe_chain(num_contracts=10000, spot=5000.0, num_expiries=None, strike_step=5.0, root='SPXW',
+                    atm_vol=0.15, skew=0.3, smile=0.8, oi_peak=5000, oi_width=0.05, today=None, seed=0):
+    """
+    Deterministic synthetic chain in the CBOE delayed quotes JSON shape.
+
+    Expiries are every business day for a month then Fridays. Strikes are centered on
+    spot, IV follows a skewed smile (atm_vol - skew * log moneyness + smile * log
+    moneyness^2) and open interest a bell around spot of relative width oi_width with
+    round-number strikes boosted, plus seeded noise. Greeks are Black-Scholes at the IV.
+
+    :param num_contracts: Number of contracts (calls and puts), rounded to a full grid.
+    :param num_expiries: Number of expiries, defaults to about sqrt(num_contracts / 8).
+    :return: Dictionary with the structure of the CBOE JSON response.
+    """
+    rng = np.random.default_rng(seed)
+    today = today or date.today()
+    num_expiries = num_expiries or max(1, int(round(np.sqrt(num_contracts / 8))))
+    num_strikes = max(1, num_contracts // (2 * num_expiries))
+
+    expiries = []
+    day = today
+    while len(expiries) < num_expiries:
+        if day.weekday() < 5 and ((day - today).days <= 30 or day.weekday() == 4):
+            expiries.append(day)
+        day += timedelta(days=1)
+
+    strikes = spot + (np.arange(num_strikes) - num_strikes // 2) * strike_step
+    strikes = strikes[strikes > 0]
+    exp = np.repeat(np.array(expiries, dtype='datetime64[D]'), 2 * len(strikes))
+    K = np.tile(np.concatenate([strikes, strikes]), len(expiries))
+    is_call = np.tile(np.repeat([True, False], len(strikes)), len(expiries))
+
+    T = np.maximum(np.busday_count(np.datetime64(today, 'D'), exp), 1) / 262
+    moneyness = np.log(K / spot)
+    iv = np.maximum(atm_vol - skew * moneyness + smile * moneyness**2, 0.05) + rng.uniform(0, 0.01, len(K))
+    vol_sqrt_T = iv * np.sqrt(T)
+    d1 = (-moneyness + 0.5 * iv**2 * T) / vol_sqrt_T
+    d2 = d1 - vol_sqrt_T
+    delta = np.where(is_call, norm.cdf(d1), norm.cdf(d1) - 1)
+    gamma = norm.pdf(d1) / (spot * vol_sqrt_T)
+    vega = spot * norm.pdf(d1) * np.sqrt(T) / 100
+    theta = -spot * norm.pdf(d1) * iv / (2 * np.sqrt(T)) / 365
+    price = np.where(is_call, spot * norm.cdf(d1) - K * norm.cdf(d2), K * norm.cdf(-d2) - spot * norm.cdf(-d1))
+    rho = np.where(is_call, K * T * norm.cdf(d2), -K * T * norm.cdf(-d2)) / 100
+
+    round_strike = 1 + 2 * (K % (10 * strike_step) == 0)
+    oi = np.floor(oi_peak * np.exp(-0.5 * (moneyness / oi_width)**2) * round_strike / np.sqrt(1 + 20 * T)
+                  * rng.uniform(0.5, 1.5, len(K)))
+    volume = np.floor(oi * rng.uniform(0, 1, len(K)))
+    spread = np.maximum(0.05, 0.01 * price)
+    bid = np.maximum(0, np.round(price - spread / 2, 2))
+    ask = np.round(price + spread / 2, 2)
+
+    symbols = [f"{root}{e:%y%m%d}{'C' if c else 'P'}{int(round(k * 1000)):08d}"
+               for e, c, k in zip(exp.astype(object), is_call, K)]
+    columns = {
+        'option': symbols,
+        'bid': bid, 'bid_size': np.floor(rng.uniform(1, 100, len(K))),
+        'ask': ask, 'ask_size': np.floor(rng.uniform(1, 100, len(K))),
+        'iv': np.round(iv, 4), 'open_interest': oi, 'volume': volume,
+        'delta': np.round(delta, 4), 'gamma': np.round(gamma, 4), 'vega': np.round(vega, 4),
+        'theta': np.round(theta, 4), 'rho': np.round(rho, 4), 'theo': np.round(price, 4),
+        'change': np.zeros(len(K)), 'open': bid, 'high': ask, 'low': bid, 'tick': ['no_change'] * len(K),
+        'last_trade_price': np.round((bid + ask) / 2, 2), 'last_trade_time': [today.isoformat() + 'T15:59:59'] * len(K),
+        'percent_change': np.zeros(len(K)), 'prev_day_close': np.round(price, 2),
+    }
+    names = list(columns)
+    values = [column.tolist() if isinstance(column, np.ndarray) else column for column in columns.values()]
+    options = [dict(zip(names, row)) for row in zip(*values)]
+
+    return {
+        'timestamp': today.isoformat() + ' 16:00:00',
+        'data': {
+            'options': options,
+            'symbol': root, 'security_type': 'index', 'exchange_id': 5,
+            'current_price': spot + 1.0, 'price_change': 0.0, 'price_change_percent': 0.0,
+            'bid': spot, 'ask': spot + 2.0, 'bid_size': 0, 'ask_size': 0,
+            'open': spot, 'high': spot + 10.0, 'low': spot - 10.0, 'close': spot, 'prev_day_close': spot,
+            'volume': 0, 'iv30': atm_vol * 100, 'iv30_change': 0.0, 'iv30_change_percent': 0.0,
+            'seqno': 0, 'last_trade_time': today.isoformat() + 'T16:00:00', 'tick': 'no_change',
+        },
+    }
+
+def get_benchmark_cases(payload):
+    """Benchmarked calls on one chain, the shared DataFrame is prepared once outside the timings."""
+    df, dfAgg, spotPrice = get_cboe_option_data('SPX', payload)
+    df_sorted = df.sort_values(by=['ExpirationDate', 'StrikePrice'])
+    strikes = df_sorted['StrikePrice'].to_numpy()
+    membership = get_bucket_membership(df_sorted, (strikes >= 0.9 * spotPrice) & (strikes <= 1.1 * spotPrice),
+                                       tuple(BUCKET_SUFFIXES))
+    return {
+        'get_cboe_option_data': lambda: get_cboe_option_data('SPX', payload),
+        'find_zero_gamma_levels': lambda: find_zero_gamma_levels(df, 0.9 * spotPrice, 1.1 * spotPrice),
+        'calc_bucket_flip_pain_points': lambda: calc_bucket_flip_pain_points(df_sorted, membership),
+        'get_gex_and_flow_levels': lambda: get_gex_and_flow_levels('SPX', pd.Timestamp.now(), payload),
+    }
+
+def make_reference_kernel(rows=REFERENCE_ROWS, seed=0):
+    """
+    Fixed workload with the profile of the pipeline (normal density and distribution,
+    a sort and a groupby sum), whose time gives the speed of the machine.
+    """
+    rng = np.random.default_rng(seed)
+    x = rng.standard_normal(rows)
+    keys = rng.integers(0, 1000, rows)
+    return lambda: pd.DataFrame({'key': keys, 'value': ndtr(x) * np.exp(-0.5 * x * x)}).sort_values(
+        ['key', 'value']).groupby('key')['value'].sum()
+
+def measure(function, repeat=5, reference=None):
+    """
+    Best wall time of repeat runs, and the peak traced memory of one more run (MB).
+
+    :param reference: Reference kernel, timed after every run so both best times come from
+                      the same moments and 'relative' (time over kernel time) is not thrown
+                      off by the load of the machine drifting between cases.
+    """
+    seconds, reference_seconds = [], []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+        if reference is not None:
+            start = time.perf_counter()
+            reference()
+            reference_seconds.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    result = {'seconds': min(seconds), 'peak_mb': peak / 2**20}
+    if reference is not None:
+        result['relative'] = min(seconds) / min(reference_seconds)
+    return result
+
+def run_benchmarks(sizes=BENCHMARK_SIZES, repeat=5, seed=0):
+    """
+    Time every benchmark case on chains of the given sizes.
+
+    :return: Dictionary of case name to dictionary of size (as a string) to measurement,
+             with 'relative' the time over the time of the reference kernel.
+    """
+    reference = make_reference_kernel()
+    results = {}
+    for size in sizes:
+        payload = make_cboe_chain(size, seed=seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            cases = get_benchmark_cases(payload)
+            for name, function in cases.items():
+                results.setdefault(name, {})[str(size)] = measure(function, repeat, reference)
+        for name in cases:
+            result = results[name][str(size)]
+            print(f"{name:<30}{size:>8} contracts {result['seconds']:>9.3f}s {result['peak_mb']:>9.1f}MB "
+                  f"{result['relative']:>8.3f}x reference")
+    return results
+
+def compare_benchmarks(results, baseline, tolerance=BENCHMARK_TOLERANCE, memory_tolerance=BENCHMARK_MEMORY_TOLERANCE):
+    """Regressions of results against baseline, as printable messages."""
+    tolerances = {'relative': tolerance, 'peak_mb': memory_tolerance}
+    regressions = []
+    for name, sizes in results.items():
+        for size, result in sizes.items():
+            expected = baseline.get(name, {}).get(size)
+            if expected is None:
+                continue
+            for metric, allowed in tolerances.items():
+                if metric in expected and result[metric] > expected[metric] * (1 + allowed):
+                    regressions.append(f"REGRESSION {name} at {size} contracts: {metric} "
+                                       f"{result[metric]:.3f} > {expected[metric]:.3f} baseline (+{allowed:.0%})")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark helpers/options.py on synthetic CBOE chains")
+    parser.add_argument('--sizes', type=int, nargs='+', default=BENCHMARK_SIZES)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', default=BENCHMARK_BASELINE)
+    parser.add_argument('--tolerance', type=float, default=BENCHMARK_TOLERANCE, help="Allowed slowdown relative to the reference kernel")
+    parser.add_argument('--memory-tolerance', type=float, default=BENCHMARK_MEMORY_TOLERANCE,
+                        help="Allowed growth of the peak memory")
+    parser.add_argument('--save', action='store_true', help="Store the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.repeat)
+    if args.save:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r') as f:
+                baseline = json.load(f)
+        for name, sizes in results.items():
+            baseline.setdefault(name, {}).update(sizes)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=4)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save to create it")
+        return 1
+    with open(args.baseline, 'r') as f:
+        regressions = compare_benchmarks(results, json.load(f), args.tolerance, args.memory_tolerance)
+    for regression in regressions:
+        print(regression)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
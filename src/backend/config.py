@@ -44,6 +44,12 @@ class Config:
     APP_IN_CONTAINER = GetBoolConfig("APP_IN_CONTAINER")
     FRONTEND_SITE_NAME = GetOptionalConfig("FRONTEND_SITE_NAME", "http://127.0.0.1:3000")
 
+    # GEX level collector
+    GEX_COLLECTOR_ENABLED = GetBoolConfig("GEX_COLLECTOR_ENABLED")
+    GEX_WATCHLIST = [symbol.strip() for symbol in GetOptionalConfig("GEX_WATCHLIST", "_SPX,_NDX,_RUT,SPY,QQQ,IWM").split(",")]
+    GEX_COLLECTOR_INTERVAL = int(GetOptionalConfig("GEX_COLLECTOR_INTERVAL", "60"))
+    GEX_DATA_PATH = GetOptionalConfig("GEX_DATA_PATH", os.path.join("data", "gex"))
+
     # Cached clients
     __cosmos_client = None
     __cosmos_database = None
@@ -0,0 +1 @@
+# Puts src/backend on sys.path so the tests import the app modules (helpers.options, ...) like app.py does.
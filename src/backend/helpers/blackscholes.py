@@ -0,0 +1,252 @@
+import functools
+import numpy as np
+from scipy.special import ndtr
+
+# Outputs of calc_black_scholes
+BS_OUTPUTS = ('price', 'delta', 'gamma', 'vega', 'theta', 'rho', 'vanna', 'charm')
+
+# Units of the CBOE greeks: vega per vol point, theta per calendar day, rho per rate point.
+# Vanna (per unit of vol) and charm (per year) keep the units of the spot ladder.
+VEGA_SCALE = 0.01
+THETA_SCALE = 1 / 365
+RHO_SCALE = 0.01
+
+SQRT_2PI = np.sqrt(2 * np.pi)
+
+def norm_pdf(x, out=None):
+    """Standard normal density, in place when out is given."""
+    if out is None:
+        return np.exp(-0.5 * x * x) / SQRT_2PI
+    np.multiply(x, x, out=out)
+    out *= -0.5
+    np.exp(out, out=out)
+    out /= SQRT_2PI
+    return out
+
+def norm_cdf(x, out=None):
+    """Standard normal distribution function (scipy's ndtr ufunc, what norm.cdf calls without the overhead)."""
+    return ndtr(x, out=out)
+
+def calc_log_moneyness(S, K):
+    """log(S / K). In float32 S / K rounds near the money, log1p of the exact difference keeps the digits."""
+    if np.result_type(S, K) == np.float32:
+        return np.log1p((S - K) / K)
+    return np.log(S / K)
+
+def allocate_black_scholes_outputs(shape, outputs=BS_OUTPUTS, dtype=np.float64):
+    """Output arrays for calc_black_scholes, allocate once and pass as out= for repeated batches."""
+    return {name: np.empty(shape, dtype=dtype) for name in outputs}
+
+def calc_black_scholes(S, K, T, vol, r=0.0, q=0.0, put=False, outputs=BS_OUTPUTS, out=None, dtype=np.float64):
+    """
+    Black-Scholes-Merton prices and greeks of a batch of European options.
+
+    Every input broadcasts against the others, e.g. S as a (levels, 1) column against
+    (contracts,) rows evaluates a spot ladder. d1, d2, the discount factors and the
+    normal density and distribution are computed once and shared by all outputs, and
+    every output is written in place into its array of out.
+
+    Contracts without time to expiry or volatility are valued at their discounted
+    intrinsic value: delta is a step at the forward, the other greeks are zero.
+
+    :param S: Spot price(s).
+    :param K: Strike(s).
+    :param T: Time to expiry in years.
+    :param vol: Implied volatility (0.2 for 20%).
+    :param r: Continuously compounded risk free rate.
+    :param q: Continuous dividend yield.
+    :param put: True for puts, False for calls, or a boolean array.
+    :param outputs: Names from BS_OUTPUTS to compute.
+    :param out: Dictionary of preallocated arrays of the broadcast shape (see
+                allocate_black_scholes_outputs), missing ones are allocated.
+    :return: Dictionary of output name to array. Vega is per vol point, theta per
+             calendar day, rho per rate point (the CBOE units), vanna is dDelta/dvol
+             and charm is -dDelta/dT per year.
+    """
+    S, K, T, vol, r, q = (np.asarray(x, dtype=dtype) for x in (S, K, T, vol, r, q))
+    shape = np.broadcast_shapes(S.shape, K.shape, T.shape, vol.shape, r.shape, q.shape, np.shape(put))
+    out = {} if out is None else out
+    for name in outputs:
+        if name not in out:
+            out[name] = np.empty(shape, dtype=dtype)
+
+    valid = (T > 0) & (vol > 0)
+    expired = None
+    if not valid.all():
+        # Dummy values keep the invalid rows finite, they are overwritten at the end
+        expired = (np.broadcast_to(~valid, shape), S, K, np.maximum(T, 0), r, q)
+        T = np.where(valid, T, 1)
+        vol = np.where(valid, vol, 1)
+    sign = np.where(put, -1.0, 1.0).astype(dtype, copy=False)
+    # Only the intermediates of the requested outputs are computed, e.g. a gamma and vanna
+    # ladder needs neither N(d1) nor N(d2)
+    needs = set(outputs)
+    has_q = bool(np.any(q != 0))
+
+    sqrt_T = np.sqrt(T)
+    vol_sqrt_T = vol * sqrt_T
+    dq = np.exp(-q * T)
+    dr = np.exp(-r * T)
+    d1 = calc_log_moneyness(S, K)
+    d1 = d1 + (r - q + 0.5 * vol * vol) * T
+    d1 /= vol_sqrt_T
+    if needs & {'price', 'theta', 'rho', 'vanna', 'charm'}:
+        d2 = d1 - vol_sqrt_T
+    if needs & {'gamma', 'vega', 'theta', 'vanna', 'charm'}:
+        pdf = norm_pdf(d1, out=np.empty_like(d1))
+        # exp(-qT) is 1 without a dividend yield, which saves a pass over the ladder
+        dq_pdf = dq * pdf if has_q else pdf
+    # N(sign * d1) and N(sign * d2) give the call and put terms in one expression
+    if np.ndim(put) == 0:
+        signed = np.negative if put else np.asarray
+    else:
+        signed = functools.partial(np.multiply, sign)
+    if needs & {'price', 'delta', 'theta'} or ('charm' in needs and has_q):
+        Nd1 = norm_cdf(signed(d1))
+    if needs & {'price', 'theta', 'rho'}:
+        Nd2 = norm_cdf(signed(d2))
+    if needs & {'price', 'vega', 'theta'}:
+        S_dq = S * dq
+    if needs & {'price', 'theta', 'rho'}:
+        K_dr = K * dr
+
+    if 'price' in outputs:
+        np.multiply(sign, S_dq * Nd1 - K_dr * Nd2, out=out['price'])
+    if 'delta' in outputs:
+        np.multiply(sign * dq, Nd1, out=out['delta'])
+    if 'gamma' in outputs:
+        np.divide(dq_pdf, S * vol_sqrt_T, out=out['gamma'])
+    if 'vega' in outputs:
+        np.multiply(S_dq * pdf, sqrt_T * VEGA_SCALE, out=out['vega'])
+    if 'theta' in outputs:
+        theta = np.multiply(S_dq * pdf, -0.5 * vol / sqrt_T, out=out['theta'])
+        theta -= sign * r * K_dr * Nd2
+        theta += sign * q * S_dq * Nd1
+        theta *= THETA_SCALE
+    if 'rho' in outputs:
+        np.multiply(sign * K_dr * T, Nd2 * RHO_SCALE, out=out['rho'])
+    if 'vanna' in outputs:
+        np.multiply(dq_pdf, d2 / -vol, out=out['vanna'])
+    if 'charm' in outputs:
+        factor = d2 / (2 * T)
+        if np.any(r != q):
+            factor -= (r - q) / vol_sqrt_T
+        charm = np.multiply(dq_pdf, factor, out=out['charm'])
+        if has_q:
+            charm += sign * q * dq * Nd1
+
+    if expired is not None:
+        set_intrinsic_values(out, outputs, *expired, sign)
+    return out
+
+def set_intrinsic_values(out, outputs, expired, S, K, T, r, q, sign):
+    """Overwrite the expired (or zero volatility) contracts with their discounted intrinsic value."""
+    S, K, T, r, q, sign = (np.broadcast_to(x, expired.shape)[expired] for x in (S, K, T, r, q, sign))
+    dq = np.exp(-q * T)
+    forward_value = sign * (S * dq - K * np.exp(-r * T))
+    for name in outputs:
+        if name == 'price':
+            out[name][expired] = np.maximum(forward_value, 0)
+        elif name == 'delta':
+            out[name][expired] = np.where(forward_value > 0, sign * dq, 0)
+        else:
+            out[name][expired] = 0
+
+# Implied volatility solver settings
+IV_TOLERANCE = 1e-8
+IV_MAX_ITERATIONS = 50
+IV_MIN = 1e-4
+IV_MAX = 10.0
+
+def get_implied_vol_guess(call, S_dq, K_dr, T):
+    """
+    Corrado-Miller approximation of the implied volatility from a call price, which
+    is accurate near the money. Where its square root is negative (far from the money)
+    the Brenner-Subrahmanyam at the money guess sqrt(2pi / T) * call / S is used.
+    """
+    half_moneyness = 0.5 * (S_dq - K_dr)
+    excess = call - half_moneyness
+    root = excess * excess - 4 * half_moneyness * half_moneyness / np.pi
+    guess = np.sqrt(2 * np.pi / T) / (S_dq + K_dr) * (excess + np.sqrt(np.maximum(root, 0)))
+    guess = np.where(root >= 0, guess, np.sqrt(2 * np.pi / T) * call / S_dq)
+    return np.clip(np.nan_to_num(guess, nan=0.2), IV_MIN, IV_MAX)
+
+def calc_implied_vol(price, S, K, T, r=0.0, q=0.0, put=False, tol=IV_TOLERANCE, max_iter=IV_MAX_ITERATIONS,
+                     dtype=np.float64):
+    """
+    Implied volatility of a batch of European option prices.
+
+    Puts are turned into calls with put-call parity, then every contract starts from the
+    Corrado-Miller guess and takes Halley steps (Newton with the volga correction). Each
+    contract keeps a [low, high] bracket of its root: a step leaving the bracket or
+    without vega is replaced by a bisection. Only the contracts that have not converged
+    are evaluated on each iteration.
+
+    :param price: Option prices, e.g. the bid/ask mid.
+    :param S, K, T, r, q, put: As in calc_black_scholes.
+    :param tol: Convergence tolerance on the volatility.
+    :param max_iter: Maximum number of iterations.
+    :return: (implied volatility array, converged boolean array). Prices outside the
+             no-arbitrage bounds, or contracts without time to expiry, give NaN and
+             False. Contracts that hit max_iter keep their last estimate, with False.
+    """
+    price, S, K, T, r, q = np.broadcast_arrays(*(np.asarray(x, dtype=dtype) for x in (price, S, K, T, r, q)))
+    put = np.broadcast_to(np.asarray(put, dtype=bool), price.shape)
+    shape = price.shape
+    price, S, K, T, r, q, put = (x.ravel() for x in (price, S, K, T, r, q, put))
+
+    S_dq = S * np.exp(-q * T)
+    K_dr = K * np.exp(-r * T)
+    call = np.where(put, price + S_dq - K_dr, price)
+
+    vol = np.full(len(price), np.nan, dtype=dtype)
+    converged = np.zeros(len(price), dtype=bool)
+    # A call is worth between its discounted intrinsic value and the discounted spot
+    solvable = (T > 0) & (call > np.maximum(S_dq - K_dr, 0)) & (call < S_dq)
+    rows = np.flatnonzero(solvable)
+    if len(rows) == 0:
+        return vol.reshape(shape), converged.reshape(shape)
+
+    target, S_dq, K_dr, T = call[rows], S_dq[rows], K_dr[rows], T[rows]
+    sqrt_T = np.sqrt(T)
+    log_forward = np.log(S_dq / K_dr)
+    sigma = get_implied_vol_guess(target, S_dq, K_dr, T)
+    low = np.full(len(rows), IV_MIN, dtype=dtype)
+    high = np.full(len(rows), IV_MAX, dtype=dtype)
+    active = np.arange(len(rows))
+
+    for _ in range(max_iter):
+        s, sqt, lf, sd, kd = sigma[active], sqrt_T[active], log_forward[active], S_dq[active], K_dr[active]
+        vol_sqrt_T = s * sqt
+        d1 = lf / vol_sqrt_T + 0.5 * vol_sqrt_T
+        d2 = d1 - vol_sqrt_T
+        error = sd * norm_cdf(d1) - kd * norm_cdf(d2) - target[active]
+        vega = sd * norm_pdf(d1) * sqt
+        volga = vega * d1 * d2 / s
+
+        # The call price increases with the volatility, the root is below s when the error is positive
+        above = error > 0
+        high[active] = np.where(above, s, high[active])
+        low[active] = np.where(above, low[active], s)
+
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            newton = error / vega
+            # Halley's correction, Newton where it is large (far from the root)
+            correction = 0.5 * newton * volga / vega
+            step = np.where(np.abs(correction) < 0.5, newton / (1 - correction), newton)
+        new = s - step
+        lo, hi = low[active], high[active]
+        bisect = ~np.isfinite(new) | (new < lo) | (new > hi)
+        new = np.where(bisect, 0.5 * (lo + hi), new)
+        new[error == 0] = s[error == 0]
+
+        # The Newton step is the distance to the root near it, Halley's step can be damped far from it
+        done = (np.abs(newton) < tol) | (error == 0) | (hi - lo < tol)
+        sigma[active] = new
+        converged[rows[active[done]]] = True
+        active = active[~done]
+        if len(active) == 0:
+            break
+
+    vol[rows] = sigma
+    return vol.reshape(shape), converged.reshape(shape)
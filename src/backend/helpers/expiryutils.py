@@ -0,0 +1,146 @@
+import functools
+import numpy as np
+import pandas as pd
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+# Business days per year used to annualize the time to expiry
+BUSINESS_DAYS_PER_YEAR = 262
+# Options expire at the 16:00 close
+EXPIRY_HOUR = 16
+# Expirations, level processTimes and price bars are naive times of this timezone
+MARKET_TIMEZONE = ZoneInfo("America/New_York")
+
+def get_easter(year):
+    """Gregorian Easter Sunday (anonymous algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def get_nth_weekday(year, month, weekday, n):
+    """n-th weekday (0 = Monday) of a month, n = -1 for the last one."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def get_observed(holiday):
+    """Saturday holidays are observed on Friday, Sunday holidays on Monday."""
+    if holiday.weekday() == 5:
+        return holiday - timedelta(days=1)
+    if holiday.weekday() == 6:
+        return holiday + timedelta(days=1)
+    return holiday
+
+class HolidayCalendar:
+    """
+    Exchange holiday calendar, the base class has no holidays.
+
+    Subclasses implement holidays(year). get_busdaycalendar() turns them into a
+    np.busdaycalendar that np.busday_count can use, cached per year range.
+    """
+
+    def __init__(self, extra_holidays=()):
+        """:param extra_holidays: Additional closures, e.g. national days of mourning."""
+        self.extra_holidays = [pd.Timestamp(d).date() for d in extra_holidays]
+
+    def holidays(self, year):
+        return []
+
+    @functools.lru_cache(maxsize=16)
+    def get_busdaycalendar(self, start_year, end_year):
+        days = [d for year in range(start_year, end_year + 1) for d in self.holidays(year)]
+        days += [d for d in self.extra_holidays if start_year <= d.year <= end_year]
+        return np.busdaycalendar(weekmask='1111100', holidays=np.array(days, dtype='datetime64[D]'))
+
+class USExchangeHolidayCalendar(HolidayCalendar):
+    """Full day NYSE / Cboe holidays from their observance rules (early closes are not modeled)."""
+
+    def holidays(self, year):
+        days = [
+            get_nth_weekday(year, 1, 0, 3),              # Martin Luther King Jr. Day
+            get_nth_weekday(year, 2, 0, 3),              # Washington's Birthday
+            get_easter(year) - timedelta(days=2),        # Good Friday
+            get_nth_weekday(year, 5, 0, -1),             # Memorial Day
+            get_observed(date(year, 7, 4)),              # Independence Day
+            get_nth_weekday(year, 9, 0, 1),              # Labor Day
+            get_nth_weekday(year, 11, 3, 4),             # Thanksgiving Day
+            get_observed(date(year, 12, 25)),            # Christmas Day
+        ]
+        # New Year's Day falling on a Saturday is not observed on the Friday before
+        if date(year, 1, 1).weekday() != 5:
+            days.append(get_observed(date(year, 1, 1)))
+        if year >= 2022:
+            days.append(get_observed(date(year, 6, 19)))  # Juneteenth
+        return sorted(days)
+
+# Default calendar of get_years_till_exp, replace with set_holiday_calendar()
+HOLIDAY_CALENDAR = USExchangeHolidayCalendar()
+
+def set_holiday_calendar(calendar):
+    """Set the default holiday calendar, HolidayCalendar() for weekends only."""
+    global HOLIDAY_CALENDAR
+    HOLIDAY_CALENDAR = calendar
+
+@functools.lru_cache(maxsize=64)
+def get_business_days_till_exp(today, expiries, calendar):
+    """
+    Business days in [today, expiry) for every unique expiry date, cached per (date, expiry set).
+
+    :param today: np.datetime64 day.
+    :param expiries: Tuple of np.datetime64 days.
+    :param calendar: HolidayCalendar.
+    :return: Read-only integer array aligned with expiries.
+    """
+    expiries = np.array(expiries, dtype='datetime64[D]')
+    days = np.busday_count(today, expiries, busdaycal=get_busdaycalendar(today, expiries, calendar))
+    days.flags.writeable = False
+    return days
+
+def get_busdaycalendar(today, expiries, calendar):
+    """np.busdaycalendar of calendar covering today and every expiry."""
+    start_year = today.astype('datetime64[Y]').astype(int) + 1970
+    end_year = max(start_year, expiries.max().astype('datetime64[Y]').astype(int) + 1970 if len(expiries) else start_year)
+    return calendar.get_busdaycalendar(int(start_year), int(end_year))
+
+def get_years_till_exp(expirations, now=None, calendar=None, intraday=False):
+    """
+    Time to expiry in years of BUSINESS_DAYS_PER_YEAR business days, for every row.
+
+    The business days are counted with one np.busday_count over the unique expiry
+    dates, skipping the holidays of the calendar, and broadcast back to the rows.
+
+    :param expirations: Expiration dates (any datetime-like array).
+    :param now: Reference time, defaults to datetime.now().
+    :param calendar: HolidayCalendar, defaults to HOLIDAY_CALENDAR.
+    :param intraday: False counts whole business days with a one day floor for 0DTE.
+                     True adds the fraction of the day left until the EXPIRY_HOUR close,
+                     so the time to expiry decreases continuously and 0DTE reaches 0 at the close.
+    :return: np.array of years.
+    """
+    now = pd.Timestamp(now or datetime.now())
+    calendar = calendar or HOLIDAY_CALENDAR
+    days = np.asarray(expirations, dtype='datetime64[D]')
+    expiries, inverse = np.unique(days, return_inverse=True)
+
+    today = np.datetime64(now.date(), 'D')
+    count = get_business_days_till_exp(today, tuple(expiries), calendar).astype(np.float64)
+    if intraday:
+        if np.is_busday(today, busdaycal=get_busdaycalendar(today, expiries, calendar)):
+            close = now.normalize() + pd.Timedelta(hours=EXPIRY_HOUR)
+            count += (close - now) / pd.Timedelta(days=1)
+        else:
+            count += 1
+    else:
+        # For 0DTE options, I'm setting DTE = 1 day, otherwise they get excluded
+        count[count == 0] = 1
+    return count[inverse.reshape(days.shape)] / BUSINESS_DAYS_PER_YEAR
@@ -0,0 +1,303 @@
+# helpers/gexbacktest.py
+"""
+Backtest of the stored GEX levels against the underlying price.
+
+Run from src/backend:
+    python -m helpers.gexbacktest --symbols _SPX SPY --start 2026-01-01 --end 2026-06-30
+"""
+import argparse
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from zoneinfo import ZoneInfo
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from helpers.gexcollector import GEX_DATA_PATH, MARKET_TIMEZONE, GexLevelStore
+from helpers.options import BUCKET_SUFFIXES
+
+# Levels scored for each kind of stored record
+BACKTEST_LEVELS = {
+    'flow_levels': ['zero_gamma', 'zero_vanna', 'gamma_flip1', 'gamma_flip2', 'pain_oi_strike', 'pain_volume_strike',
+                    'call_resistance_oi', 'put_support_oi', 'call_resistance_gex_oi', 'put_support_gex_oi',
+                    'call_resistance_wall', 'put_support_wall', 'call_resistance_net_gex_oi', 'put_support_net_gex_oi'],
+    'gex_ladder': ['call_wall', 'put_wall', 'max_call_strike', 'max_put_strike'],
+}
+# Expiration bucket of the flow levels (see BUCKET_SUFFIXES)
+BACKTEST_BUCKET = 'All'
+BACKTEST_HORIZON = pd.Timedelta(minutes=60)
+# Oldest price accepted as the price at a snapshot
+BACKTEST_MAX_PRICE_AGE = pd.Timedelta(minutes=5)
+# yfinance keeps 1m bars for 30 days and 5m bars for 60 days, use 1h bars for longer runs
+BACKTEST_PRICE_INTERVAL = '5m'
+# Timezone of the stored processTimes, the collector stamps New York time. Logs written
+# before that are in the server timezone (UTC in the Docker image).
+BACKTEST_LEVEL_TIMEZONE = MARKET_TIMEZONE
+
+# CBOE index symbols to Yahoo symbols
+YF_SYMBOLS = {'_SPX': '^GSPC', '_NDX': '^NDX', '_RUT': '^RUT', '_VIX': '^VIX'}
+
+def get_underlying_prices(symbol, start, end, interval=BACKTEST_PRICE_INTERVAL):
+    """
+    Intraday bars of the underlying of a CBOE symbol from Yahoo.
+
+    :return: pd.DataFrame with 'High', 'Low' and 'Close' columns, indexed by the naive New
+             York time of the end of each bar (when its close is known).
+    """
+    history = yf.Ticker(YF_SYMBOLS.get(symbol, symbol)).history(start=start, end=end, interval=interval)
+    if len(history) == 0:
+        raise ValueError(f"No {interval} prices for {symbol} between {start} and {end}")
+    index = history.index.tz_convert(MARKET_TIMEZONE).tz_localize(None) + pd.Timedelta(interval.replace('m', 'min'))
+    return pd.DataFrame({name: history[name].to_numpy(dtype=np.float64) for name in ('High', 'Low', 'Close')},
+                        index=index)
+
+def get_price_arrays(prices):
+    """(times, high, low, close) sorted arrays of a price DataFrame, or of a Series of closes."""
+    if isinstance(prices, pd.Series):
+        prices = pd.DataFrame({'Close': prices})
+    prices = prices[~prices.index.duplicated(keep='last')].sort_index()
+    close = prices['Close'].to_numpy(dtype=np.float64)
+    high = prices['High'].to_numpy(dtype=np.float64) if 'High' in prices else close
+    low = prices['Low'].to_numpy(dtype=np.float64) if 'Low' in prices else close
+    return pd.DatetimeIndex(prices.index).to_numpy(dtype='datetime64[ns]'), high, low, close
+
+def convert_naive_times(times, fromZone, toZone, nonexistent='NaT'):
+    """Naive times of one timezone as naive times of another, ambiguous (DST) times become NaT."""
+    times = pd.DatetimeIndex(times)
+    if str(fromZone) == str(toZone):
+        return times
+    return times.tz_localize(fromZone, ambiguous='NaT', nonexistent=nonexistent).tz_convert(toZone).tz_localize(None)
+
+def get_period_end(end):
+    """
+    End of a backtest period as (Timestamp, exclusive). An end without a time (midnight), e.g.
+    '2026-06-30', covers its whole day and ends before the next midnight, like the price
+    fetch. An end with a time is inclusive.
+    """
+    if end is None:
+        return None, False
+    end = pd.Timestamp(end)
+    if end == end.normalize():
+        return end + pd.Timedelta(days=1), True
+    return end, False
+
+def load_level_snapshots(store, symbol, start=None, end=None, kind='flow_levels', bucket=BACKTEST_BUCKET, levels=None,
+                         timezone=BACKTEST_LEVEL_TIMEZONE):
+    """
+    Stored levels of a symbol as arrays, one row per processTime (the last record wins).
+
+    :param start, end: Period of the snapshots in New York time, see get_period_end for the end.
+    :param bucket: Expiration bucket of the flow levels, their stored keys carry its BUCKET_SUFFIXES suffix.
+    :param levels: Level names without the bucket suffix, defaults to BACKTEST_LEVELS[kind].
+    :param timezone: Timezone of the stored processTimes, they are converted to naive New
+                     York time to line up with get_underlying_prices.
+    :return: (datetime64 snapshot times, (snapshots x levels) float array), null levels are
+             NaN. Raises ValueError for an unknown bucket or a level no stored record has.
+    """
+    levels = BACKTEST_LEVELS[kind] if levels is None else levels
+    if kind == 'flow_levels' and bucket not in BUCKET_SUFFIXES:
+        raise ValueError(f"Unknown bucket {bucket}, buckets: {list(BUCKET_SUFFIXES)}")
+    columns = [name + BUCKET_SUFFIXES[bucket] for name in levels] if kind == 'flow_levels' else list(levels)
+    timezone = ZoneInfo(timezone) if isinstance(timezone, str) else timezone
+    end, exclusive = get_period_end(end)
+    # The store filters on the stored processTime strings, its end is inclusive
+    storeStart, storeEnd = [None if time is None else convert_naive_times([time], MARKET_TIMEZONE, timezone,
+                                                                          nonexistent='shift_forward')[0]
+                            for time in (None if start is None else pd.Timestamp(start), end)]
+    frame = store.get_levels(symbol, storeStart, storeEnd, kind)
+    if kind == 'flow_levels' and len(frame):
+        frame = frame[frame['expiration'] == bucket]
+    if len(frame) == 0:
+        return np.array([], dtype='datetime64[ns]'), np.empty((0, len(levels)))
+    missing = [name for name in columns if name not in frame]
+    if missing:
+        raise ValueError(f"No {', '.join(missing)} in the stored {kind} of {symbol}")
+    frame = frame.drop_duplicates('processTime', keep='last').sort_values('processTime')
+    times = convert_naive_times(pd.to_datetime(frame['processTime']), timezone, MARKET_TIMEZONE)
+    keep = ~times.isna()
+    if exclusive:
+        keep &= times < end
+    frame = frame[keep]
+    values = np.column_stack([pd.to_numeric(frame[name], errors='coerce').to_numpy(dtype=np.float64)
+                              for name in columns])
+    return times[keep].to_numpy(dtype='datetime64[ns]'), values.reshape(len(frame), len(levels))
+
+def get_forward_windows(times, priceTimes, high, low, close, horizon=BACKTEST_HORIZON, max_age=BACKTEST_MAX_PRICE_AGE):
+    """
+    As-of join of snapshot times with the price bars.
+
+    The entry price is the last close at or before each snapshot (no older than max_age),
+    the window is the bars after it up to the horizon. The high and low of every window
+    come from one reduceat over the (start, stop) index pairs.
+
+    :return: Dictionary of 'valid', 'entry', 'high', 'low', 'exit' (last close of the
+             window) and 'previous' (close one horizon before the snapshot) arrays.
+    """
+    entryIndex = np.searchsorted(priceTimes, times, side='right') - 1
+    start = entryIndex + 1
+    stop = np.searchsorted(priceTimes, times + np.timedelta64(horizon), side='right')
+    previousIndex = np.searchsorted(priceTimes, times - np.timedelta64(horizon), side='right') - 1
+
+    valid = (entryIndex >= 0) & (stop > start)
+    valid[valid] &= times[valid] - priceTimes[entryIndex[valid]] <= np.timedelta64(max_age)
+    # Sentinels make the index len(prices) of an empty window at the end valid for reduceat
+    pairs = np.column_stack([start, stop]).ravel()
+    windowHigh = np.maximum.reduceat(np.append(high, -np.inf), pairs)[::2]
+    windowLow = np.minimum.reduceat(np.append(low, np.inf), pairs)[::2]
+
+    def at(index):
+        return np.where(index >= 0, close[np.clip(index, 0, len(close) - 1)], np.nan)
+
+    return {'valid': valid, 'entry': at(entryIndex), 'high': windowHigh, 'low': windowLow,
+            'exit': at(stop - 1), 'previous': at(previousIndex)}
+
+def calc_level_hit_rates(levels, names, windows, tolerance=0.0):
+    """
+    Hit rates of every level over the forward windows.
+
+    touch_rate: share of the snapshots where the price traded through the level (within
+    tolerance) before the horizon. hold_rate: share of the touches that ended the window
+    back on the side of the entry price, i.e. the level acted as support or resistance.
+
+    :param levels: (snapshots x levels) array, NaN or non-positive values are skipped.
+    :return: pd.DataFrame indexed by level name.
+    """
+    entry = windows['entry'][:, None]
+    usable = windows['valid'][:, None] & np.isfinite(levels) & (levels > 0)
+    touched = usable & (windows['low'][:, None] - tolerance <= levels) & (levels <= windows['high'][:, None] + tolerance)
+    held = touched & (np.sign(windows['exit'][:, None] - levels) == np.sign(entry - levels))
+    above = usable & (levels > entry)
+    distance = np.where(usable, np.abs(levels - entry) / entry, 0)
+
+    samples = usable.sum(axis=0)
+    touches = touched.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pd.DataFrame({
+            'samples': samples,
+            'touch_rate': touches / samples,
+            'hold_rate': held.sum(axis=0) / touches,
+            'above_rate': above.sum(axis=0) / samples,
+            'mean_distance': distance.sum(axis=0) / samples,
+        }, index=pd.Index(names, name='level'))
+
+def calc_zero_gamma_regimes(zeroGamma, windows, tolerance=0.0):
+    """
+    Price behaviour above (positive gamma) and below (negative gamma) the zero gamma level.
+
+    reversal_rate: share of the snapshots whose forward move over the horizon has the
+    opposite sign of the move over the previous horizon, i.e. mean reversion. mean_move
+    and mean_range are the absolute forward move and the window high - low relative to
+    the entry price, cross_rate the share of windows trading through zero gamma.
+
+    :return: pd.DataFrame indexed by regime ('positive', 'negative').
+    """
+    entry = windows['entry']
+    usable = windows['valid'] & np.isfinite(zeroGamma) & (zeroGamma > 0)
+    forward = windows['exit'] - entry
+    backward = entry - windows['previous']
+    moved = usable & (forward != 0) & (backward != 0) & np.isfinite(backward)
+    reversal = moved & (np.sign(forward) == -np.sign(backward))
+    crossed = usable & (windows['low'] - tolerance <= zeroGamma) & (zeroGamma <= windows['high'] + tolerance)
+
+    rows = {}
+    for regime, mask in (('positive', usable & (entry > zeroGamma)), ('negative', usable & (entry <= zeroGamma))):
+        samples = mask.sum()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rows[regime] = {
+                'samples': samples,
+                'reversal_rate': reversal[mask].sum() / moved[mask].sum(),
+                'mean_move': np.mean(np.abs(forward[mask]) / entry[mask]) if samples else np.nan,
+                'mean_range': np.mean((windows['high'][mask] - windows['low'][mask]) / entry[mask]) if samples else np.nan,
+                'cross_rate': crossed[mask].sum() / samples,
+            }
+    return pd.DataFrame.from_dict(rows, orient='index').rename_axis('regime')
+
+def backtest_gex_levels(symbol, start, end, prices=None, horizon=BACKTEST_HORIZON, bucket=BACKTEST_BUCKET,
+                        tolerance=0.0, dataPath=GEX_DATA_PATH, max_age=BACKTEST_MAX_PRICE_AGE,
+                        timezone=BACKTEST_LEVEL_TIMEZONE):
+    """
+    Score the levels stored by the collector for a symbol against its price.
+
+    :param symbol: CBOE symbol of the stored levels.
+    :param start, end: Period of the snapshots, an end without a time includes its whole day.
+    :param prices: Price DataFrame ('Close', optional 'High' and 'Low') or Series of closes
+                   indexed by naive New York time, fetched with get_underlying_prices when None.
+    :param horizon: Forward window of each snapshot.
+    :param bucket: Expiration bucket of the flow levels.
+    :param tolerance: Distance in price units counted as a touch.
+    :param timezone: Timezone of the stored processTimes, see load_level_snapshots.
+    :return: (level hit rates DataFrame, zero gamma regimes DataFrame).
+    """
+    if prices is None:
+        prices = get_underlying_prices(symbol, pd.Timestamp(start), pd.Timestamp(end) + pd.Timedelta(days=1))
+    priceTimes, high, low, close = get_price_arrays(prices)
+    store = GexLevelStore(dataPath)
+
+    hitRates = []
+    regimes = None
+    for kind, names in BACKTEST_LEVELS.items():
+        times, levels = load_level_snapshots(store, symbol, start, end, kind, bucket, names, timezone)
+        windows = get_forward_windows(times, priceTimes, high, low, close, horizon, max_age)
+        hitRates.append(calc_level_hit_rates(levels, names, windows, tolerance))
+        if 'zero_gamma' in names:
+            regimes = calc_zero_gamma_regimes(levels[:, names.index('zero_gamma')], windows, tolerance)
+    return pd.concat(hitRates), regimes
+
+def run_gex_backtests(symbols, start, end, prices=None, max_workers=None, **kwargs):
+    """
+    Backtest several symbols, one process per symbol.
+
+    :param prices: Optional dictionary of symbol to prices, see backtest_gex_levels.
+    :param kwargs: Other arguments of backtest_gex_levels.
+    :return: (hit rates, regimes) DataFrames with a symbol index level, and a dictionary of
+             symbol to the exception of the failed symbols.
+    """
+    prices = prices or {}
+    hitRates, regimes, errors = {}, {}, {}
+    with ProcessPoolExecutor(max_workers=max_workers or min(len(symbols), os.cpu_count() or 1) or 1) as executor:
+        futures = {executor.submit(backtest_gex_levels, symbol, start, end, prices.get(symbol), **kwargs): symbol
+                   for symbol in symbols}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                hitRates[symbol], regimes[symbol] = future.result()
+            except Exception as e:
+                errors[symbol] = e
+                logging.error(f"GEX backtest failed for {symbol}: {e}")
+
+    order = [symbol for symbol in symbols if symbol in hitRates]
+    if not order:
+        return pd.DataFrame(), pd.DataFrame(), errors
+    return (pd.concat([hitRates[s] for s in order], keys=order, names=['symbol']),
+            pd.concat([regimes[s] for s in order if regimes[s] is not None],
+                      keys=[s for s in order if regimes[s] is not None], names=['symbol']),
+            errors)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest the GEX levels stored by the collector")
+    parser.add_argument('--symbols', nargs='+', required=True)
+    parser.add_argument('--start', required=True)
+    parser.add_argument('--end', required=True)
+    parser.add_argument('--horizon', type=int, default=int(BACKTEST_HORIZON.total_seconds() // 60), help="Minutes")
+    parser.add_argument('--bucket', default=BACKTEST_BUCKET, choices=list(BUCKET_SUFFIXES))
+    parser.add_argument('--tolerance', type=float, default=0.0)
+    parser.add_argument('--data-path', default=GEX_DATA_PATH)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--levels-timezone', default=str(BACKTEST_LEVEL_TIMEZONE),
+                        help="Timezone of the stored processTimes, UTC for logs written in UTC")
+    args = parser.parse_args(argv)
+
+    hitRates, regimes, errors = run_gex_backtests(
+        args.symbols, args.start, args.end, max_workers=args.workers, horizon=pd.Timedelta(minutes=args.horizon),
+        bucket=args.bucket, tolerance=args.tolerance, dataPath=args.data_path,
+        timezone=args.levels_timezone)
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(hitRates.round(3))
+        print(regimes.round(4))
+    for symbol, error in errors.items():
+        print(f"{symbol} failed: {error}")
+    return 1 if errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
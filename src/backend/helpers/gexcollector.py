@@ -0,0 +1,219 @@
+# helpers/gexcollector.py
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, time as dtime, timedelta
+import numpy as np
+import pandas as pd
+from helpers.expiryutils import HOLIDAY_CALENDAR, MARKET_TIMEZONE
+from helpers.options import (LEVEL_SYMBOLS, iter_levels_async, make_incremental_levels, write_or_append_gex_data,
+                             get_gex_log_index, read_gex_log_segment)
+
+GEX_DATA_PATH = os.getenv("GEX_DATA_PATH", os.path.join("data", "gex"))
+GEX_COLLECTOR_INTERVAL = 60
+GEX_COLLECTOR_JITTER = 5
+
+MARKET_OPEN = dtime(9, 30)
+MARKET_CLOSE = dtime(16, 0)
+
+# Files of one symbol: <dataPath>/<symbol>/<kind>.json logs and <kind>_latest.json
+GEX_LEVEL_KINDS = ('gex_ladder', 'flow_levels')
+
+def get_gex_file_names(symbol, kind, dataPath=GEX_DATA_PATH):
+    """(log file, latest file, directory) of a symbol and kind of levels."""
+    symbolPath = os.path.join(dataPath, symbol)
+    return os.path.join(symbolPath, kind + '.json'), os.path.join(symbolPath, kind + '_latest.json'), symbolPath
+
+def is_market_open(now=None, calendar=None):
+    """True during the regular session of a business day, now is converted to New York time."""
+    now = (now or datetime.now(MARKET_TIMEZONE)).astimezone(MARKET_TIMEZONE)
+    busdaycal = (calendar or HOLIDAY_CALENDAR).get_busdaycalendar(now.year, now.year)
+    return bool(np.is_busday(np.datetime64(now.date(), 'D'), busdaycal=busdaycal)) and MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+def get_next_run(now=None, interval=GEX_COLLECTOR_INTERVAL, calendar=None):
+    """
+    Next run time: the next multiple of interval seconds inside the session, or the
+    next session open. Runs missed while a collection was overrunning are skipped.
+    """
+    now = (now or datetime.now(MARKET_TIMEZONE)).astimezone(MARKET_TIMEZONE)
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    seconds = (now - midnight).total_seconds()
+    candidate = midnight + timedelta(seconds=(seconds // interval + 1) * interval)
+    # The run at the close is kept, it stores the end of day levels
+    if is_market_open(candidate, calendar) or (candidate.time() == MARKET_CLOSE and is_market_open(now, calendar)):
+        return candidate
+
+    day = now.date() if now.time() < MARKET_OPEN else now.date() + timedelta(days=1)
+    busdaycal = (calendar or HOLIDAY_CALENDAR).get_busdaycalendar(day.year, day.year + 1)
+    day = np.busday_offset(np.datetime64(day, 'D'), 0, roll='forward', busdaycal=busdaycal).astype(object)
+    return datetime.combine(day, MARKET_OPEN, tzinfo=MARKET_TIMEZONE)
+
+def acquire_collector_lock(dataPath=GEX_DATA_PATH):
+    """Exclusive lock on <dataPath>/collector.lock so only one collector writes, None if already held."""
+    os.makedirs(dataPath, exist_ok=True)
+    lockFile = open(os.path.join(dataPath, 'collector.lock'), 'w')
+    try:
+        fcntl.flock(lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lockFile.close()
+        return None
+    lockFile.write(str(os.getpid()))
+    lockFile.flush()
+    return lockFile
+
+async def collect_gex_levels(symbols=LEVEL_SYMBOLS, dataPath=GEX_DATA_PATH, executor=None, engines=None):
+    """
+    Compute the levels of every symbol once and append them to the store.
+
+    :param engines: Optional dictionary of symbol to make_incremental_levels() engines, see iter_levels_async.
+    :return: Dictionary of symbol to the exception of the failed symbols.
+    """
+    errors = {}
+    async for symbol, result, error in iter_levels_async(symbols, executor, engines=engines):
+        if error is not None:
+            errors[symbol] = error
+            logging.error(f"GEX collector failed for {symbol}: {error}")
+            continue
+        for kind, records in zip(GEX_LEVEL_KINDS, result):
+            fileName, latestFileName, symbolPath = get_gex_file_names(symbol, kind, dataPath)
+            write_or_append_gex_data(symbol, records, fileName, symbolPath, latestFileName)
+    return errors
+
+async def run_gex_collector(symbols=LEVEL_SYMBOLS, interval=GEX_COLLECTOR_INTERVAL, jitter=GEX_COLLECTOR_JITTER,
+                            dataPath=GEX_DATA_PATH, max_workers=None, incremental=True):
+    """
+    Collect the levels of a watchlist every interval seconds during market hours.
+
+    Each run starts up to jitter seconds after its slot so several collectors do not hit
+    CBOE at the same instant. Runs never overlap: a run that overruns its slot makes the
+    collector skip to the next free slot, and a lock file keeps a second collector
+    process on the same dataPath from starting.
+
+    With incremental, every symbol keeps make_incremental_levels() engines in this process
+    and its levels are computed in a thread pool from the contracts changed since the
+    previous run. Otherwise every run recomputes the levels in full in a process pool.
+    """
+    lock = acquire_collector_lock(dataPath)
+    if lock is None:
+        logging.warning(f"GEX collector already running for {dataPath}")
+        return
+
+    pool = ThreadPoolExecutor if incremental else ProcessPoolExecutor
+    executor = pool(max_workers=max_workers or min(len(symbols), os.cpu_count() or 1))
+    engines = {symbol: make_incremental_levels() for symbol in symbols} if incremental else None
+    try:
+        while True:
+            now = datetime.now(MARKET_TIMEZONE)
+            nextRun = get_next_run(now, interval)
+            await asyncio.sleep((nextRun - now).total_seconds() + random.uniform(0, jitter))
+
+            started = time.monotonic()
+            try:
+                errors = await collect_gex_levels(symbols, dataPath, executor, engines)
+                logging.info(f"GEX collector stored {len(symbols) - len(errors)}/{len(symbols)} symbols")
+            except Exception as e:
+                logging.error(f"GEX collector crashed: {e}")
+
+            elapsed = time.monotonic() - started
+            if elapsed > interval:
+                logging.warning(f"GEX collector run took {elapsed:.1f}s, longer than the {interval}s interval")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        lock.close()
+
+class GexLevelStore:
+    """
+    Read side of the collector: levels of a symbol between two times.
+
+    Sealed log segments never change, they are parsed once into DataFrames and kept
+    (up to max_segments). The active segment is followed from the last read offset,
+    so a query only parses the records appended since the previous one.
+    """
+
+    def __init__(self, dataPath=GEX_DATA_PATH, max_segments=64):
+        self.dataPath = dataPath
+        self.max_segments = max_segments
+        self.segments = OrderedDict()
+        self.active = {}
+        self.lock = threading.Lock()
+
+    def get_segment(self, path):
+        frame = self.segments.get(path)
+        if frame is None:
+            frame = pd.DataFrame(read_gex_log_segment(path))
+            self.segments[path] = frame
+            while len(self.segments) > self.max_segments:
+                self.segments.popitem(last=False)
+        self.segments.move_to_end(path)
+        return frame
+
+    def get_active(self, fileName):
+        """Records of the active segment, reading only what was appended since the last call."""
+        state = self.active.get(fileName)
+        if not os.path.exists(fileName):
+            self.active.pop(fileName, None)
+            return pd.DataFrame()
+        stat = os.stat(fileName)
+        if state is None or state['inode'] != stat.st_ino or stat.st_size < state['offset']:
+            state = {'inode': stat.st_ino, 'offset': 0, 'records': [], 'frame': pd.DataFrame()}
+            self.active[fileName] = state
+
+        if stat.st_size > state['offset']:
+            with open(fileName, 'rb') as f:
+                f.seek(state['offset'])
+                data = f.read(stat.st_size - state['offset'])
+            # Only consume complete lines, a record being written is read next time
+            complete = data.rfind(b'\n') + 1
+            for line in data[:complete].splitlines():
+                try:
+                    state['records'].append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+            state['offset'] += complete
+            state['frame'] = pd.DataFrame(state['records'])
+        return state['frame']
+
+    def get_levels(self, symbol, start=None, end=None, kind='flow_levels'):
+        """
+        Levels of a symbol with processTime between start and end (inclusive), oldest first.
+
+        :param kind: 'flow_levels' (one row per expiration bucket) or 'gex_ladder'.
+        :return: pd.DataFrame with one row per stored record.
+        """
+        start = None if start is None else pd.Timestamp(start).strftime('%Y-%m-%d %H:%M:%S')
+        end = None if end is None else pd.Timestamp(end).strftime('%Y-%m-%d %H:%M:%S')
+        fileName, _, symbolPath = get_gex_file_names(symbol, kind, self.dataPath)
+
+        with self.lock:
+            frames = []
+            for entry in get_gex_log_index(fileName):
+                if entry['first'] is not None and ((end is not None and entry['first'] > end) or (start is not None and entry['last'] < start)):
+                    continue
+                segment = os.path.join(symbolPath, entry['segment'])
+                # Indexed by a rotation that crashed before the rename, the records are still in the active segment
+                if os.path.exists(segment):
+                    frames.append(self.get_segment(segment))
+            frames.append(self.get_active(fileName))
+
+        selected = []
+        for frame in frames:
+            if len(frame) == 0 or 'processTime' not in frame:
+                continue
+            times = frame['processTime'].to_numpy(dtype=object)
+            mask = np.ones(len(frame), dtype=bool)
+            if start is not None:
+                mask &= times >= start
+            if end is not None:
+                mask &= times <= end
+            selected.append(frame if mask.all() else frame[mask])
+        if not selected:
+            return pd.DataFrame()
+        return pd.concat(selected, ignore_index=True)
@@ -5,9 +5,20 @@ import numpy as np
 import os
 import yfinance as yf
 import scipy
-from scipy.stats import norm
+import scipy.optimize
 from datetime import datetime, timedelta, date
 import sys
+import functools
+import threading
+import time
+import asyncio
+import aiohttp
+import pyarrow as pa
+import pyarrow.ipc
+from collections import OrderedDict
+from helpers.expiryutils import MARKET_TIMEZONE, get_years_till_exp
+from helpers.blackscholes import BS_OUTPUTS, calc_black_scholes, calc_implied_vol
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 def isThirdFriday(d):
     return d.weekday() == 4 and 15 <= d.day <= 21
@@ -24,12 +35,331 @@ def get_next_friday(date):
         # Saturday or Sunday -> Get next Friday
         return date + timedelta(days=((4 - date.weekday()) % 7))
     
-# Get options data
-def get_cboe_option_data(index):
-    print("Getting CBOE Option Data for " + index)
-    response = requests.get(url="https://cdn.cboe.com/api/global/delayed_quotes/options/" + index + ".json")
-    options = response.json()
-    
+# OCC option symbol: root, then a fixed width YYMMDD + C/P + 8 digit strike (in thousandths) suffix
+OCC_SUFFIX_LENGTH = 15
+
+def parse_occ_symbols(symbols):
+    """
+    Decode OCC option symbols (e.g. SPXW241220C05000000) in one vectorized pass over
+    a fixed width bytes view of the symbols.
+
+    Parameters:
+        symbols (array-like): Option symbols.
+
+    Returns:
+        dict: Arrays 'root' (str), 'expiration' (datetime64[D]), 'call_put' ('C' or 'P'),
+        'strike' (float64, with decimals) and 'valid' (bool). Symbols that cannot be
+        decoded have a NaT expiration and a NaN strike.
+    """
+    raw = np.asarray(symbols, dtype='S')
+    n, width = len(raw), raw.dtype.itemsize
+    chars = raw.view(np.uint8).reshape(n, width)
+
+    # Symbols are zero padded on the right, so the suffix is aligned on their length.
+    # Chains only have a few distinct symbol lengths, each one is a plain column slice.
+    lengths = np.char.str_len(raw)
+    suffix = np.zeros((n, OCC_SUFFIX_LENGTH), dtype=np.uint8)
+    roots = np.zeros(n, dtype=f'U{max(width - OCC_SUFFIX_LENGTH, 1)}')
+    for length in np.unique(lengths[lengths >= OCC_SUFFIX_LENGTH]):
+        rows = np.flatnonzero(lengths == length)
+        suffix[rows] = chars[rows, length - OCC_SUFFIX_LENGTH:length]
+        root_width = length - OCC_SUFFIX_LENGTH
+        if root_width > 0:
+            group_roots = np.ascontiguousarray(chars[rows, :root_width]).view(f'S{root_width}').ravel()
+            if (group_roots == group_roots[0]).all():
+                roots[rows] = group_roots[0].decode().strip()
+            else:
+                unique_roots, inverse = np.unique(group_roots, return_inverse=True)
+                roots[rows] = np.char.strip(unique_roots).astype(str)[inverse]
+
+    # Digits wrap around to values above 9 when the character is not a digit
+    digits = suffix - np.uint8(ord('0'))
+    date_digits = digits[:, :6].astype(np.int64)
+    strike_digits = digits[:, 7:]
+    flag = suffix[:, 6]
+    valid = lengths >= OCC_SUFFIX_LENGTH
+    valid &= (digits[:, :6] <= 9).all(axis=1) & (strike_digits <= 9).all(axis=1)
+    valid &= (flag == ord('C')) | (flag == ord('P'))
+
+    year = date_digits[:, 0] * 10 + date_digits[:, 1]
+    month = date_digits[:, 2] * 10 + date_digits[:, 3]
+    day = date_digits[:, 4] * 10 + date_digits[:, 5]
+    valid &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+
+    # Months since 1970-01 for 20YY-MM, then add the days
+    months = np.where(valid, (year + 30) * 12 + month - 1, 0)
+    expiration = months.astype('datetime64[M]').astype('datetime64[D]') + np.where(valid, day - 1, 0)
+    expiration[~valid] = np.datetime64('NaT')
+
+    strike = strike_digits.astype(np.float64) @ (10.0 ** np.arange(7, -1, -1)) / 1000
+    strike[~valid] = np.nan
+
+    call_put = np.where(flag == ord('C'), 'C', 'P')
+    call_put[~valid] = ''
+
+    return {
+        'root': roots,
+        'expiration': expiration,
+        'call_put': call_put,
+        'strike': strike,
+        'valid': valid,
+    }
+
+# CBOE quote fields of one option leg and their names in the paired chain
+OPTION_LEG_FIELDS = ['option', 'last_trade_price', 'change', 'bid', 'ask', 'volume', 'iv', 'delta', 'gamma',
+                     'vega', 'theta', 'rho', 'theo', 'open_interest']
+CALL_COLUMNS = ['Calls', 'CallLastSale', 'CallNet', 'CallBid', 'CallAsk', 'CallVol', 'CallIV', 'CallDelta',
+                'CallGamma', 'CallVega', 'CallTheta', 'CallRho', 'CallTheo', 'CallOpenInt']
+PUT_COLUMNS = ['Puts', 'PutLastSale', 'PutNet', 'PutBid', 'PutAsk', 'PutVol', 'PutIV', 'PutDelta',
+               'PutGamma', 'PutVega', 'PutTheta', 'PutRho', 'PutTheo', 'PutOpenInt']
+
+def pair_option_legs(data_df):
+    """
+    Pair call and put legs on (root, expiration, strike) with a hash join.
+
+    A leg without its counterpart is kept, the missing side is zero filled (empty symbol).
+    Duplicate legs keep their first occurrence. The chain is ordered by root (in order of
+    appearance), expiration and strike.
+
+    :param data_df: Parsed CBOE options with Root, ExpirationDate, Strike and CallPut columns.
+    :return: (paired DataFrame with ExpirationDate, CALL_COLUMNS, StrikePrice and PUT_COLUMNS,
+              diagnostics dictionary with the leg counts)
+    """
+    keys = ['Root', 'ExpirationDate', 'Strike']
+    calls = data_df.loc[data_df['CallPut'] == 'C', keys + OPTION_LEG_FIELDS]
+    puts = data_df.loc[data_df['CallPut'] == 'P', keys + OPTION_LEG_FIELDS]
+
+    duplicate_calls = calls.duplicated(keys)
+    duplicate_puts = puts.duplicated(keys)
+    calls = calls[~duplicate_calls].rename(columns=dict(zip(OPTION_LEG_FIELDS, CALL_COLUMNS)))
+    puts = puts[~duplicate_puts].rename(columns=dict(zip(OPTION_LEG_FIELDS, PUT_COLUMNS)))
+
+    df = calls.merge(puts, on=keys, how='outer', indicator=True)
+    call_only = (df['_merge'] == 'left_only').to_numpy()
+    put_only = (df['_merge'] == 'right_only').to_numpy()
+
+    # Zero fill the missing leg of unmatched contracts
+    for columns, missing in ((CALL_COLUMNS, put_only), (PUT_COLUMNS, call_only)):
+        if missing.any():
+            df.loc[missing, columns[1:]] = 0
+            df.loc[missing, columns[0]] = ''
+
+    # The outer merge sorts its keys, the roots keep the order of the CBOE legs
+    roots = pd.unique(data_df['Root'])
+    df['RootOrder'] = pd.Categorical(df['Root'], categories=roots).codes
+    df = df.sort_values(by=['RootOrder', 'ExpirationDate', 'Strike'], kind='stable').reset_index(drop=True)
+    df = df.rename(columns={'Strike': 'StrikePrice'})[['ExpirationDate'] + CALL_COLUMNS + ['StrikePrice'] + PUT_COLUMNS]
+
+    diagnostics = {
+        'calls': len(duplicate_calls),
+        'puts': len(duplicate_puts),
+        'paired': int(len(df) - call_only.sum() - put_only.sum()),
+        'unmatched_calls': int(call_only.sum()),
+        'unmatched_puts': int(put_only.sum()),
+        'duplicates': int(duplicate_calls.sum() + duplicate_puts.sum()),
+    }
+    return df, diagnostics
+
+def calc_cumulative_balance(df, columns):
+    """
+    Calculate the running balance of one or more columns in a single pass.
+
+    For every row i the balance is sum(values[:i + 1]) - sum(values[i + 1:]),
+    which equals 2 * cumsum[i] - total. NaN values are skipped, like pandas sum().
+
+    Parameters:
+        df (pd.DataFrame or OptionChain): Data with the columns in the desired row order.
+        columns (str or list): Column name or list of column names.
+
+    Returns:
+        np.array: Balance values, 1-D for a single column, (rows, columns) otherwise.
+    """
+    values = np.asarray(df[columns], dtype=np.float64)
+    cumsum = np.nancumsum(values, axis=0)
+    if len(cumsum) == 0:
+        return cumsum
+    return 2 * cumsum - cumsum[-1]
+
+# Add the fraction of the session left until the 16:00 expiry to daysTillExp
+DAYS_TILL_EXP_INTRADAY = False
+
+def get_days_till_exp(expirations, today=None):
+    """
+    Business days (exchange holidays excluded) from today (defaults to now) until
+    expiration as a fraction of a 262 day year, for every row. See get_years_till_exp.
+    """
+    return get_years_till_exp(expirations, today, intraday=DAYS_TILL_EXP_INTRADAY)
+
+# Derived metrics of an OptionChain, computed on first access
+OPTION_CHAIN_METRICS = {
+    # ---=== CALCULATE SPOT GAMMA ===---
+    # Gamma Exposure = Unit Gamma * Open Interest * Contract Size * Spot Price
+    # To further convert into 'per 1% move' quantity, multiply by 1% of spotPrice
+    'CallGEX': lambda c: c['CallGamma'] * c['CallOpenInt'] * 100 * c.spotPrice * c.spotPrice * 0.01,
+    'PutGEX': lambda c: c['PutGamma'] * c['PutOpenInt'] * 100 * c.spotPrice * c.spotPrice * 0.01 * -1,
+    'TotalGamma': lambda c: (c['CallGEX'] + c['PutGEX']) / 10**9,
+    'SPXprice': lambda c: np.full(len(c), np.nan if c.currentPrice is None else c.currentPrice, dtype=c.dtype),
+    'NetGexCall': lambda c: np.where(c['TotalGamma'] > 0, c['TotalGamma'] * c['StrikePrice'], 0),
+    'NetGexPut': lambda c: np.where(c['TotalGamma'] < 0, c['TotalGamma'] * c['StrikePrice'] * -1, 0),
+    'NetGexCall1': lambda c: np.where(c['TotalGamma'] > 0, c['TotalGamma'], 0),
+    'NetGexPut1': lambda c: np.where(c['TotalGamma'] < 0, c['TotalGamma'] * -1, 0),
+    'CallGEXOI': lambda c: c['CallGamma'] * c['CallOpenInt'],
+    'PutGEXOI': lambda c: c['PutGamma'] * c['PutOpenInt'],
+    'CallGEXVolume': lambda c: c['CallGamma'] * c['CallVol'],
+    'PutGEXVolume': lambda c: c['PutGamma'] * c['PutVol'],
+    'NetGEXOI': lambda c: c['CallGEXOI'] - c['PutGEXOI'],
+    'TotalGEXOI': lambda c: c['CallGEXOI'] + c['PutGEXOI'],
+    'NetGEXVolume': lambda c: c['CallGEXVolume'] - c['PutGEXVolume'],
+    'TotalGEXVolume': lambda c: c['CallGEXVolume'] + c['PutGEXVolume'],
+    'NetVolume': lambda c: c['CallVol'] - c['PutVol'],
+    'NetOpenInterest': lambda c: c['CallOpenInt'] - c['PutOpenInt'],
+    'TotalVolume': lambda c: c['CallVol'] + c['PutVol'],
+    'TotalOpenInterest': lambda c: c['CallOpenInt'] + c['PutOpenInt'],
+    'CallVolOI': lambda c: c['CallVol'] * c['CallOpenInt'],
+    'PutVolOI': lambda c: c['PutVol'] * c['PutOpenInt'],
+    'NetVolOI': lambda c: c['CallVolOI'] - c['PutVolOI'],
+    'CallDeltaOI': lambda c: c['CallOpenInt'] * c['CallDelta'],
+    'PutDeltaOI': lambda c: c['PutOpenInt'] * c['PutDelta'],
+    'CallStrikeVol': lambda c: c['CallVol'] * (c['CallDelta'] + c['StrikePrice']),
+    'PutStrikeVol': lambda c: c['PutVol'] * (c['PutDelta'] + c['StrikePrice']),
+    'TotalStrikeVol': lambda c: c['CallStrikeVol'] - c['PutStrikeVol'],
+    'CallStrikeOI': lambda c: c['CallOpenInt'] * (c['CallDelta'] + c['StrikePrice']),
+    'PutStrikeOI': lambda c: c['PutOpenInt'] * (c['PutDelta'] + c['StrikePrice']),
+    'TotalStrikeOI': lambda c: c['CallStrikeOI'] - c['PutStrikeOI'],
+    'CallBidOI': lambda c: c['CallOpenInt'] * c['CallBid'],
+    'PutBidOI': lambda c: c['PutOpenInt'] * c['PutBid'],
+    'CallBidVol': lambda c: c['CallVol'] * c['CallBid'],
+    'PutBidVol': lambda c: c['PutVol'] * c['PutBid'],
+    'CallWall': lambda c: c['CallGamma'] + c['CallVol'] + c['CallOpenInt'],
+    'PutWall': lambda c: c['PutGamma'] + c['PutVol'] + c['PutOpenInt'],
+    # Running balance (sum up to and including each row minus sum of rows below)
+    'CumCallBidOI': lambda c: calc_cumulative_balance(c, 'CallBidOI'),
+    'CumPutBidOI': lambda c: calc_cumulative_balance(c, 'PutBidOI'),
+    'CumCallBidVol': lambda c: calc_cumulative_balance(c, 'CallBidVol'),
+    'CumPutBidVol': lambda c: calc_cumulative_balance(c, 'PutBidVol'),
+    'CumTotalBidOI': lambda c: c['CumCallBidOI'] + c['CumPutBidOI'],
+    'CumTotalBidVol': lambda c: c['CumCallBidVol'] + c['CumPutBidVol'],
+    'daysTillExp': lambda c: get_days_till_exp(c['ExpirationDate'], c.asOf),
+    'IsThirdFriday': lambda c: np.array([isThirdFriday(x) for x in pd.DatetimeIndex(c['ExpirationDate'])], dtype=bool),
+}
+
+class OptionChain:
+    """
+    Paired call/put options chain stored as typed NumPy arrays, one per field.
+
+    Core fields are converted to their type once when the chain is built. Derived
+    metrics (OPTION_CHAIN_METRICS) are computed from the arrays on first access and
+    cached. to_frame() gives a pandas DataFrame over the arrays without copying them.
+    """
+
+    CORE_FIELDS = ['ExpirationDate'] + CALL_COLUMNS + ['StrikePrice'] + PUT_COLUMNS
+    # Core fields that are not converted to dtype
+    OBJECT_FIELDS = ['ExpirationDate', 'Calls', 'Puts']
+
+    def __init__(self, arrays, spotPrice, currentPrice=None, dtype=np.float64, diagnostics=None, asOf=None):
+        """
+        :param arrays: Dictionary of CORE_FIELDS name to 1-D array.
+        :param spotPrice: Close price of the underlying, used for the gamma exposure.
+        :param currentPrice: Current price of the underlying (SPXprice column).
+        :param dtype: Floating point type of the numeric fields and metrics.
+        :param diagnostics: Optional dictionary describing how the chain was built.
+        :param asOf: Time of the snapshot for the days till expiration, None for now.
+        """
+        self.spotPrice = spotPrice
+        self.currentPrice = currentPrice
+        self.asOf = asOf
+        self.dtype = np.dtype(dtype)
+        self.diagnostics = diagnostics or {}
+        self.read_only = False
+        # Unfiltered chain of a chain built by filter_option_chain
+        self.full = self
+        self.arrays = {}
+        for name in self.CORE_FIELDS:
+            values = np.asarray(arrays[name])
+            if name not in self.OBJECT_FIELDS:
+                values = values.astype(self.dtype, copy=False)
+            self.arrays[name] = values
+        self.metrics = {}
+
+    @classmethod
+    def from_frame(cls, df, spotPrice, currentPrice=None, dtype=np.float64, diagnostics=None):
+        """Build a chain from a DataFrame with the CORE_FIELDS columns."""
+        arrays = {name: df[name].to_numpy() for name in cls.CORE_FIELDS}
+        return cls(arrays, spotPrice, currentPrice, dtype, diagnostics)
+
+    @property
+    def columns(self):
+        return self.CORE_FIELDS + list(OPTION_CHAIN_METRICS)
+
+    def __len__(self):
+        return len(self.arrays['StrikePrice'])
+
+    def __contains__(self, name):
+        return name in self.arrays or name in OPTION_CHAIN_METRICS
+
+    def __getitem__(self, name):
+        """Core field or derived metric by name, a list of names gives a (rows x names) array."""
+        if isinstance(name, list):
+            return np.column_stack([self[n] for n in name]) if name else np.empty((len(self), 0))
+        if name in self.arrays:
+            return self.arrays[name]
+        if name not in self.metrics:
+            if name not in OPTION_CHAIN_METRICS:
+                raise KeyError(name)
+            values = OPTION_CHAIN_METRICS[name](self)
+            if self.read_only:
+                values.flags.writeable = False
+            self.metrics[name] = values
+        return self.metrics[name]
+
+    def to_frame(self, columns=None, copy=False):
+        """
+        DataFrame view over the chain arrays. Only the requested metrics are computed.
+
+        :param columns: Column names, defaults to all core fields and metrics.
+        :param copy: Copy the arrays instead of sharing them with the chain.
+        :return: pd.DataFrame backed by the chain arrays.
+        """
+        columns = self.columns if columns is None else columns
+        return pd.DataFrame({name: self[name] for name in columns}, copy=copy)
+
+    @property
+    def nbytes(self):
+        """Memory of the numeric fields and of the metrics computed so far."""
+        return sum(values.nbytes for values in list(self.arrays.values()) + list(self.metrics.values())
+                   if values.dtype != object)
+
+    def select(self, rows):
+        """New chain with the rows of a boolean mask or index array, metrics are recomputed on access."""
+        arrays = {name: values[rows] for name, values in self.arrays.items()}
+        return OptionChain(arrays, self.spotPrice, self.currentPrice, self.dtype, dict(self.diagnostics), self.asOf)
+
+    def make_read_only(self):
+        """Mark the arrays, including metrics computed later, as read only so the chain can be shared."""
+        self.read_only = True
+        for values in list(self.arrays.values()) + list(self.metrics.values()):
+            values.flags.writeable = False
+
+# Floating point type of parsed chains and of the kernels run on them, float32 halves the
+# memory of the chain and of the spot ladder temporaries (see validate_float32_levels)
+OPTION_DTYPE = np.dtype(os.getenv("OPTION_DTYPE", "float64"))
+
+# Solve the IV of contracts quoted without one (CBOE sends 0) from their bid/ask mid. Off by
+# default, the solved contracts join the exposures that CBOE leaves them out of.
+FILL_MISSING_IV = os.getenv("FILL_MISSING_IV", "").lower() in ["true", "1"]
+# Risk free rate and dividend yield of the solved IVs and greeks
+FILL_IV_RATE = float(os.getenv("FILL_IV_RATE", "0"))
+FILL_IV_DIVIDEND_YIELD = float(os.getenv("FILL_IV_DIVIDEND_YIELD", "0"))
+
+# Parse the CBOE delayed quotes JSON into a paired call/put options chain
+def parse_cboe_options(options, fill_iv=None, r=None, q=None):
+    """
+    :param options: CBOE delayed quotes JSON.
+    :param fill_iv: Solve the missing IVs (see fill_missing_implied_vols), FILL_MISSING_IV if None.
+    :param r: Risk free rate of the solved IVs, FILL_IV_RATE if None.
+    :param q: Dividend yield of the solved IVs, FILL_IV_DIVIDEND_YIELD if None.
+    :return: (OptionChain, spot price)
+    """
     # Get SPX Spot
     spotPrice = options["data"]["close"]
     #print(spotPrice)
@@ -38,7 +368,6 @@ def get_cboe_option_data(index):
     data_df = pd.DataFrame(options["data"]["options"])
     
     quote = options['data']
-    quote.pop('options')
     spot_price = quote.get('current_price', None)
     print(f"Underlying index price: {spot_price}")
 
@@ -57,248 +386,475 @@ def get_cboe_option_data(index):
     # Add SPXspot column with the spot_price value
     data_df['SPXspot'] = spot_price
 
-    data_df['CallPut'] = data_df['option'].str.slice(start=-9,stop=-8)
-    data_df['ExpirationDate'] = data_df['option'].str.slice(start=-15,stop=-9)
-    data_df['ExpirationDate'] = pd.to_datetime(data_df['ExpirationDate'], format='%y%m%d')
-    data_df['Strike'] = data_df['option'].str.slice(start=-8,stop=-3)
-    data_df['Strike'] = data_df['Strike'].str.lstrip('0')
+    occ = parse_occ_symbols(data_df['option'].to_numpy())
+    data_df['CallPut'] = occ['call_put']
+    data_df['ExpirationDate'] = occ['expiration']
+    data_df['Strike'] = occ['strike']
+    data_df['Root'] = occ['root']
 
     # drop the data if the ExpirationDate is less than today
     data_df = data_df[data_df['ExpirationDate'] >= datetime.now()]
     
-    data_df_calls = data_df.loc[data_df['CallPut'] == "C"]
-    data_df_puts = data_df.loc[data_df['CallPut'] == "P"]
-    data_df_calls = data_df_calls.reset_index(drop=True)
-    data_df_puts = data_df_puts.reset_index(drop=True)
+    df, diagnostics = pair_option_legs(data_df)
+    if diagnostics['unmatched_calls'] or diagnostics['unmatched_puts'] or diagnostics['duplicates']:
+        print(f"Unmatched option legs zero filled: {diagnostics['unmatched_calls']} calls, "
+              f"{diagnostics['unmatched_puts']} puts, {diagnostics['duplicates']} duplicates dropped")
 
-    df = data_df_calls[['ExpirationDate','option','last_trade_price','change','bid','ask','volume','iv','delta','gamma', 'vega', 'theta', 'rho', 'theo', 'open_interest','Strike']]
-    df_puts = data_df_puts[['ExpirationDate','option','last_trade_price','change','bid','ask','volume','iv','delta','gamma', 'vega', 'theta', 'rho', 'theo', 'open_interest','Strike']]
-    df_puts.columns = ['put_exp','put_option','put_last_trade_price','put_change','put_bid','put_ask','put_volume','put_iv','put_delta','put_gamma','put_vega', 'put_theta', 'put_rho', 'put_theo', 'put_open_interest','put_strike']
+    df['ExpirationDate'] = pd.to_datetime(df['ExpirationDate'], format='%a %b %d %Y')
+    df['ExpirationDate'] = df['ExpirationDate'] + timedelta(hours=16)
 
-    df = pd.concat([df, df_puts], axis=1)
+    chain = OptionChain.from_frame(df, spotPrice, spot_price, OPTION_DTYPE, diagnostics)
+    if FILL_MISSING_IV if fill_iv is None else fill_iv:
+        filled = fill_missing_implied_vols(chain, FILL_IV_RATE if r is None else r,
+                                           FILL_IV_DIVIDEND_YIELD if q is None else q)
+        if filled['Call'] or filled['Put']:
+            print(f"Implied volatility solved from the mid price: {filled['Call']} calls, {filled['Put']} puts")
+    return chain, spotPrice
 
-    df['check'] = np.where((df['ExpirationDate'] == df['put_exp']) & (df['Strike'] == df['put_strike']), 0, 1)
+# Greeks recomputed with the solved IV, in the CBOE units
+FILLED_GREEKS = {'Delta': 'delta', 'Gamma': 'gamma', 'Vega': 'vega', 'Theta': 'theta', 'Rho': 'rho'}
 
-    if df['check'].sum() != 0:
-        print("PUT CALL MERGE FAILED - OPTIONS ARE MISMATCHED.")
-        exit()
+def fill_missing_implied_vols(chain, r=0.0, q=0.0):
+    """
+    Fill the IV and greeks of the contracts without IV but with a two sided quote, in place.
+
+    Without an IV those contracts fail the (T > 0) & (vol > 0) masks and drop out of
+    every exposure. Their IV is inverted from the bid/ask mid for the whole chain at once
+    (blackscholes.calc_implied_vol) at the current price, and their greeks recomputed.
+    Contracts whose mid is outside the no-arbitrage bounds are left unchanged.
+
+    :param chain: OptionChain, modified in place.
+    :param r: Risk free rate.
+    :param q: Dividend yield.
+    :return: Dictionary of side ('Call', 'Put') to the number of contracts filled,
+             also stored in chain.diagnostics['iv_filled'].
+    """
+    spot = chain.currentPrice if chain.currentPrice is not None else chain.spotPrice
+    filled = {}
+    for side in ('Call', 'Put'):
+        iv, bid, ask = chain[side + 'IV'], chain[side + 'Bid'], chain[side + 'Ask']
+        rows = np.flatnonzero(~(iv > 0) & (bid > 0) & (ask >= bid))
+        filled[side] = 0
+        if len(rows) == 0:
+            continue
+        K = chain['StrikePrice'][rows]
+        T = get_days_till_exp(chain['ExpirationDate'][rows], chain.asOf)
+        vol, converged = calc_implied_vol(0.5 * (bid[rows] + ask[rows]), spot, K, T, r, q, side == 'Put',
+                                          dtype=chain.dtype)
+        rows, K, T, vol = rows[converged], K[converged], T[converged], vol[converged]
+        greeks = calc_black_scholes(spot, K, T, vol, r, q, side == 'Put', tuple(FILLED_GREEKS.values()), dtype=chain.dtype)
+        for field, values in [('IV', vol)] + [(field, greeks[greek]) for field, greek in FILLED_GREEKS.items()]:
+            # Arrays taken from a DataFrame can be read only views
+            array = chain.arrays[side + field]
+            if not array.flags.writeable:
+                array = chain.arrays[side + field] = array.copy()
+            array[rows] = values
+        filled[side] = len(rows)
+    chain.diagnostics['iv_filled'] = filled
+    return filled
+
+# CBOE delayed quotes snapshot cache settings
+CBOE_OPTIONS_URL = "https://cdn.cboe.com/api/global/delayed_quotes/options/"
+CBOE_CACHE_TTL = float(os.getenv("CBOE_CACHE_TTL", "60"))
+CBOE_CACHE_MAX_SYMBOLS = int(os.getenv("CBOE_CACHE_MAX_SYMBOLS", "32"))
+CBOE_REQUEST_TIMEOUT = 30
+
+class CboeSnapshotCache:
+    """
+    Process-wide cache of parsed CBOE option chains, keyed by symbol.
 
-    df.drop(['put_exp', 'put_strike', 'check'], axis=1, inplace=True)
+    - Snapshots younger than ttl seconds are served from memory.
+    - Stale snapshots are revalidated with a conditional GET (ETag / Last-Modified),
+      a 304 response keeps the parsed chain.
+    - Concurrent misses for the same symbol share a single request (single flight).
+    - At most max_symbols snapshots are kept, least recently used first out.
 
-    #print(df)
+    Cached chains are shared between callers and read only.
+    """
 
-    df.columns = ['ExpirationDate','Calls','CallLastSale','CallNet','CallBid','CallAsk','CallVol',
-                'CallIV','CallDelta','CallGamma', 'CallVega', 'CallTheta', 'CallRho', 'CallTheo', 'CallOpenInt','StrikePrice','Puts','PutLastSale',
-                'PutNet','PutBid','PutAsk','PutVol','PutIV','PutDelta','PutGamma','PutVega', 'PutTheta', 'PutRho', 'PutTheo', 'PutOpenInt']
+    def __init__(self, ttl=CBOE_CACHE_TTL, max_symbols=CBOE_CACHE_MAX_SYMBOLS, timeout=CBOE_REQUEST_TIMEOUT):
+        self.ttl = ttl
+        self.max_symbols = max_symbols
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'shared': 0}
+
+    def get(self, symbol):
+        """
+        Get the chain of a symbol, fetching it if the cached snapshot is missing or stale.
+
+        :return: (OptionChain, spotPrice)
+        """
+        with self.lock:
+            entry = self.entries.get(symbol)
+            if entry is not None and time.monotonic() - entry['fetched_at'] < self.ttl:
+                self.entries.move_to_end(symbol)
+                self.stats['hits'] += 1
+                return entry['chain'], entry['spotPrice']
+
+            flight = self.pending.get(symbol)
+            leader = flight is None
+            if leader:
+                flight = {'done': threading.Event(), 'result': None, 'error': None}
+                self.pending[symbol] = flight
+                self.stats['misses'] += 1
+            else:
+                self.stats['shared'] += 1
+
+        if not leader:
+            flight['done'].wait()
+            if flight['error'] is not None:
+                raise flight['error']
+            return flight['result']
+
+        try:
+            flight['result'] = self.fetch(symbol, entry)
+            return flight['result']
+        except Exception as e:
+            flight['error'] = e
+            raise
+        finally:
+            with self.lock:
+                self.pending.pop(symbol, None)
+            flight['done'].set()
+
+    def fetch(self, symbol, entry=None):
+        """Request the snapshot of a symbol, revalidating entry when given, and store it."""
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        response = requests.get(url=CBOE_OPTIONS_URL + symbol + ".json", headers=headers, timeout=self.timeout)
+        not_modified = response.status_code == 304 and entry is not None
+        if not_modified:
+            entry = dict(entry, fetched_at=time.monotonic())
+        else:
+            response.raise_for_status()
+            chain, spotPrice = parse_cboe_options(response.json())
+            archive_option_chain(chain, symbol)
+            chain.make_read_only()
+            entry = {
+                'chain': chain,
+                'spotPrice': spotPrice,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched_at': time.monotonic(),
+            }
 
-    df['ExpirationDate'] = pd.to_datetime(df['ExpirationDate'], format='%a %b %d %Y')
-    df['ExpirationDate'] = df['ExpirationDate'] + timedelta(hours=16)
-    df['StrikePrice'] = df['StrikePrice'].astype(float)
-    df['CallIV'] = df['CallIV'].astype(float)
-    df['PutIV'] = df['PutIV'].astype(float)
-    df['CallGamma'] = df['CallGamma'].astype(float)
-    df['CallVega'] = df['CallVega'].astype(float)
-    df['CallTheta'] = df['CallTheta'].astype(float)
-    df['CallRho'] = df['CallRho'].astype(float)
-    df['CallTheo'] = df['CallTheo'].astype(float)
-    df['PutGamma'] = df['PutGamma'].astype(float)
-    df['PutVega'] = df['PutVega'].astype(float)
-    df['PutTheta'] = df['PutTheta'].astype(float)
-    df['PutRho'] = df['PutRho'].astype(float)
-    df['PutTheo'] = df['PutTheo'].astype(float)
-    df['CallOpenInt'] = df['CallOpenInt'].astype(float)
-    df['PutOpenInt'] = df['PutOpenInt'].astype(float)
+        with self.lock:
+            self.stats['not_modified'] += not_modified
+            self.entries[symbol] = entry
+            self.entries.move_to_end(symbol)
+            while len(self.entries) > self.max_symbols:
+                self.entries.popitem(last=False)
+        return entry['chain'], entry['spotPrice']
+
+    def invalidate(self, symbol=None):
+        """Drop the snapshot of a symbol, or all snapshots."""
+        with self.lock:
+            if symbol is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(symbol, None)
 
-    # ---=== CALCULATE SPOT GAMMA ===---
-    # Gamma Exposure = Unit Gamma * Open Interest * Contract Size * Spot Price 
-    # To further convert into 'per 1% move' quantity, multiply by 1% of spotPrice
-    df['CallGEX'] = df['CallGamma'] * df['CallOpenInt'] * 100 * spotPrice * spotPrice * 0.01
-    df['PutGEX'] = df['PutGamma'] * df['PutOpenInt'] * 100 * spotPrice * spotPrice * 0.01 * -1
-
-    df['TotalGamma'] = (df.CallGEX + df.PutGEX) / 10**9
-
-    # GEX Exposure Code
-    df['SPXprice'] = spot_price
-
-    # Calculate NetGexCall and NetGexPut and add them as new columns
-    df['NetGexCall'] = np.where(df['TotalGamma'] > 0, df['TotalGamma'] * df['StrikePrice'], 0)
-    df['NetGexPut'] = np.where(df['TotalGamma'] < 0, df['TotalGamma'] * df['StrikePrice'] * -1, 0)
-
-     # Calculate NetGexCall1 and NetGexPut1 and add them as new columns without multiplying by strike_price
-    df['NetGexCall1'] = np.where(df['TotalGamma'] > 0, df['TotalGamma'], 0)
-    df['NetGexPut1'] = np.where(df['TotalGamma'] < 0, df['TotalGamma'] * -1, 0)
-
-    # Calculate CallGammaOI and PutGammaOI
-    df['CallGEXOI'] = df['CallGamma'] * df['CallOpenInt']
-    df['PutGEXOI'] = df['PutGamma'] * df['PutOpenInt']
-
-    # Calculate GEX Volume and GEX Open Interest for calls and puts
-    df['CallGEXVolume'] = df['CallGamma'] * df['CallVol']
-    df['PutGEXVolume'] = df['PutGamma'] * df['PutVol']
-
-    # Calculate NetGammaOI
-    df['NetGEXOI'] = df['CallGEXOI'] - df['PutGEXOI']
-    df['TotalGEXOI'] = df['CallGEXOI'] + df['PutGEXOI']
-    df['NetGEXVolume'] = df['CallGEXVolume'] - df['PutGEXVolume']
-    df['TotalGEXVolume'] = df['CallGEXVolume'] + df['PutGEXVolume']
-    df['NetVolume'] = df['CallVol'] - df['PutVol']
-    df['NetOpenInterest'] = df['CallOpenInt'] - df['PutOpenInt']
-
-    df['TotalVolume'] = df['CallVol'] + df['PutVol']
-    df['TotalOpenInterest'] = df['CallOpenInt'] + df['PutOpenInt']
-
-    df['CallGEXOI'] = df['CallGEXOI'].astype(float)
-    df['PutGEXOI'] = df['PutGEXOI'].astype(float)
-    df['CallGEXVolume'] = df['CallGEXVolume'].astype(float)
-    df['PutGEXVolume'] = df['PutGEXVolume'].astype(float)
-    df['NetGEXOI'] = df['NetGEXOI'].astype(float)
-    df['NetGEXVolume'] = df['NetGEXVolume'].astype(float)
-    df['NetVolume'] = df['NetVolume'].astype(float)
-    df['NetOpenInterest'] = df['NetOpenInterest'].astype(float)
-    df['TotalVolume'] = df['TotalVolume'].astype(float)
-    df['TotalOpenInterest'] = df['TotalOpenInterest'].astype(float)
-
-    df['CallVolOI'] = df['CallVol'] * df['CallOpenInt']
-    df['PutVolOI'] = df['PutVol'] * df['PutOpenInt']
-    df['NetVolOI'] = df['CallVolOI'] - df['PutVolOI']
-    
-    # Create a new column CallStrikeVol - CallVol*(CallDelta + StrikePrice)
-    df['CallDeltaOI'] = df['CallOpenInt'] * df['CallDelta']
-    df['PutDeltaOI'] = df['PutOpenInt'] * df['PutDelta']
-    df['CallStrikeVol'] = df['CallVol'] * (df['CallDelta'] + df['StrikePrice'])
-    df['PutStrikeVol'] = df['PutVol'] * (df['PutDelta'] + df['StrikePrice'])
-    df['TotalStrikeVol'] = df['CallStrikeVol'] - df['PutStrikeVol']
-    df['CallStrikeOI'] = df['CallOpenInt'] * (df['CallDelta'] + df['StrikePrice'])
-    df['PutStrikeOI'] = df['PutOpenInt'] * (df['PutDelta'] + df['StrikePrice'])
-    df['TotalStrikeOI'] = df['CallStrikeOI'] - df['PutStrikeOI']
-    df['CallBidOI'] = df['CallOpenInt'] * df['CallBid']
-    df['PutBidOI'] = df['PutOpenInt'] * df['PutBid']
-    df['CallBidVol'] = df['CallVol'] * df['CallBid']
-    df['PutBidVol'] = df['PutVol'] * df['PutBid']
-    df['CallWall'] = df['CallGamma'] + df['CallVol'] + df['CallOpenInt']
-    df['PutWall'] = df['PutGamma'] + df['PutVol'] + df['PutOpenInt']
-
-    df['CallStrikeVol'] = df['CallStrikeVol'].astype(float)
-    df['CallVol'] = df['CallVol'].astype(float)
-    df['PutStrikeVol'] = df['PutStrikeVol'].astype(float)
-    df['PutVol'] = df['PutVol'].astype(float)
-    df['CallStrikeOI'] = df['CallStrikeOI'].astype(float)
-    df['PutStrikeOI'] = df['PutStrikeOI'].astype(float)
-    df['CallDeltaOI'] = df['CallDeltaOI'].astype(float)
-    df['PutDeltaOI'] = df['PutDeltaOI'].astype(float)
-    df['CallBidOI'] = df['CallBidOI'].astype(float)
-    df['PutBidOI'] = df['PutBidOI'].astype(float)
-    df['CallBidVol'] = df['CallBidVol'].astype(float)
-    df['PutBidVol'] = df['PutBidVol'].astype(float)
-    df['CallWall'] = df['CallWall'].astype(float)
-    df['PutWall'] = df['PutWall'].astype(float)
-
-    # Initialize an empty column to store the result
-    results = []
-    # Iterate through each row to apply the logic dynamically
-    for i in range(len(df)):
-        # Calculate cumulative sum from row 10 up to the current row
-        cumulative_sum = df['CallBidOI'][:i + 1].sum()
-
-        # Calculate sum of all rows below the current row
-        remaining_sum = df['CallBidOI'][i + 1:].sum()
-
-        # Compute the result for the current row
-        result = cumulative_sum - remaining_sum
-        results.append(result)
-
-    # Add the results back to the DataFrame
-    df['CumCallBidOI'] = results
-
-    results = []
-    # Iterate through each row to apply the logic dynamically
-    for i in range(len(df)):
-        # Calculate cumulative sum from row 10 up to the current row
-        cumulative_sum = df['PutBidOI'][:i + 1].sum()
-
-        # Calculate sum of all rows below the current row
-        remaining_sum = df['PutBidOI'][i + 1:].sum()
-
-        # Compute the result for the current row
-        result = cumulative_sum - remaining_sum
-        results.append(result)
-
-    # Add the results back to the DataFrame
-    df['CumPutBidOI'] = results
-
-    results = []
-    # Iterate through each row to apply the logic dynamically
-    for i in range(len(df)):
-        # Calculate cumulative sum from row 10 up to the current row
-        cumulative_sum = df['CallBidVol'][:i + 1].sum()
-
-        # Calculate sum of all rows below the current row
-        remaining_sum = df['CallBidVol'][i + 1:].sum()
-
-        # Compute the result for the current row
-        result = cumulative_sum - remaining_sum
-        results.append(result)
-
-    # Add the results back to the DataFrame
-    df['CumCallBidVol'] = results
-
-    results = []
-    # Iterate through each row to apply the logic dynamically
-    for i in range(len(df)):
-        # Calculate cumulative sum from row 10 up to the current row
-        cumulative_sum = df['PutBidVol'][:i + 1].sum()
-
-        # Calculate sum of all rows below the current row
-        remaining_sum = df['PutBidVol'][i + 1:].sum()
-
-        # Compute the result for the current row
-        result = cumulative_sum - remaining_sum
-        results.append(result)
-
-    # Add the results back to the DataFrame
-    df['CumPutBidVol'] = results
-
-    df['CumTotalBidOI'] = df['CumCallBidOI'] + df['CumPutBidOI']
-    df['CumTotalBidVol'] = df['CumCallBidVol'] + df['CumPutBidVol']
-
-    df['CumCallBidOI'] = df['CumCallBidOI'].astype(float)
-    df['CumPutBidOI'] = df['CumPutBidOI'].astype(float)
-    df['CumCallBidVol'] = df['CumCallBidVol'].astype(float)
-    df['CumPutBidVol'] = df['CumPutBidVol'].astype(float)
-    df['CumTotalBidOI'] = df['CumTotalBidOI'].astype(float)
-    df['CumTotalBidVol'] = df['CumTotalBidVol'].astype(float)
-    
+CBOE_SNAPSHOT_CACHE = CboeSnapshotCache()
+
+# Get the paired call/put options chain
+def get_cboe_option_chain(index, use_cache=True):
+    print("Getting CBOE Option Data for " + index)
+    if use_cache:
+        return CBOE_SNAPSHOT_CACHE.get(index)
+
+    response = requests.get(url=CBOE_OPTIONS_URL + index + ".json", timeout=CBOE_REQUEST_TIMEOUT)
+    chain, spotPrice = parse_cboe_options(response.json())
+    archive_option_chain(chain, index)
+    return chain, spotPrice
 
-    # For 0DTE options, I'm setting DTE = 1 day, otherwise they get excluded
-    df['daysTillExp'] = [1/262 if (np.busday_count(date.today(), x.date())) == 0 \
-                            else np.busday_count(date.today(), x.date())/262 for x in df.ExpirationDate]
+# Snapshot archive: one Arrow IPC file per chain, partitioned as <root>/<symbol>/<YYYY-MM-DD>/<HHMMSS>.arrow
+OPTION_ARCHIVE_PATH = os.getenv("OPTION_ARCHIVE_PATH", os.path.join("data", "options"))
+OPTION_ARCHIVE_COMPRESSION = 'zstd'
+# Archive every chain fetched from CBOE (cache misses and the collector payloads)
+OPTION_ARCHIVE_ENABLED = os.getenv("OPTION_ARCHIVE_ENABLED", "").lower() in ["true", "1"]
 
-    df['IsThirdFriday'] = [isThirdFriday(x) for x in df.ExpirationDate]
+def get_option_snapshot_path(symbol, asOf, root=OPTION_ARCHIVE_PATH):
+    return os.path.join(root, symbol, asOf.strftime('%Y-%m-%d'), asOf.strftime('%H%M%S') + '.arrow')
+
+def write_option_snapshot(chain, symbol, asOf=None, root=OPTION_ARCHIVE_PATH, compression=OPTION_ARCHIVE_COMPRESSION):
+    """
+    Write the core fields of a chain to the snapshot archive.
+
+    :param chain: OptionChain to archive.
+    :param symbol: CBOE symbol, the first partition level.
+    :param asOf: Time of the snapshot, defaults to the chain asOf or now in New York time.
+    :param compression: Arrow IPC buffer compression ('zstd', 'lz4' or None). Uncompressed
+                        files are read back without copying the numeric columns.
+    :return: Path of the written file.
+    """
+    asOf = pd.Timestamp(asOf or chain.asOf or pd.Timestamp.now(tz=MARKET_TIMEZONE).tz_localize(None)).floor('s')
+    path = get_option_snapshot_path(symbol, asOf, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    metadata = {
+        'symbol': symbol,
+        'asOf': asOf.isoformat(),
+        'spotPrice': json.dumps(chain.spotPrice),
+        'currentPrice': json.dumps(chain.currentPrice),
+        'diagnostics': json.dumps(chain.diagnostics, default=int),
+    }
+    table = pa.table({name: chain[name] for name in OptionChain.CORE_FIELDS}).replace_schema_metadata(metadata)
+
+    # Write next to the final file and rename so readers never see a partial snapshot
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    with pa.OSFile(path + '.tmp', 'wb') as sink, pa.ipc.new_file(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    os.replace(path + '.tmp', path)
+    return path
+
+def archive_option_chain(chain, symbol):
+    """
+    Write a freshly fetched chain to OPTION_ARCHIVE_PATH when OPTION_ARCHIVE_ENABLED is set.
+    A failed write is reported and does not fail the caller.
+
+    :return: Path of the written file, None when not archived.
+    """
+    if not OPTION_ARCHIVE_ENABLED:
+        return None
+    try:
+        return write_option_snapshot(chain, symbol, root=OPTION_ARCHIVE_PATH)
+    except (OSError, pa.ArrowException) as e:
+        print(f"Option snapshot of {symbol} not archived: {e}")
+        return None
+
+def list_option_snapshots(symbol, start=None, end=None, root=OPTION_ARCHIVE_PATH):
+    """
+    Archived snapshots of a symbol between start and end (inclusive), oldest first.
+    Only the date partitions inside the range are listed.
+
+    :return: List of (pd.Timestamp, path).
+    """
+    start = None if start is None else pd.Timestamp(start)
+    end = None if end is None else pd.Timestamp(end)
+    symbolPath = os.path.join(root, symbol)
+    if not os.path.isdir(symbolPath):
+        return []
+
+    snapshots = []
+    for day in sorted(os.listdir(symbolPath)):
+        if (start is not None and day < start.strftime('%Y-%m-%d')) or (end is not None and day > end.strftime('%Y-%m-%d')):
+            continue
+        for fileName in sorted(os.listdir(os.path.join(symbolPath, day))):
+            if not fileName.endswith('.arrow'):
+                continue
+            asOf = pd.Timestamp(day + ' ' + fileName[:2] + ':' + fileName[2:4] + ':' + fileName[4:6])
+            if (start is None or asOf >= start) and (end is None or asOf <= end):
+                snapshots.append((asOf, os.path.join(symbolPath, day, fileName)))
+    return snapshots
+
+def read_option_snapshot(path, dtype=np.float64):
+    """
+    Memory-map an archived snapshot back into an OptionChain. Numeric columns of
+    uncompressed files stay backed by the mapped file, the chain is read only.
+    """
+    with pa.memory_map(path, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    metadata = {key.decode(): value.decode() for key, value in table.schema.metadata.items()}
+    arrays = {name: table.column(name).to_numpy() for name in OptionChain.CORE_FIELDS}
+    arrays['ExpirationDate'] = arrays['ExpirationDate'].astype('datetime64[us]')
+    chain = OptionChain(arrays, json.loads(metadata['spotPrice']), json.loads(metadata['currentPrice']), dtype,
+                        json.loads(metadata['diagnostics']), asOf=pd.Timestamp(metadata['asOf']))
+    chain.make_read_only()
+    return chain
+
+def replay_levels(symbol, start=None, end=None, root=OPTION_ARCHIVE_PATH):
+    """
+    Recompute the GEX and flow levels of archived snapshots, one snapshot at a time.
+
+    :return: Iterator of (asOf, get_gex_and_flow_levels result).
+    """
+    for asOf, path in list_option_snapshots(symbol, start, end, root):
+        yield asOf, get_gex_and_flow_levels(symbol, asOf, read_option_snapshot(path))
+
+# Ingestion filter of calc_gex_levels, e.g. {'strike_band': (0.9, 1.1), 'max_days': 60, 'min_oi': 1}.
+# None keeps the whole chain.
+OPTION_CHAIN_FILTER = None
+
+def filter_option_chain(chain, strike_band=None, max_days=None, min_oi=None):
+    """
+    Keep the contracts that matter for the levels, before any derived metric is computed.
+
+    :param chain: OptionChain.
+    :param strike_band: (low, high) strike window as multiples of the spot price.
+    :param max_days: Maximum calendar days to expiration from chain.asOf (or now).
+    :param min_oi: Minimum open interest of the call or the put of a strike.
+    :return: OptionChain of the kept rows. Its full attribute is the unfiltered chain, for
+             the aggregates that need every contract. The kept and total row counts are
+             in diagnostics['filtered'].
+    """
+    keep = np.ones(len(chain), dtype=bool)
+    if strike_band is not None:
+        strikes = chain['StrikePrice']
+        keep &= (strikes >= strike_band[0] * chain.spotPrice) & (strikes <= strike_band[1] * chain.spotPrice)
+    if max_days is not None:
+        now = pd.Timestamp(chain.asOf or datetime.now())
+        keep &= pd.DatetimeIndex(chain['ExpirationDate']) <= now + pd.Timedelta(days=max_days)
+    if min_oi is not None:
+        keep &= np.maximum(chain['CallOpenInt'], chain['PutOpenInt']) >= min_oi
+
+    filtered = chain.select(keep)
+    filtered.full = chain.full
+    filtered.diagnostics['filtered'] = {'kept': int(keep.sum()), 'total': len(keep)}
+    return filtered
+
+# Get options data. options can be the already fetched CBOE JSON or an OptionChain (e.g. read from the archive)
+def get_option_chain(index, options=None):
+    """
+    OptionChain from an OptionChain, the CBOE JSON, or fetched (cached) when options is None.
+    Chains parsed from the JSON, e.g. the payloads of the collector, are archived (see archive_option_chain).
+    """
+    if isinstance(options, OptionChain):
+        return options
+    elif options is not None:
+        chain = parse_cboe_options(options)[0]
+        archive_option_chain(chain, index)
+        return chain
+    return get_cboe_option_chain(index)[0]
+
+def get_cboe_option_data(index, options=None):
+    chain = get_option_chain(index, options)
+    spotPrice = chain.spotPrice
+    # Cached chains are shared, the DataFrame gets its own copy of the arrays
+    df = chain.to_frame(copy=True)
 
     dfAgg = df.groupby(['StrikePrice']).sum(numeric_only=True)
     return df, dfAgg, spotPrice
 
-def calc_vanna_vectorized(S, K, vol, T, delta):
-    """Vectorized calculation of Vanna for all rows."""
-    valid = (T > 0) & (vol > 0)  # Ensure T and vol are positive
-    sqrt_T = np.sqrt(T[valid])
-    vol_sqrt_T = vol[valid] * sqrt_T
-    log_term = np.log(S / K[valid])
-    dp = (log_term + (0.5 * vol[valid]**2) * T[valid]) / vol_sqrt_T
+# Default metrics of an ExposureCube
+EXPOSURE_CUBE_METRICS = ('CallGEX', 'PutGEX', 'TotalGamma', 'CallOpenInt', 'PutOpenInt', 'CallVol', 'PutVol')
 
-    vanna = np.zeros_like(K, dtype=np.float64)
-    vanna[valid] = (
-        -np.exp(-delta[valid] * T[valid]) * log_term / (vol_sqrt_T**2)
-    )  # Simplified Vanna formula
-    return vanna
+class ExposureCube:
+    """
+    Dense (metric x strike x expiration) sums of an options chain.
+
+    Strikes and expirations are mapped to sorted integer indices once, and every metric is
+    scatter-added into its (strikes, expirations) plane with one bincount. Slices (one
+    expiration, a strike band, the cumulative sum over expirations) are then index
+    operations on the cube instead of a groupby per query. Missing (NaN) values count as
+    zero, like pandas sum().
+    """
+
+    def __init__(self, strikes, expirations, metrics, values):
+        """
+        :param strikes: Sorted unique strikes.
+        :param expirations: Sorted unique expirations (datetime64).
+        :param metrics: Metric names, in the order of the first axis of values.
+        :param values: (metrics, strikes, expirations) array of sums.
+        """
+        self.strikes = strikes
+        self.expirations = expirations
+        self.metrics = {name: i for i, name in enumerate(metrics)}
+        self.values = values
+        self.cumulative_values = {}
+
+    @classmethod
+    def from_chain(cls, chain, metrics=EXPOSURE_CUBE_METRICS):
+        """
+        Build the cube from an OptionChain or an options DataFrame (get_cboe_option_data).
+
+        :param metrics: Columns or OPTION_CHAIN_METRICS to sum per strike and expiration.
+        """
+        strikes, strikeIndex = np.unique(np.asarray(chain['StrikePrice']), return_inverse=True)
+        expirations, expirationIndex = np.unique(pd.DatetimeIndex(chain['ExpirationDate']).to_numpy(),
+                                                 return_inverse=True)
+        cells = len(strikes) * len(expirations)
+        flatIndex = strikeIndex * len(expirations) + expirationIndex
+
+        values = np.empty((len(metrics), len(strikes), len(expirations)), dtype=np.float64)
+        for i, name in enumerate(metrics):
+            weights = np.nan_to_num(np.asarray(chain[name], dtype=np.float64))
+            values[i] = np.bincount(flatIndex, weights=weights, minlength=cells).reshape(len(strikes), len(expirations))
+        return cls(strikes, expirations, list(metrics), values)
+
+    def __getitem__(self, metric):
+        """(strikes, expirations) sums of a metric, a view into the cube."""
+        return self.values[self.metrics[metric]]
+
+    def get_expiration_index(self, expiration):
+        """Index of the expiration on a day (date, string or Timestamp), KeyError when the chain has none."""
+        day = np.datetime64(pd.Timestamp(expiration).date(), 'D')
+        days = self.expirations.astype('datetime64[D]')
+        i = np.searchsorted(days, day)
+        if i == len(days) or days[i] != day:
+            raise KeyError(expiration)
+        return int(i)
+
+    def get_strike_slice(self, fromStrike=None, toStrike=None):
+        """Slice of the strikes between fromStrike and toStrike (inclusive)."""
+        start = 0 if fromStrike is None else np.searchsorted(self.strikes, fromStrike, side='left')
+        stop = len(self.strikes) if toStrike is None else np.searchsorted(self.strikes, toStrike, side='right')
+        return slice(int(start), int(stop))
+
+    def expiration(self, metric, expiration):
+        """Sums of a metric per strike for one expiration."""
+        return self[metric][:, self.get_expiration_index(expiration)]
+
+    def strike_band(self, metric, fromStrike=None, toStrike=None):
+        """(strikes, (strikes, expirations) sums) of a metric between fromStrike and toStrike, views into the cube."""
+        band = self.get_strike_slice(fromStrike, toStrike)
+        return self.strikes[band], self[metric][band]
+
+    def cumulative(self, metric, expiration=None):
+        """
+        Sums of a metric per strike over the expirations up to each expiration, computed on
+        first use. With expiration, the 1-D column of the expirations up to and including it.
+        """
+        if metric not in self.cumulative_values:
+            self.cumulative_values[metric] = np.cumsum(self[metric], axis=1)
+        values = self.cumulative_values[metric]
+        return values if expiration is None else values[:, self.get_expiration_index(expiration)]
+
+    def by_strike(self, metric):
+        """Sums of a metric per strike over every expiration."""
+        return self.cumulative(metric)[:, -1] if len(self.expirations) else np.zeros(len(self.strikes))
+
+    def to_frame(self, metric):
+        """Metric as a DataFrame of strikes (index) by expirations (columns)."""
+        return pd.DataFrame(self[metric], index=pd.Index(self.strikes, name='StrikePrice'),
+                            columns=pd.DatetimeIndex(self.expirations, name='ExpirationDate'))
+
+def get_exposure_cube(index, options=None, metrics=EXPOSURE_CUBE_METRICS):
+    """ExposureCube of a symbol, options as in get_option_chain."""
+    return ExposureCube.from_chain(get_option_chain(index, options), metrics)
+
+def calc_vanna_vectorized(S, K, vol, T, q=0.0):
+    """Vectorized Black-Scholes vanna (dDelta/dvol) of all rows, zero without time to expiry or IV."""
+    return calc_black_scholes(S, K, T, vol, 0.0, q, outputs=('vanna',))['vanna']
+
+def calc_option_greeks(df, spotPrice, side, r=0.0, q=0.0, outputs=BS_OUTPUTS, dtype=np.float64):
+    """
+    Black-Scholes price and greeks of one side of the chain from its IV, at any spot.
+
+    :param df: Options DataFrame from get_cboe_option_data.
+    :param spotPrice: Spot price, or a (levels, 1) column of spot levels for a scenario grid.
+    :param side: 'Call' or 'Put'.
+    :param r: Risk free rate.
+    :param q: Dividend yield.
+    :return: Dictionary of output name to array (see blackscholes.calc_black_scholes for the units).
+    """
+    return calc_black_scholes(spotPrice, df['StrikePrice'].to_numpy(dtype=dtype), df['daysTillExp'].to_numpy(dtype=dtype),
+                              df[side + 'IV'].to_numpy(dtype=dtype), r, q, side == 'Put', outputs, dtype=dtype)
 
 def calc_vanna_exposure_vectorized(spot_price, df):
     df = df.copy()
     """Calculate total vanna exposure for all spot levels."""
     call_vanna = calc_vanna_vectorized(spot_price, df['StrikePrice'].values, df['CallIV'].values, 
-                                       df['daysTillExp'].values, df['CallDelta'].values)
+                                       df['daysTillExp'].values)
     put_vanna = calc_vanna_vectorized(spot_price, df['StrikePrice'].values, df['PutIV'].values, 
-                                      df['daysTillExp'].values, df['PutDelta'].values)
+                                      df['daysTillExp'].values)
 
     df['callVannaEx'] = call_vanna * spot_price * df['CallOpenInt'].values
     df['putVannaEx'] = put_vanna * spot_price * df['PutOpenInt'].values
@@ -309,17 +865,9 @@ def calc_vanna_exposure_vectorized(spot_price, df):
     return total_vanna_exposure
 
 # Optimized Black-Scholes Gamma calculation
-def calc_gamma_vectorized(S, K, vol, T, q):
-    """Vectorized calculation of Gamma for all rows."""
-    valid = (T > 0) & (vol > 0)
-    sqrt_T = np.sqrt(T[valid])
-    vol_sqrt_T = vol[valid] * sqrt_T
-    log_term = np.log(S / K[valid])
-    dp = (log_term + (0.5 * vol[valid]**2) * T[valid]) / vol_sqrt_T
-
-    gamma = np.zeros_like(K, dtype=np.float64)
-    gamma[valid] = np.exp(-q * T[valid]) * norm.pdf(dp) / (S * vol_sqrt_T)
-    return gamma
+def calc_gamma_vectorized(S, K, vol, T, q=0.0):
+    """Vectorized Black-Scholes gamma of all rows, zero without time to expiry or IV."""
+    return calc_black_scholes(S, K, T, vol, 0.0, q, outputs=('gamma',))['gamma']
 
 def calc_gamma_exposure_vectorized(spot_price, df):
     df = df.copy()
@@ -355,6 +903,8 @@ def find_zero_vanna(values, levels):
 
         zero_crossing = pos_level - ((pos_level - neg_level) * pos_value / (pos_value - neg_value))
         return zero_crossing[0]  # Return the first zero crossing
+    elif np.abs(values).sum() == 0:
+        return None  # No exposure at all, e.g. an empty bucket
     else:
         # Fallback to weighted average strike
         weighted_avg_strike = np.average(levels, weights=np.abs(values))
@@ -386,41 +936,498 @@ def find_zero_gamma(totalGamma, levels):
     zeroGamma = posStrike - ((posStrike - negStrike) * posGamma / (posGamma - negGamma))
     return zeroGamma
 
-def find_zero_gamma_levels(df, fromStrike, toStrike):
-    # Generate spot levels
-    levels = np.linspace(fromStrike, toStrike, 240)
+# Spot ladder settings
+LADDER_NUM_LEVELS = 240
+LADDER_MAX_BYTES = 32 * 1024 * 1024
 
-    # Calculate gamma exposures for all spot levels
-    gamma_results = [calc_gamma_exposure_vectorized(spot, df) 
-                    for spot in levels]
+# Steps of the spot ladder grid, times a power of ten
+LADDER_GRID_STEPS = (1, 1.25, 1.5, 2, 2.5, 3, 4, 5, 6, 8, 10)
 
-    # Extract results for each gamma exposure type
-    #totalGamma = zip(*gamma_results)
+def get_ladder_levels(fromStrike, toStrike, num_levels=LADDER_NUM_LEVELS, dtype=np.float64):
+    """
+    Spot levels between fromStrike and toStrike on a grid that does not move with them.
 
-    # Convert to arrays and normalize
-    totalGamma = np.array(gamma_results) / 10**9
+    The step is the largest LADDER_GRID_STEPS round number not above the step of num_levels
+    evenly spaced levels, and the levels are its multiples inside the range. A small spot
+    move only adds or drops levels at the ends, the others keep their exact values, which
+    is what lets IncrementalExposureSurface reuse their exposure.
+    """
+    step = (toStrike - fromStrike) / max(num_levels - 1, 1)
+    if not np.isfinite(step) or step <= 0:
+        return np.linspace(fromStrike, toStrike, num_levels, dtype=dtype)
+    scale = 10.0 ** np.floor(np.log10(step))
+    # The relative tolerance keeps a round step (e.g. 5.0 computed as 4.999...) on its own grid
+    step = scale * max(s for s in LADDER_GRID_STEPS if s * scale <= step * (1 + 1e-9))
+    first, last = np.ceil(fromStrike / step - 1e-9), np.floor(toStrike / step + 1e-9)
+    return (np.arange(first, last + 1) * step).astype(dtype)
+
+def get_ladder_chunk_size(num_contracts, dtype=np.float64, max_bytes=LADDER_MAX_BYTES, temporaries=4):
+    """
+    Number of spot levels to evaluate at once so that the (levels x contracts)
+    temporaries of one chunk stay within max_bytes.
+    """
+    row_bytes = max(num_contracts, 1) * np.dtype(dtype).itemsize * temporaries
+    return max(1, int(max_bytes // row_bytes))
 
-    zeroGamma = find_zero_gamma(totalGamma, levels)
-    return zeroGamma
+def get_ladder_inputs(df, side, dtype=np.float64):
+    """
+    Extract the per-contract arrays used by the spot ladder for one side of the chain.
+    Contracts without time to expiry, IV or open interest are dropped since they
+    contribute nothing to the exposure.
+
+    :param df: Options DataFrame from get_cboe_option_data.
+    :param side: 'Call' or 'Put'.
+    :param dtype: Floating point type of the returned arrays.
+    :return: Dictionary of 1-D arrays (K, T, vol, oi) and the 'valid' row mask of df
+             they were taken from.
+    """
+    K = df['StrikePrice'].to_numpy(dtype=dtype)
+    T = df['daysTillExp'].to_numpy(dtype=dtype)
+    vol = df[side + 'IV'].to_numpy(dtype=dtype)
+    oi = np.nan_to_num(df[side + 'OpenInt'].to_numpy(dtype=dtype))
+
+    valid = (T > 0) & (vol > 0) & (oi != 0)
+    inputs = make_ladder_inputs(K[valid], T[valid], vol[valid], oi[valid])
+    inputs['valid'] = valid
+    return inputs
+
+def make_ladder_inputs(K, T, vol, oi):
+    """Ladder inputs of get_ladder_inputs from the per-contract arrays."""
+    return {'K': K, 'T': T, 'vol': vol, 'oi': oi}
+
+SURFACE_GREEKS = ('gamma', 'vanna', 'charm', 'delta')
+
+def calc_greek_ladder(S, inputs, greeks=SURFACE_GREEKS, put=False, r=0.0, q=0.0):
+    """
+    Unit greeks for spot levels S (column vector) against all contracts of one side,
+    from blackscholes.calc_black_scholes (d1, d2 and the normal pdf are evaluated once
+    and shared by every requested greek).
+
+    - gamma: Black-Scholes gamma
+    - vanna: dDelta/dvol
+    - charm: delta decay per year
+    - delta: exp(-qT) N(d1) for calls, -exp(-qT) N(-d1) for puts
+    """
+    return calc_black_scholes(S, inputs['K'], inputs['T'], inputs['vol'], r, q, put, greeks, dtype=inputs['K'].dtype)
+
+def calc_exposure_surface(df, levels, greeks=SURFACE_GREEKS, chunk_size=None, dtype=np.float64,
+                          max_bytes=LADDER_MAX_BYTES, membership=None, r=0.0, q=0.0):
+    """
+    Calculate the total (call minus put) exposure of several greeks at every spot level.
 
-def find_zero_vanna_levels(df, fromStrike, toStrike):
-    # Generate spot levels
-    levels = np.linspace(fromStrike, toStrike, 240)
+    All levels x contracts are evaluated as 2-D NumPy broadcasts, split into chunks of
+    levels so the temporaries stay within max_bytes. d1 is computed once per
+    (level, contract) for all greeks. Gamma and vanna match calling
+    calc_gamma_exposure_vectorized / calc_vanna_exposure_vectorized once per level.
 
-    # Calculate Vanna exposures for all spot levels
-    vanna_results = [calc_vanna_exposure_vectorized(spot, df) 
-                     for spot in levels]
+    Parameters:
+        df (pd.DataFrame): Options data with StrikePrice, daysTillExp, IV and OpenInt columns.
+        levels (np.array): Spot levels.
+        greeks (tuple): Greeks to compute, any of SURFACE_GREEKS.
+        chunk_size (int): Number of levels per chunk, derived from max_bytes if None.
+        dtype: Floating point type used for the computation.
+        max_bytes (int): Memory budget for one chunk.
+        membership (np.array): Optional (rows x buckets) boolean matrix. When given, the
+            contracts are evaluated once and reduced separately for every bucket.
+        r (float): Risk free rate.
+        q (float): Dividend yield.
 
-    # Extract results for each Vanna exposure type
-    #totalVanna = zip(*vanna_results)
+    Returns:
+        dict: Exposure per level (not normalized) for every greek, shaped (levels,) or
+        (levels, buckets) when membership is given.
+    """
+    levels = np.asarray(levels, dtype=dtype)
+    num_buckets = 1 if membership is None else membership.shape[1]
+    totals = {greek: np.zeros((len(levels), num_buckets), dtype=np.float64) for greek in greeks}
+
+    for side, sign in (('Call', 1), ('Put', -1)):
+        inputs = get_ladder_inputs(df, side, dtype)
+        if len(inputs['K']) == 0:
+            continue
+        if membership is None:
+            weights = inputs['oi'][:, None]
+        else:
+            weights = inputs['oi'][:, None] * membership[inputs['valid']]
+        exposure = calc_side_exposure(inputs, levels, weights, greeks, side == 'Put', chunk_size, dtype, max_bytes,
+                                      r, q)
+        for greek in greeks:
+            totals[greek] += sign * exposure[greek]
+
+    if membership is None:
+        return {greek: total[:, 0] for greek, total in totals.items()}
+    return totals
+
+def calc_side_exposure(inputs, levels, weights, greeks=SURFACE_GREEKS, put=False, chunk_size=None,
+                       dtype=np.float64, max_bytes=LADDER_MAX_BYTES, r=0.0, q=0.0):
+    """
+    Unsigned exposure of the contracts of one side at every level, see calc_exposure_surface.
 
-    # Convert to arrays and normalize
-    totalVanna = np.array(vanna_results) / 10**9
+    :param inputs: Ladder inputs from get_ladder_inputs / make_ladder_inputs.
+    :param levels: Spot levels.
+    :param weights: (contracts x buckets) open interest of every contract in every bucket.
+    :return: Dictionary of greek to (levels x buckets) exposure.
+    """
+    totals = {greek: np.zeros((len(levels), weights.shape[1]), dtype=np.float64) for greek in greeks}
+    if len(inputs['K']) == 0:
+        return totals
+    # max_bytes is the budget of a float64 ladder, a float32 ladder takes the same chunks of
+    # levels so its temporaries use half the memory
+    budget = max_bytes * np.dtype(dtype).itemsize // np.dtype(np.float64).itemsize
+    step = chunk_size or get_ladder_chunk_size(len(inputs['K']), dtype, budget, temporaries=4 + len(greeks))
+    for start in range(0, len(levels), step):
+        S = levels[start:start + step, None]
+        units = calc_greek_ladder(S, inputs, greeks, put, r, q)
+        for greek, unit in units.items():
+            # Exposure = unit greek * spot * open interest, summed over contracts
+            totals[greek][start:start + step] = sum_contracts(unit, weights) * S
+    return totals
+
+# Contracts per float64 block when summing a float32 ladder
+LADDER_SUM_BLOCK = 4096
+
+def sum_contracts(unit, weights, block=LADDER_SUM_BLOCK):
+    """
+    (levels x contracts) unit greeks times (contracts x buckets) weights, summed in float64.
+
+    The positive and negative exposures of a float32 ladder cancel out and a float32 sum
+    would lose the digits of the net exposure. Its contracts are converted to float64 one
+    block at a time, so the float64 copy stays small next to the float32 ladder.
+    """
+    if unit.dtype == np.float64 and weights.dtype == np.float64:
+        return np.matmul(unit, weights)
+    total = np.zeros((unit.shape[0], weights.shape[1]), dtype=np.float64)
+    for start in range(0, unit.shape[1], block):
+        total += np.matmul(unit[:, start:start + block].astype(np.float64),
+                           weights[start:start + block].astype(np.float64))
+    return total
+
+class IncrementalExposureSurface:
+    """
+    Drop-in replacement of calc_exposure_surface that keeps the curves of the previous
+    call and only evaluates what changed since.
+
+    Contracts are matched by option symbol. A contract whose strike, time to expiry,
+    IV, open interest or bucket membership changed is removed with its previous inputs
+    and added back with the new ones. Spot levels are matched by value: the levels of
+    get_ladder_levels stay on the same grid when the spot moves, so the levels shared
+    with the previous call keep their curves and only the new levels at the ends are
+    evaluated on every contract. The cost is proportional to the changed contracts
+    times the levels plus the contracts times the new levels.
+
+    A full recompute is done when the greeks, buckets, rates or dtype change, when the
+    incremental cost is above max_changed of a full recompute, and every full_every
+    calls to bound the rounding drift. verify() compares the last result with a full
+    recompute.
+
+    One instance per symbol, kept by the caller between snapshots, see make_incremental_levels.
+    """
 
-    zeroVanna = find_zero_vanna(totalVanna, levels)  # Reuse the same interpolation function
+    def __init__(self, full_every=60, max_changed=0.5):
+        self.full_every = full_every
+        self.max_changed = max_changed
+        self.state = None
+        self.calls = 0
+        self.stats = {}
+
+    def __call__(self, df, levels, greeks=SURFACE_GREEKS, chunk_size=None, dtype=np.float64,
+                 max_bytes=LADDER_MAX_BYTES, membership=None, r=0.0, q=0.0):
+        levels = np.asarray(levels, dtype=dtype)
+        if membership is None:
+            membership = np.ones((len(df), 1), dtype=bool)
+        sides = {side: self.get_contracts(df, side, membership, dtype) for side in ('Call', 'Put')}
+        num_contracts = sum(len(c['keys']) for c in sides.values())
+
+        state = self.state
+        full = (state is None or self.calls % self.full_every == 0 or state['greeks'] != tuple(greeks)
+                or state['levels'].dtype != levels.dtype or state['num_buckets'] != membership.shape[1]
+                or state['rates'] != (r, q))
+
+        changes = {}
+        kept, fresh = np.arange(len(levels)), np.array([], dtype=np.intp)
+        if not full:
+            # Levels of the previous call keep their exposure, the others are evaluated on every contract
+            _, kept, previous = np.intersect1d(levels, state['levels'], assume_unique=True, return_indices=True)
+            fresh = np.setdiff1d(np.arange(len(levels)), kept)
+            for side, contracts in sides.items():
+                changes[side] = diff_keyed_rows(state['sides'][side], contracts)
+                full = full or changes[side] is None
+        changed = sum(len(added) for added, _ in changes.values())
+        cost = changed * len(kept) + num_contracts * len(fresh)
+        full = full or len(kept) == 0 or cost > self.max_changed * max(1, num_contracts * len(levels))
+
+        totals = {greek: np.zeros((len(levels), membership.shape[1]), dtype=np.float64) for greek in greeks}
+        if full:
+            kept, fresh = np.arange(len(levels)), np.array([], dtype=np.intp)
+            changes = {side: (np.arange(len(contracts['keys'])), np.array([], dtype=np.intp))
+                       for side, contracts in sides.items()}
+        else:
+            for greek in greeks:
+                totals[greek][kept] = state['totals'][greek][previous]
+
+        for side, sign in (('Call', 1), ('Put', -1)):
+            added, removed = changes[side]
+            updates = [(sides[side], added, kept, 1)]
+            if not full:
+                updates += [(state['sides'][side], removed, kept, -1),
+                            (sides[side], np.arange(len(sides[side]['keys'])), fresh, 1)]
+            for contracts, rows, at, direction in updates:
+                if len(rows) == 0 or len(at) == 0:
+                    continue
+                inputs = make_ladder_inputs(*contracts['values'][rows].T)
+                weights = inputs['oi'][:, None] * contracts['membership'][rows]
+                exposure = calc_side_exposure(inputs, levels[at], weights, greeks, side == 'Put', chunk_size, dtype,
+                                              max_bytes, r, q)
+                for greek in greeks:
+                    totals[greek][at] += direction * sign * exposure[greek]
+
+        self.state = {'levels': levels, 'greeks': tuple(greeks), 'num_buckets': membership.shape[1],
+                      'rates': (r, q), 'sides': sides, 'totals': totals}
+        self.calls += 1
+        self.stats = {'mode': 'full' if full else 'incremental', 'changed': changed, 'contracts': num_contracts,
+                      'new_levels': len(fresh), 'levels': len(levels)}
+        return {greek: total.copy() for greek, total in totals.items()}
+
+    @staticmethod
+    def get_contracts(df, side, membership, dtype):
+        """Symbols, ladder input columns (K, T, vol, oi) and memberships of the contributing contracts."""
+        inputs = get_ladder_inputs(df, side, dtype)
+        valid = inputs['valid']
+        return {
+            'keys': df[side + 's'].to_numpy()[valid],
+            'values': np.column_stack([inputs[name] for name in ('K', 'T', 'vol', 'oi')]),
+            'membership': membership[valid],
+        }
+
+    def verify(self, df, levels, greeks=SURFACE_GREEKS, membership=None, dtype=np.float64, r=0.0, q=0.0):
+        """
+        Compare the curves of the last call with a full recompute of df.
+
+        :return: Largest absolute difference relative to the largest absolute exposure, per greek.
+        """
+        expected = calc_exposure_surface(df, levels, greeks, dtype=dtype,
+                                         membership=np.ones((len(df), 1), dtype=bool) if membership is None else membership,
+                                         r=r, q=q)
+        errors = {}
+        for greek in greeks:
+            scale = max(np.abs(expected[greek]).max(initial=0), np.finfo(dtype).tiny)
+            errors[greek] = float(np.abs(self.state['totals'][greek] - expected[greek]).max(initial=0) / scale)
+        return errors
+
+def diff_keyed_rows(old, new):
+    """
+    Rows of new to add and rows of old to remove between two snapshots, matched by key.
+    A row is kept when its values and membership are unchanged.
+
+    :param old, new: Dictionaries with 'keys', (rows x fields) 'values' and (rows x groups) 'membership'.
+    :return: (rows of new to add, rows of old to remove), None when the keys are not unique.
+    """
+    oldIndex = pd.Index(old['keys'])
+    if not oldIndex.is_unique or not pd.Index(new['keys']).is_unique:
+        return None
+    position = oldIndex.get_indexer(new['keys'])
+    matched = np.flatnonzero(position >= 0)
+    same = ((new['values'][matched] == old['values'][position[matched]]).all(axis=1)
+            & (new['membership'][matched] == old['membership'][position[matched]]).all(axis=1))
+    kept = np.zeros(len(old['keys']), dtype=bool)
+    kept[position[matched[same]]] = True
+    added = np.ones(len(new['keys']), dtype=bool)
+    added[matched[same]] = False
+    return np.flatnonzero(added), np.flatnonzero(~kept)
+
+def calc_exposure_ladder(df, levels, greek='gamma', chunk_size=None, dtype=np.float64, max_bytes=LADDER_MAX_BYTES):
+    """Calculate the total exposure of a single greek at every spot level, see calc_exposure_surface."""
+    return calc_exposure_surface(df, levels, (greek,), chunk_size, dtype, max_bytes)[greek]
+
+def get_greek_surface(df, fromStrike, toStrike, greeks=SURFACE_GREEKS, num_levels=LADDER_NUM_LEVELS,
+                      chunk_size=None, dtype=np.float64):
+    """
+    Calculate the normalized exposure curves of several greeks between fromStrike and
+    toStrike in one pass, with the zero gamma and zero vanna crossings.
+
+    Returns:
+        dict: 'levels', one curve (in billions) per greek, and 'zero_gamma' / 'zero_vanna'
+        when the corresponding greek was requested.
+    """
+    surfaces = get_bucket_greek_surfaces(df, {'All': np.ones(len(df), dtype=bool)}, fromStrike, toStrike,
+                                         greeks, num_levels, chunk_size, dtype)
+    return surfaces['All']
+
+def get_bucket_greek_surfaces(df, buckets, fromStrike, toStrike, greeks=SURFACE_GREEKS,
+                              num_levels=LADDER_NUM_LEVELS, chunk_size=None, dtype=np.float64,
+                              exposure=calc_exposure_surface):
+    """
+    Calculate the greek surface of every expiry bucket, see get_greek_surface.
+    The contracts of df are evaluated once for all buckets.
 
+    :param df: Options DataFrame containing the rows of every bucket.
+    :param buckets: Dictionary of bucket name to boolean row mask of df.
+    :param exposure: calc_exposure_surface or an IncrementalExposureSurface.
+    :return: Dictionary of bucket name to greek surface.
+    """
+    names = list(buckets)
+    membership = np.column_stack([np.asarray(buckets[name], dtype=bool) for name in names])
+    levels = get_ladder_levels(fromStrike, toStrike, num_levels, dtype)
+    curves = exposure(df, levels, greeks, chunk_size=chunk_size, dtype=dtype, membership=membership)
+
+    surfaces = {}
+    for b, name in enumerate(names):
+        surface = {'levels': levels}
+        for greek, curve in curves.items():
+            surface[greek] = curve[:, b] / 10**9
+        if 'gamma' in surface:
+            surface['zero_gamma'] = find_zero_gamma(surface['gamma'], levels)
+        if 'vanna' in surface:
+            surface['zero_vanna'] = find_zero_vanna(surface['vanna'], levels)
+        surfaces[name] = surface
+    return surfaces
+
+def get_exposure_curve(df, fromStrike, toStrike, greek='gamma', num_levels=LADDER_NUM_LEVELS,
+                       chunk_size=None, dtype=np.float64):
+    """
+    Calculate the normalized exposure curve of a greek between fromStrike and toStrike
+    and its zero crossing.
+
+    Returns:
+        tuple: (levels, exposure in billions, zero crossing level)
+    """
+    surface = get_greek_surface(df, fromStrike, toStrike, (greek,), num_levels, chunk_size, dtype)
+    return surface['levels'], surface[greek], surface.get('zero_' + greek)
+
+# Zero crossing solver settings
+ZERO_SOLVER_COARSE_LEVELS = 25
+ZERO_SOLVER_TICK_SIZE = 0.01
+# Zero gamma / vanna solver of calc_gex_levels: 'grid' interpolates the LADDER_NUM_LEVELS ladder,
+# 'brent' refines a ZERO_SOLVER_COARSE_LEVELS grid to ZERO_SOLVER_TICK_SIZE (see get_bucket_exposure_zeros)
+ZERO_SOLVER = os.getenv("ZERO_SOLVER", "grid")
+
+def get_exposure_function(df, greek='gamma', rows=None, dtype=np.float64):
+    """
+    Exposure of a greek at a single spot level, with the contract inputs extracted once.
+
+    :param rows: Optional boolean row mask of df (e.g. a bucket), all rows by default.
+    :return: Function of the spot level returning the total (call minus put) exposure.
+    """
+    weights = np.ones((len(df), 1), dtype=dtype) if rows is None else np.asarray(rows, dtype=dtype)[:, None]
+    sides = []
+    for side, sign in (('Call', 1), ('Put', -1)):
+        inputs = get_ladder_inputs(df, side, dtype)
+        sides.append((inputs, inputs['oi'][:, None] * weights[inputs['valid']], sign, side == 'Put'))
+
+    def exposure(S):
+        level = np.array([S], dtype=dtype)
+        return float(sum(sign * calc_side_exposure(inputs, level, w, (greek,), put, dtype=dtype)[greek][0, 0]
+                         for inputs, w, sign, put in sides))
+    return exposure
+
+def find_zero_crossings(exposure, levels, values, xtol):
+    """
+    Refine every sign change of values (sampled at levels) with Brent's method.
+
+    :param exposure: Function of the spot level, e.g. from get_exposure_function.
+    :param levels: Coarse spot levels.
+    :param values: Exposure at levels.
+    :param xtol: Absolute tolerance of the crossings.
+    :return: (sorted crossing levels, number of exposure evaluations)
+    """
+    levels = np.asarray(levels, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    # Like the grid, an exposure that is zero everywhere (e.g. an empty bucket) has no crossing
+    crossings = list(levels[values == 0]) if values.any() else []
+    evaluations = 0
+    for i in np.flatnonzero(values[:-1] * values[1:] < 0):
+        root, result = scipy.optimize.brentq(exposure, levels[i], levels[i + 1], xtol=xtol, full_output=True)
+        crossings.append(root)
+        evaluations += result.function_calls
+    return np.sort(np.array(crossings, dtype=np.float64)), evaluations
+
+def find_exposure_zeros(df, fromStrike, toStrike, greek='gamma', tick_size=ZERO_SOLVER_TICK_SIZE, ticks=1,
+                        num_levels=ZERO_SOLVER_COARSE_LEVELS, rows=None, dtype=np.float64):
+    """
+    Find all the levels between fromStrike and toStrike where the exposure of a greek
+    crosses zero, to within ticks price ticks.
+
+    The exposure is sampled on a coarse grid of about num_levels levels (get_ladder_levels) to bracket the sign
+    changes, and each bracket is refined with Brent's method. Crossings closer to each
+    other than one grid step can cancel out and be missed, raise num_levels if needed.
+
+    Returns:
+        dict: 'crossings' (sorted levels), 'levels' and 'values' of the coarse grid
+        (exposure in billions) and 'evaluations', the number of exposure evaluations
+        (coarse levels plus Brent iterations).
+    """
+    levels = get_ladder_levels(fromStrike, toStrike, num_levels, dtype)
+    exposure = get_exposure_function(df, greek, rows, dtype)
+    membership = np.ones((len(df), 1), dtype=bool) if rows is None else np.asarray(rows, dtype=bool)[:, None]
+    values = calc_exposure_surface(df, levels, (greek,), dtype=dtype, membership=membership)[greek][:, 0]
+    crossings, evaluations = find_zero_crossings(exposure, levels, values, tick_size * ticks)
+    return {
+        'crossings': crossings,
+        'levels': levels,
+        'values': values / 10**9,
+        'evaluations': len(levels) + evaluations,
+    }
+
+def find_zero_gamma_levels(df, fromStrike, toStrike, num_levels=LADDER_NUM_LEVELS, chunk_size=None, dtype=np.float64,
+                           solver='grid', tick_size=ZERO_SOLVER_TICK_SIZE):
+    """
+    First zero gamma crossing, None if there is none.
+    solver='grid' interpolates on num_levels levels, solver='brent' uses find_exposure_zeros.
+    """
+    if solver == 'brent':
+        crossings = find_exposure_zeros(df, fromStrike, toStrike, 'gamma', tick_size, dtype=dtype)['crossings']
+        return crossings[0] if len(crossings) else None
+    _, _, zeroGamma = get_exposure_curve(df, fromStrike, toStrike, 'gamma', num_levels, chunk_size, dtype)
+    return zeroGamma
+
+def find_zero_vanna_levels(df, fromStrike, toStrike, num_levels=LADDER_NUM_LEVELS, chunk_size=None, dtype=np.float64,
+                           solver='grid', tick_size=ZERO_SOLVER_TICK_SIZE):
+    """
+    First zero vanna crossing, the weighted average level if there is none.
+    solver='grid' interpolates on num_levels levels, solver='brent' uses find_exposure_zeros.
+    """
+    if solver == 'brent':
+        zeros = find_exposure_zeros(df, fromStrike, toStrike, 'vanna', tick_size, dtype=dtype)
+        if len(zeros['crossings']):
+            return zeros['crossings'][0]
+        return find_zero_vanna(zeros['values'], zeros['levels'])
+    _, _, zeroVanna = get_exposure_curve(df, fromStrike, toStrike, 'vanna', num_levels, chunk_size, dtype)
     return zeroVanna
 
+def get_bucket_exposure_zeros(df, buckets, fromStrike, toStrike, tick_size=ZERO_SOLVER_TICK_SIZE,
+                              num_levels=ZERO_SOLVER_COARSE_LEVELS, dtype=np.float64, exposure=calc_exposure_surface):
+    """
+    Zero gamma and zero vanna of every expiry bucket with Brent's method, the solver='brent'
+    counterpart of get_bucket_greek_surfaces.
+
+    The coarse grid of all buckets and both greeks is evaluated in one pass, then every
+    bracket is refined on the contracts of its bucket. As with the ladder, a bucket without
+    a gamma crossing has no zero gamma and one without a vanna crossing gets the weighted
+    average level (of the coarse grid).
+
+    :param buckets: Dictionary of bucket name to boolean row mask of df.
+    :param exposure: calc_exposure_surface or an IncrementalExposureSurface for the coarse grid.
+    :return: Dictionary of bucket name to dictionary with 'zero_gamma', 'zero_vanna' and
+             'evaluations' (coarse levels plus Brent iterations).
+    """
+    names = list(buckets)
+    membership = np.column_stack([np.asarray(buckets[name], dtype=bool) for name in names])
+    levels = get_ladder_levels(fromStrike, toStrike, num_levels, dtype)
+    curves = exposure(df, levels, ('gamma', 'vanna'), dtype=dtype, membership=membership)
+
+    zeros = {}
+    for b, name in enumerate(names):
+        zeros[name] = {'evaluations': len(levels)}
+        for greek in ('gamma', 'vanna'):
+            values = curves[greek][:, b]
+            function = get_exposure_function(df, greek, membership[:, b], dtype)
+            crossings, evaluations = find_zero_crossings(function, levels, values, tick_size)
+            zeros[name]['evaluations'] += evaluations
+            if len(crossings):
+                zeros[name]['zero_' + greek] = crossings[0]
+            else:
+                zeros[name]['zero_' + greek] = None if greek == 'gamma' else find_zero_vanna(values, levels)
+    return zeros
+
 def calculate_gex_ladder(df):
     df_sorted = df.sort_values(by=['ExpirationDate', 'StrikePrice'])
      # Find the first and second expiration dates
@@ -470,198 +1477,661 @@ def calculate_gex_ladder(df):
 
     return first_expiration_data, second_expiration_data, call_wall_0, put_wall_0, call_wall_1, put_wall_1, call_wall, put_wall, avg_wall_0, avg_wall_1, avg_wall
 
-def get_additional_gex_values(df, spotPrice):
-    """
-    Calculate additional GEX values for the given DataFrame and spot price.
-    Returns results in the same format as the original implementation.
+# Expiry buckets: each definition picks the expirations of a bucket from the sorted
+# unique expirations inside the strike window
+def get_all_expiries(expiries, now):
+    return list(expiries)
+
+def get_first_expiry(expiries, now):
+    return [e for e in expiries if e > now][:1]
+
+def get_second_expiry(expiries, now):
+    return [e for e in expiries if e > now][1:2]
+
+def get_weekly_expiry(expiries, now):
+    return [get_next_friday(e) for e in get_first_expiry(expiries, now)]
+
+def get_monthly_expiry(expiries, now):
+    return [e for e in expiries if isThirdFriday(e)][:1]
+
+def get_0dte_expiry(expiries, now):
+    return [e for e in expiries if e.date() == now.date()]
+
+def get_quarterly_expiry(expiries, now):
+    return [e for e in expiries if isThirdFriday(e) and e.month in (3, 6, 9, 12)][:1]
+
+EXPIRY_BUCKETS = {
+    'All': get_all_expiries,
+    'First': get_first_expiry,
+    'Second': get_second_expiry,
+    'Weekly': get_weekly_expiry,
+    'Monthly': get_monthly_expiry,
+    '0DTE': get_0dte_expiry,
+    'Quarterly': get_quarterly_expiry,
+}
+
+# Buckets reported by get_gex_and_flow_levels and the suffix of their keys
+BUCKET_SUFFIXES = {'All': '', 'First': '_1', 'Second': '_2', 'Weekly': '_w', 'Monthly': '_m'}
+
+# Per-bucket metrics, in the order of the get_gex_and_flow_levels dictionaries
+BUCKET_METRICS = [
+    'vol_call', 'vol_put', 'oi_call', 'oi_put', 'vol_avg', 'oi_avg',
+    'vol_resistance1', 'vol_support1', 'vol_resistance2', 'vol_support2',
+    'vol_resistance3', 'vol_support3', 'vol_resistance4', 'vol_support4',
+    'resistances', 'supports', 'zero_gamma', 'zero_vanna',
+    'callFlow', 'deltaFlow', 'putFlow', 'callOrderFlow', 'putOrderFlow', 'deltaOrderFlow', 'ethBlue', 'ethPurple',
+    'call_resistance_oi', 'put_support_oi', 'call_resistance_vol', 'put_support_vol',
+    'call_resistance_gex_oi', 'put_support_gex_oi', 'call_resistance_gex_vol', 'put_support_gex_vol',
+    'call_resistance_wall', 'put_support_wall', 'call_resistance_net_gex_oi', 'put_support_net_gex_oi',
+    'call_resistance_net_gex_vol', 'put_support_net_gex_vol', 'call_resistance_vol_oi', 'put_support_vol_oi',
+    'call_resistance_net_vol_oi', 'put_support_net_vol_oi',
+    'callbid_vol', 'putbid_vol', 'tot_vol', 'calloi_vol', 'putoi_vol', 'tot_oi',
+    'zero_gamma1', 'gamma_flip1', 'gamma_flip2', 'pain_volume_strike', 'pain_oi_strike',
+    'zero_pos_strike', 'zero_neg_strike', 'tot_vol_ratio', 'tot_oi_ratio',
+]
+
+# Resistance (strikes above spot) and support (strikes below spot) levels: key, metric column, side
+WALL_LEVELS = [
+    ('call_resistance_oi', 'CallOpenInt', 'above'), ('put_support_oi', 'PutOpenInt', 'below'),
+    ('call_resistance_vol', 'CallVol', 'above'), ('put_support_vol', 'PutVol', 'below'),
+    ('call_resistance_gex_oi', 'CallGEXOI', 'above'), ('put_support_gex_oi', 'PutGEXOI', 'below'),
+    ('call_resistance_gex_vol', 'CallGEXVolume', 'above'), ('put_support_gex_vol', 'PutGEXVolume', 'below'),
+    ('call_resistance_wall', 'CallWall', 'above'), ('put_support_wall', 'PutWall', 'below'),
+    ('call_resistance_net_gex_oi', 'NetGEXOI', 'above'), ('put_support_net_gex_oi', 'NetGEXOI', 'below'),
+    ('call_resistance_net_gex_vol', 'NetGEXVolume', 'above'), ('put_support_net_gex_vol', 'NetGEXVolume', 'below'),
+    ('call_resistance_vol_oi', 'CallVolOI', 'above'), ('put_support_vol_oi', 'PutVolOI', 'below'),
+    ('call_resistance_net_vol_oi', 'NetVolOI', 'above'), ('put_support_net_vol_oi', 'NetVolOI', 'below'),
+]
+
+BUCKET_SUM_COLUMNS = ['CallStrikeVol', 'PutStrikeVol', 'CallStrikeOI', 'PutStrikeOI', 'CallVol', 'PutVol',
+                      'CallOpenInt', 'PutOpenInt', 'CallBidOI', 'PutBidOI', 'CallBidVol', 'PutBidVol']
+
+def get_bucket_membership(df, window, buckets, now=None):
     """
-    import numpy as np
-    
-    # Sort and filter the dataframe for the relevant strike range
-    #df_sorted = df.sort_values(by=['ExpirationDate', 'StrikePrice'])
-    #strike_range = (0.9 * spotPrice, 1.1 * spotPrice)
-    #df_filtered = df_sorted[(df_sorted['StrikePrice'] >= strike_range[0]) & (df_sorted['StrikePrice'] <= strike_range[1])]
-
-    # Pre-compute masks for calls above and puts below the spot price
-    calls_above_spot = df['StrikePrice'] > spotPrice
-    puts_below_spot = df['StrikePrice'] < spotPrice
-
-    # Define a helper function for repeated operations
-    def get_resistance_support(column):
-        """Find resistance and support levels based on the given column."""
-        call_resistance = df.loc[calls_above_spot].nlargest(1, column)['StrikePrice'].iloc[0] \
-            if not df.loc[calls_above_spot].empty else None
-        put_support = df.loc[puts_below_spot].nlargest(1, column)['StrikePrice'].iloc[0] \
-            if not df.loc[puts_below_spot].empty else None
-        return call_resistance, put_support
-
-    # Calculate resistance and support levels
-    metrics_columns = ['CallOpenInt', 'PutOpenInt', 'CallVol', 'PutVol', 'CallGEXOI', 'PutGEXOI',
-                       'CallGEXVolume', 'PutGEXVolume', 'CallWall', 'PutWall', 'NetGEXOI',
-                       'NetGEXVolume', 'CallVolOI', 'PutVolOI', 'NetVolOI']
-    resistance_support = {col: get_resistance_support(col) for col in metrics_columns}
-
-    # Aggregate data for volume and open interest calculations
-    callbid_vol = np.divide(df['CallBidVol'].sum(), df['CallVol'].sum(), where=df['CallVol'].sum() != 0)
-    putbid_vol = np.divide(df['PutBidVol'].sum(), df['PutVol'].sum(), where=df['PutVol'].sum() != 0)
-    volume = callbid_vol - putbid_vol
-
-    calloi_vol = np.divide(df['CallOpenInt'].sum(), df['CallVol'].sum(), where=df['CallVol'].sum() != 0)
-    putoi_vol = np.divide(df['PutOpenInt'].sum(), df['PutVol'].sum(), where=df['PutVol'].sum() != 0)
-    open_interest = calloi_vol - putoi_vol
-
-    return (
-        resistance_support['CallOpenInt'][0], resistance_support['PutOpenInt'][1],
-        resistance_support['CallVol'][0], resistance_support['PutVol'][1],
-        resistance_support['CallGEXOI'][0], resistance_support['PutGEXOI'][1],
-        resistance_support['CallGEXVolume'][0], resistance_support['PutGEXVolume'][1],
-        resistance_support['CallWall'][0], resistance_support['PutWall'][1],
-        resistance_support['NetGEXOI'][0], resistance_support['NetGEXOI'][1],
-        resistance_support['NetGEXVolume'][0], resistance_support['NetGEXVolume'][1],
-        resistance_support['CallVolOI'][0], resistance_support['PutVolOI'][1],
-        resistance_support['NetVolOI'][0], resistance_support['NetVolOI'][1],
-        callbid_vol, putbid_vol, volume, calloi_vol, putoi_vol, open_interest
-    )
-
-def get_flip_pain_points(df1):
-    df = df1.copy()
-    #dfNext["CumGamma"] = dfNext["TotalGamma"].cumsum()
-    # Initialize an empty column to store the result
-    results = []
-    # Iterate through each row to apply the logic dynamically
-    for i in range(len(df)):
-        # Calculate cumulative sum from row 10 up to the current row
-        cumulative_sum = df['TotalGamma'][:i + 1].sum()
-
-        # Calculate sum of all rows below the current row
-        remaining_sum = df['TotalGamma'][i + 1:].sum()
-
-        # Compute the result for the current row
-        result = cumulative_sum - remaining_sum
-        results.append(result)
-
-    # Add the results back to the DataFrame
-    df['CumGamma'] = results
-    zero_gamma_idx = df["CumGamma"].abs().idxmin()
-    zero_gamma = df.loc[zero_gamma_idx, "StrikePrice"]   
-
-    # Total Positive and Negative Gamma-based metrics
-    tot_pos_vol = df[df["TotalGamma"] > 0]["CallVol"].sum() + df[df["TotalGamma"] > 0]["PutVol"].sum()
-    tot_pos_oi = df[df["TotalGamma"] > 0]["CallOpenInt"].sum() + df[df["TotalGamma"] > 0]["PutOpenInt"].sum()
-    tot_neg_vol = df[df["TotalGamma"] < 0]["CallVol"].sum() + df[df["TotalGamma"] < 0]["PutVol"].sum()
-    tot_neg_oi = df[df["TotalGamma"] < 0]["CallOpenInt"].sum() + df[df["TotalGamma"] < 0]["PutOpenInt"].sum()
-    tot_vol = tot_pos_vol/tot_neg_vol
-    tot_oi = tot_pos_oi/tot_neg_oi
-
-    # Gamma Flips
-    gamma_flip1 = df[df["TotalGamma"] < 0]["StrikePrice"].max()
-    gamma_flip2 = df[df["TotalGamma"] > 0]["StrikePrice"].min()
-
-    results = []
-    # Iterate through each row to apply the logic dynamically
-    for i in range(len(df)):
-        # Calculate cumulative sum from row 10 up to the current row
-        cumulative_sum = df['TotalVolume'][:i + 1].sum()
-
-        # Calculate sum of all rows below the current row
-        remaining_sum = df['TotalVolume'][i + 1:].sum()
-
-        # Compute the result for the current row
-        result = cumulative_sum - remaining_sum
-        results.append(result)
-
-    df['CumVolume'] = results
-
-    # Find the pain point strike based on volume
-    pain_volume_idx = df['CumVolume'].abs().idxmin()
-    pain_volume_strike = df.loc[pain_volume_idx, 'StrikePrice']
-
-    #dfNext['CumOpenInterest'] = dfNext['TotalOpenInterest'].cumsum()
-    results = []
-    # Iterate through each row to apply the logic dynamically
-    for i in range(len(df)):
-        # Calculate cumulative sum from row 10 up to the current row
-        cumulative_sum = df['TotalOpenInterest'][:i + 1].sum()
-
-        # Calculate sum of all rows below the current row
-        remaining_sum = df['TotalOpenInterest'][i + 1:].sum()
-
-        # Compute the result for the current row
-        result = cumulative_sum - remaining_sum
-        results.append(result)
-
-    df['CumOpenInterest'] = results
-
-    # Find the pain point strike based on open interest
-    pain_oi_idx = df['CumOpenInterest'].abs().idxmin()
-    pain_oi_strike = df.loc[pain_oi_idx, 'StrikePrice']
-
-    zero_pos_vol = df.loc[zero_gamma_idx:, 'TotalVolume'].sum()
-
-    # Find the strike for zero positive volume
-    zero_pos_strike_idx = df.loc[zero_gamma_idx:].query("CumVolume >= @zero_pos_vol").index.min()
-    zero_pos_strike = df.loc[zero_pos_strike_idx, 'StrikePrice'] if zero_pos_strike_idx is not None else None
-
-    # Zero Negative Volume: Total volume below zero_gamma_idx
-    zero_neg_vol = df.loc[:zero_gamma_idx - 1, 'TotalVolume'].sum()
-
-    # Find the strike for zero negative volume
-    zero_neg_strike_idx = df.loc[:zero_gamma_idx - 1].query("CumVolume <= @zero_neg_vol").index.max()
-    zero_neg_strike = df.loc[zero_neg_strike_idx, 'StrikePrice'] if zero_neg_strike_idx is not None else None
-
-    return zero_gamma, tot_vol, tot_oi, gamma_flip1, gamma_flip2, pain_volume_strike, pain_oi_strike, zero_pos_strike, zero_neg_strike
-
-def calculate_flow_indicator(df):
-    multiplier = 1000000
-    # if symbol == 'MES':
-    #     multiplier = 1000000
-    # elif symbol == 'MNQ':
-    #     multiplier = 150000
-    # elif symbol == 'M2K':
-    #     multiplier = 25000
+    Tag the bucket memberships of every row once.
 
-    def safe_value(value):
-        return value if value != 0 and value != 0.0 else 0.01
-
-    red_oi = safe_value(df['PutBidOI'].sum() / multiplier)
-    green_oi = safe_value(df['CallBidOI'].sum() / multiplier)
-    delta_oi = safe_value(green_oi - red_oi)
-    red_vol = safe_value(df['PutBidVol'].sum() / multiplier)
-    green_vol = safe_value(df['CallBidVol'].sum() / multiplier)
-    delta_vol = safe_value(green_vol - red_vol)
-    eth_blue = safe_value(green_vol / red_vol)
-    eth_purple = safe_value((red_vol / green_vol) * -1)
-
-    return red_oi, green_oi, delta_oi, red_vol, green_vol, delta_vol, eth_blue, eth_purple
-
-def calculate_flow_levels_for_expiration(df, spotPrice):
-    vCallPrice = df['CallStrikeVol'].sum()/df['CallVol'].sum()
-    vPutPrice = df['PutStrikeVol'].sum()/df['PutVol'].sum()
-    vCallOiPrice = df['CallStrikeOI'].sum()/df['CallOpenInt'].sum()
-    vPutOiPrice = df['PutStrikeOI'].sum()/df['PutOpenInt'].sum()
+    :param df: Options DataFrame sorted by ExpirationDate and StrikePrice.
+    :param window: Boolean row mask of the strike window the buckets are taken from.
+    :param buckets: Bucket names, keys of EXPIRY_BUCKETS.
+    :param now: Reference time for the next expirations, defaults to datetime.now().
+    :return: (rows x buckets) boolean matrix.
+    """
+    now = now or datetime.now()
+    codes, expiries = pd.factorize(df['ExpirationDate'])
+    window_expiries = sorted(expiries[np.unique(codes[window])])
+
+    membership = np.zeros((len(df), len(buckets)), dtype=bool)
+    for b, name in enumerate(buckets):
+        selected = expiries.isin(EXPIRY_BUCKETS[name](window_expiries, now))
+        membership[:, b] = window & selected[codes]
+    return membership
+
+def calc_bucket_flow_levels(sums):
+    """Volume and open interest weighted price levels and flow indicators for every bucket."""
+    levels = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vCallPrice = sums['CallStrikeVol'] / sums['CallVol']
+        vPutPrice = sums['PutStrikeVol'] / sums['PutVol']
+        vCallOiPrice = sums['CallStrikeOI'] / sums['CallOpenInt']
+        vPutOiPrice = sums['PutStrikeOI'] / sums['PutOpenInt']
     vAvgPrice = (vCallPrice + vPutPrice) / 2
-    vAvgOiPrice = (vCallOiPrice + vPutOiPrice) / 2
     vRes1Price = (vCallPrice + vAvgPrice) / 2
     vSup1Price = (vPutPrice + vAvgPrice) / 2
-    vRes2Price = (vCallPrice + vRes1Price)/2
-    vSup2Price = (vPutPrice + vSup1Price)/2
-    vRes3Price = (vCallPrice - (vRes2Price - vCallPrice))
-    vSup3Price = (vPutPrice - (vSup2Price - vPutPrice))
-    vRes4Price = (vRes3Price - (vCallPrice - vRes3Price))
-    vSup4Price = (vSup3Price - (vPutPrice - vSup3Price))
-    extremeValue = pd.concat([df.nsmallest(10, 'TotalGamma'), df.nlargest(10, 'TotalGamma')])
-    resistances = [x for x in extremeValue['StrikePrice'] if x >= spotPrice]
-    supports = [x for x in extremeValue['StrikePrice'] if x < spotPrice]
-    redOi, greenOi, deltaOi, redVol, greenVol, deltaVol, ethBlue, ethPurple = calculate_flow_indicator(df)
-
-    return vCallPrice, vPutPrice, vCallOiPrice, vPutOiPrice, vAvgPrice, vAvgOiPrice, vRes1Price, vSup1Price, vRes2Price, vSup2Price, vRes3Price, vSup3Price,  \
-        vRes4Price, vSup4Price, resistances, supports, \
-        redOi, greenOi, deltaOi, redVol, greenVol, deltaVol, ethBlue, ethPurple
-
-def get_gex_and_flow_levels(symbol, today):
+    vRes2Price = (vCallPrice + vRes1Price) / 2
+    vSup2Price = (vPutPrice + vSup1Price) / 2
+    vRes3Price = vCallPrice - (vRes2Price - vCallPrice)
+    vSup3Price = vPutPrice - (vSup2Price - vPutPrice)
+    levels.update({
+        'vol_call': vCallPrice, 'vol_put': vPutPrice, 'oi_call': vCallOiPrice, 'oi_put': vPutOiPrice,
+        'vol_avg': vAvgPrice, 'oi_avg': (vCallOiPrice + vPutOiPrice) / 2,
+        'vol_resistance1': vRes1Price, 'vol_support1': vSup1Price,
+        'vol_resistance2': vRes2Price, 'vol_support2': vSup2Price,
+        'vol_resistance3': vRes3Price, 'vol_support3': vSup3Price,
+        'vol_resistance4': vRes3Price - (vCallPrice - vRes3Price),
+        'vol_support4': vSup3Price - (vPutPrice - vSup3Price),
+    })
+
+    # Zero flows are replaced by 0.01
+    def safe_value(value):
+        return np.where(value != 0, value, 0.01)
+
+    multiplier = 1000000
+    red_oi = safe_value(sums['PutBidOI'] / multiplier)
+    green_oi = safe_value(sums['CallBidOI'] / multiplier)
+    red_vol = safe_value(sums['PutBidVol'] / multiplier)
+    green_vol = safe_value(sums['CallBidVol'] / multiplier)
+    levels.update({
+        'callFlow': green_oi, 'deltaFlow': safe_value(green_oi - red_oi), 'putFlow': red_oi,
+        'callOrderFlow': green_vol, 'putOrderFlow': red_vol, 'deltaOrderFlow': safe_value(green_vol - red_vol),
+        'ethBlue': safe_value(green_vol / red_vol), 'ethPurple': safe_value((red_vol / green_vol) * -1),
+    })
+
+    # Ratios with a zero denominator are 0
+    def safe_divide(a, b):
+        return np.divide(a, b, out=np.zeros_like(a), where=b != 0)
+
+    callbid_vol = safe_divide(sums['CallBidVol'], sums['CallVol'])
+    putbid_vol = safe_divide(sums['PutBidVol'], sums['PutVol'])
+    calloi_vol = safe_divide(sums['CallOpenInt'], sums['CallVol'])
+    putoi_vol = safe_divide(sums['PutOpenInt'], sums['PutVol'])
+    levels.update({
+        'callbid_vol': callbid_vol, 'putbid_vol': putbid_vol, 'tot_vol': callbid_vol - putbid_vol,
+        'calloi_vol': calloi_vol, 'putoi_vol': putoi_vol, 'tot_oi': calloi_vol - putoi_vol,
+    })
+    return levels
+
+# Metric columns of WALL_LEVELS, in order of first use
+WALL_COLUMNS = list(dict.fromkeys(column for _, column, _ in WALL_LEVELS))
+
+def calc_top_rows(values, groups, k=1):
+    """
+    Rows of the k largest values of every metric in every group of rows, in one masked
+    reduction over a (groups x rows x metrics) matrix.
+
+    Rows keep their order, so ties resolve to the first row like DataFrame.nlargest.
+    NaN values are skipped.
+
+    :param values: (rows x metrics) matrix.
+    :param groups: (rows x groups) boolean matrix, a row can be in several groups.
+    :param k: Number of rows per group and metric, in decreasing order of value.
+    :return: (groups x metrics x k) row indices, -1 where a group has fewer than k values.
+    """
+    rows = np.flatnonzero(groups.any(axis=1))
+    top = np.full((groups.shape[1], values.shape[1], k), -1, dtype=np.intp)
+    if len(rows) == 0:
+        return top
+    # (groups x metrics x rows), the reduction runs over the contiguous last axis
+    values = np.ascontiguousarray(values[rows].T)
+    values[np.isnan(values)] = -np.inf
+    masked = np.where(np.ascontiguousarray(groups[rows].T)[:, None, :], values[None], -np.inf)
+    if k == 1:
+        idx = masked.argmax(axis=2)[:, :, None]
+    else:
+        idx = np.argsort(-masked, axis=2, kind='stable')[:, :, :k]
+    found = np.take_along_axis(masked, idx, axis=2) > -np.inf
+    top[:, :, :idx.shape[2]] = np.where(found, rows[idx], -1)
+    return top
+
+def calc_top_strikes(strikes, values, groups, k=1):
+    """
+    Strikes of the k largest values of every metric in every group of rows, see calc_top_rows.
+
+    :param strikes: Strike of every row.
+    :return: (groups x metrics x k) strikes, NaN where a group has fewer than k values.
+    """
+    top = calc_top_rows(values, groups, k)
+    return np.where(top >= 0, np.asarray(strikes, dtype=np.float64)[top], np.nan)
+
+# Sides of the walls, in the group order of get_wall_inputs
+WALL_SIDES = ('above', 'below')
+
+def get_wall_inputs(df, membership, spotPrice):
+    """
+    Strikes, (rows x WALL_COLUMNS) values and (rows x sides * buckets) groups of calc_bucket_walls,
+    the groups being the strikes above spot of every bucket, then the strikes below spot.
+    """
+    strikes = df['StrikePrice'].to_numpy(dtype=np.float64)
+    # Only the order of the values matters, a float32 chain keeps its (rows x metrics x groups) matrix in float32
+    values = df[WALL_COLUMNS].to_numpy()
+    sides = {'above': strikes > spotPrice, 'below': strikes < spotPrice}
+    groups = np.concatenate([membership & sides[side][:, None] for side in WALL_SIDES], axis=1)
+    return strikes, values, groups
+
+def get_bucket_walls(top, num_buckets):
+    """Levels of calc_bucket_walls from the (sides * buckets x WALL_COLUMNS x k) top strikes."""
+    k = top.shape[2]
+    top = top.reshape(len(WALL_SIDES), num_buckets, len(WALL_COLUMNS), k)
+    walls = {}
+    for key, column, side in WALL_LEVELS:
+        levels = top[WALL_SIDES.index(side), :, WALL_COLUMNS.index(column)]
+        if k == 1:
+            walls[key] = [None if np.isnan(level[0]) else level[0] for level in levels]
+        else:
+            walls[key] = [[x for x in level if not np.isnan(x)] for level in levels]
+    return walls
+
+def calc_bucket_walls(df, membership, spotPrice, k=1):
+    """
+    Strike with the largest value of every WALL_LEVELS metric above or below spot, per bucket.
+    Ties resolve to the first row like DataFrame.nlargest, empty selections give None.
+
+    All buckets, sides and metrics are reduced at once by calc_top_strikes.
+
+    :param k: Number of strikes per level, k > 1 gives a list of the k strongest strikes instead of one strike.
+    :return: Dictionary of WALL_LEVELS key to a list with the level of every bucket.
+    """
+    strikes, values, groups = get_wall_inputs(df, membership, spotPrice)
+    return get_bucket_walls(calc_top_strikes(strikes, values, groups, k), membership.shape[1])
+
+def calc_bucket_aggregates(df, membership, spotPrice):
+    """
+    Sums of the BUCKET_SUM_COLUMNS and walls (calc_bucket_walls) of every bucket.
+
+    :return: (dictionary of column to the sum of every bucket, calc_bucket_walls dictionary)
+    """
+    values = df[BUCKET_SUM_COLUMNS].to_numpy(dtype=np.float64)
+    totals = membership.T.astype(np.float64) @ np.nan_to_num(values)
+    sums = {column: totals[:, c] for c, column in enumerate(BUCKET_SUM_COLUMNS)}
+    return sums, calc_bucket_walls(df, membership, spotPrice)
+
+class IncrementalBucketAggregates:
+    """
+    Drop-in replacement of calc_bucket_aggregates that keeps the sums and walls of the
+    previous call and only visits the rows that changed since.
+
+    Rows are matched by option symbol (the call, or the put of a row without a call).
+    A row whose strike, summed or wall values, buckets or side of the spot changed is
+    removed with its previous values and added back with the new ones. The sums are
+    updated with the difference. A wall whose row was removed is searched again among
+    the rows of its group, the other walls are only compared with the added rows.
+
+    A full recompute is done when the buckets change, when more than max_changed of the
+    rows changed, and every full_every calls. verify() compares the last result with a
+    full recompute.
+    """
+
+    def __init__(self, full_every=60, max_changed=0.5):
+        self.full_every = full_every
+        self.max_changed = max_changed
+        self.state = None
+        self.calls = 0
+        self.stats = {}
+
+    def __call__(self, df, membership, spotPrice):
+        num_buckets = membership.shape[1]
+        rows = self.get_rows(df, membership, spotPrice)
+        sums, walls = rows['values'][:, 1:1 + len(BUCKET_SUM_COLUMNS)], rows['values'][:, 1 + len(BUCKET_SUM_COLUMNS):]
+        bucket_membership, groups = rows['membership'][:, :num_buckets], rows['membership'][:, num_buckets:]
+
+        state = self.state
+        full = state is None or self.calls % self.full_every == 0 or state['num_buckets'] != num_buckets
+        change = None if full else diff_keyed_rows(state['rows'], rows)
+        full = full or change is None or len(change[0]) > self.max_changed * max(1, len(rows['keys']))
+
+        searched = 0
+        if full:
+            totals = bucket_membership.T.astype(np.float64) @ sums
+            best = calc_top_rows(walls, groups)[:, :, 0]
+            changed = len(rows['keys'])
+        else:
+            added, removed = change
+            old = state['rows']
+            old_sums = old['values'][removed, 1:1 + len(BUCKET_SUM_COLUMNS)]
+            totals = (state['totals'] + bucket_membership[added].T.astype(np.float64) @ sums[added]
+                      - old['membership'][removed, :num_buckets].T.astype(np.float64) @ old_sums)
+
+            # Walls whose row is still there compete with the best added row of their group
+            previous = state['best']
+            was_removed = np.zeros(len(old['keys']), dtype=bool)
+            was_removed[removed] = True
+            dirty = (previous >= 0) & was_removed[previous]
+            best = np.full(previous.shape, -1, dtype=np.intp)
+            kept = (previous >= 0) & ~dirty
+            best[kept] = pd.Index(rows['keys']).get_indexer(old['keys'][previous[kept]])
+            top = calc_top_rows(walls[added], groups[added])[:, :, 0]
+            candidate = np.where(top >= 0, added[np.maximum(top, 0)], -1)
+
+            metric = np.broadcast_to(np.arange(walls.shape[1]), best.shape)
+            best_value = np.where(best >= 0, walls[np.maximum(best, 0), metric], -np.inf)
+            candidate_value = np.where(candidate >= 0, walls[np.maximum(candidate, 0), metric], -np.inf)
+            # Ties resolve to the first row, like calc_top_rows
+            better = (candidate >= 0) & ((best < 0) | (candidate_value > best_value)
+                                        | ((candidate_value == best_value) & (candidate < best)))
+            best = np.where(better, candidate, best)
+
+            dirty_groups = np.flatnonzero(dirty.any(axis=1))
+            if len(dirty_groups):
+                searched = int(dirty.sum())
+                top = calc_top_rows(walls, groups[:, dirty_groups])[:, :, 0]
+                best[dirty_groups] = np.where(dirty[dirty_groups], top, best[dirty_groups])
+            changed = len(added)
+
+        strikes = rows['values'][:, 0]
+        result = ({column: totals[:, c] for c, column in enumerate(BUCKET_SUM_COLUMNS)},
+                  get_bucket_walls(np.where(best >= 0, strikes[np.maximum(best, 0)], np.nan)[:, :, None], num_buckets))
+        self.state = {'rows': rows, 'num_buckets': num_buckets, 'totals': totals, 'best': best, 'result': result}
+        self.calls += 1
+        self.stats = {'mode': 'full' if full else 'incremental', 'changed': changed, 'rows': len(rows['keys']),
+                      'walls_searched': searched}
+        return result
+
+    @staticmethod
+    def get_rows(df, membership, spotPrice):
+        """Row symbols, values (strike, BUCKET_SUM_COLUMNS, WALL_COLUMNS) and memberships (buckets, wall groups)."""
+        calls, puts = df['Calls'].to_numpy(dtype=object), df['Puts'].to_numpy(dtype=object)
+        strikes, walls, groups = get_wall_inputs(df, membership, spotPrice)
+        walls = walls.astype(np.float64)
+        walls[np.isnan(walls)] = -np.inf
+        sums = np.nan_to_num(df[BUCKET_SUM_COLUMNS].to_numpy(dtype=np.float64))
+        return {
+            'keys': np.where(calls != '', calls, puts),
+            'values': np.column_stack([strikes, sums, walls]),
+            'membership': np.concatenate([membership, groups], axis=1),
+        }
+
+    def verify(self, df, membership, spotPrice):
+        """
+        Compare the result of the last call with a full recompute of df.
+
+        :return: Dictionary with 'sums', the largest absolute difference of the sums relative to
+                 the largest absolute sum, and 'walls', the number of wall levels that differ.
+        """
+        sums, walls = self.state['result']
+        expected_sums, expected_walls = calc_bucket_aggregates(df, membership, spotPrice)
+        expected = np.column_stack([expected_sums[column] for column in BUCKET_SUM_COLUMNS])
+        actual = np.column_stack([sums[column] for column in BUCKET_SUM_COLUMNS])
+        scale = max(np.abs(expected).max(initial=0), np.finfo(np.float64).tiny)
+        return {
+            'sums': float(np.abs(actual - expected).max(initial=0) / scale),
+            'walls': sum(a != b for key in expected_walls for a, b in zip(walls[key], expected_walls[key])),
+        }
+
+def make_incremental_levels(full_every=60, max_changed=0.5):
+    """
+    Engines of calc_gex_levels that recompute the levels of one symbol from the contracts
+    changed since its previous snapshot: the exposure curves (IncrementalExposureSurface)
+    and the bucket sums and walls (IncrementalBucketAggregates). The extremes and pain
+    points depend on the order of every row and are recomputed in full.
+
+    The engines keep their state in this process, keep one per symbol between snapshots:
+    calc_gex_levels(symbol, today, options, **engines[symbol]).
+
+    :return: Dictionary with the exposure and aggregates arguments of calc_gex_levels.
+    """
+    return {'exposure': IncrementalExposureSurface(full_every, max_changed),
+            'aggregates': IncrementalBucketAggregates(full_every, max_changed)}
+
+def calc_bucket_extremes(df, membership, spotPrice, count=10):
+    """
+    Strikes of the count most negative and most positive TotalGamma rows of every bucket,
+    split into resistances (at or above spot) and supports (below spot).
+    """
+    strikes = df['StrikePrice'].to_numpy(dtype=np.float64)
+    gamma = df['TotalGamma'].to_numpy(dtype=np.float64)
+
+    resistances, supports = [], []
+    for b in range(membership.shape[1]):
+        rows = np.flatnonzero(membership[:, b] & ~np.isnan(gamma))
+        smallest = rows[np.argsort(gamma[rows], kind='stable')[:count]]
+        largest = rows[np.argsort(-gamma[rows], kind='stable')[:count]]
+        extreme = strikes[np.concatenate([smallest, largest])]
+        resistances.append([x for x in extreme if x >= spotPrice])
+        supports.append([x for x in extreme if x < spotPrice])
+    return resistances, supports
+
+def calc_bucket_flip_pain_points(df, membership):
+    """
+    Gamma flip and pain point levels of every bucket.
+    The running balances of all buckets are computed with one cumulative sum over
+    the membership-weighted columns. Rows are taken in df order.
+    """
+    strikes = df['StrikePrice'].to_numpy(dtype=np.float64)
+    gamma = np.nan_to_num(df['TotalGamma'].to_numpy(dtype=np.float64))
+    call_vol = np.nan_to_num(df['CallVol'].to_numpy(dtype=np.float64))
+    put_vol = np.nan_to_num(df['PutVol'].to_numpy(dtype=np.float64))
+    call_oi = np.nan_to_num(df['CallOpenInt'].to_numpy(dtype=np.float64))
+    put_oi = np.nan_to_num(df['PutOpenInt'].to_numpy(dtype=np.float64))
+    volume = np.nan_to_num(df['TotalVolume'].to_numpy(dtype=np.float64))
+    open_interest = np.nan_to_num(df['TotalOpenInterest'].to_numpy(dtype=np.float64))
+    weights = membership.astype(np.float64)
+    has_rows = membership.any(axis=0)
+
+    def balance(values):
+        cumsum = np.cumsum(values[:, None] * weights, axis=0)
+        return 2 * cumsum - cumsum[-1] if len(cumsum) else cumsum
+
+    def argmin_abs(values):
+        return np.where(membership, np.abs(values), np.inf).argmin(axis=0)
+
+    def strike_at(idx, found):
+        return [strikes[i] if ok else None for i, ok in zip(idx, found)]
+
+    cum_gamma, cum_volume, cum_oi = balance(gamma), balance(volume), balance(open_interest)
+    zero_gamma_idx = argmin_abs(cum_gamma)
+
+    pos, neg = (gamma > 0)[:, None] & membership, (gamma < 0)[:, None] & membership
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tot_vol = ((call_vol + put_vol) @ pos) / ((call_vol + put_vol) @ neg)
+        tot_oi = ((call_oi + put_oi) @ pos) / ((call_oi + put_oi) @ neg)
+    gamma_flip1 = np.where(neg, strikes[:, None], -np.inf).max(axis=0, initial=-np.inf)
+    gamma_flip2 = np.where(pos, strikes[:, None], np.inf).min(axis=0, initial=np.inf)
+
+    # Zero positive / negative volume strikes, from the rows after and before zero gamma
+    position = np.arange(len(df))[:, None]
+    after = membership & (position >= zero_gamma_idx)
+    before = membership & (position < zero_gamma_idx)
+    pos_hits = after & (cum_volume >= volume @ after)
+    neg_hits = before & (cum_volume <= volume @ before)
+    zero_pos_idx = pos_hits.argmax(axis=0)
+    zero_neg_idx = len(df) - 1 - neg_hits[::-1].argmax(axis=0)
+
+    return {
+        'zero_gamma1': strike_at(zero_gamma_idx, has_rows),
+        'gamma_flip1': np.where(np.isinf(gamma_flip1), np.nan, gamma_flip1),
+        'gamma_flip2': np.where(np.isinf(gamma_flip2), np.nan, gamma_flip2),
+        'pain_volume_strike': strike_at(argmin_abs(cum_volume), has_rows),
+        'pain_oi_strike': strike_at(argmin_abs(cum_oi), has_rows),
+        'zero_pos_strike': strike_at(zero_pos_idx, pos_hits.any(axis=0)),
+        'zero_neg_strike': strike_at(zero_neg_idx, neg_hits.any(axis=0)),
+        'tot_vol_ratio': tot_vol,
+        'tot_oi_ratio': tot_oi,
+    }
+
+def get_bucket_levels(df, spotPrice, fromStrike, toStrike, buckets=tuple(BUCKET_SUFFIXES), now=None,
+                      exposure=calc_exposure_surface, dtype=np.float64, solver='grid', aggregates=calc_bucket_aggregates):
+    """
+    Calculate the flow, wall, pain point and zero gamma / vanna levels of several expiry
+    buckets in one pass over the chain.
+
+    Bucket memberships are tagged once and every aggregate is computed for all buckets
+    with grouped reductions, so adding a bucket to EXPIRY_BUCKETS does not add another
+    pass over the chain. Buckets only use the strikes between fromStrike and toStrike,
+    except the 'All' zero gamma / vanna ladder which covers the whole chain.
+
+    Parameters:
+        df (pd.DataFrame): Options data from get_cboe_option_data.
+        spotPrice (float): Spot price of the underlying.
+        fromStrike (float): Lower bound of the strike window.
+        toStrike (float): Upper bound of the strike window.
+        buckets (tuple): Bucket names, keys of EXPIRY_BUCKETS.
+        now (datetime): Reference time for the next expirations, defaults to datetime.now().
+        exposure: calc_exposure_surface or an IncrementalExposureSurface for the zero gamma / vanna ladders.
+        dtype: Floating point type of the zero gamma / vanna ladders, the sums are always float64.
+        solver (str): 'grid' (ladder) or 'brent' (get_bucket_exposure_zeros) zero gamma / vanna.
+        aggregates: calc_bucket_aggregates or an IncrementalBucketAggregates for the sums and walls.
+
+    Returns:
+        pd.DataFrame: One row per bucket, one column per BUCKET_METRICS entry.
+    """
+    buckets = list(buckets)
+    levels = calc_bucket_level_columns(df, spotPrice, fromStrike, toStrike, buckets, now, exposure, dtype, solver,
+                                       aggregates)
+    table = pd.DataFrame(index=pd.Index(buckets, name='expiration'), columns=BUCKET_METRICS, dtype=object)
+    for metric in BUCKET_METRICS:
+        table[metric] = pd.Series(list(levels[metric]), index=table.index, dtype=object)
+    return table
+
+def calc_bucket_level_columns(df, spotPrice, fromStrike, toStrike, buckets=tuple(BUCKET_SUFFIXES), now=None,
+                              exposure=calc_exposure_surface, dtype=np.float64, solver='grid',
+                              aggregates=calc_bucket_aggregates):
+    """
+    Levels of get_bucket_levels as columns: dictionary of BUCKET_METRICS name to a
+    sequence with one value per bucket, without building the DataFrame.
+    """
+    buckets = list(buckets)
+    df_sorted = df.sort_values(by=['ExpirationDate', 'StrikePrice'])
+    strikes = df_sorted['StrikePrice'].to_numpy(dtype=np.float64)
+    window = (strikes >= fromStrike) & (strikes <= toStrike)
+    membership = get_bucket_membership(df_sorted, window, buckets, now)
+
+    sums, walls = aggregates(df_sorted, membership, spotPrice)
+    levels = calc_bucket_flow_levels(sums)
+    levels.update(walls)
+    levels['resistances'], levels['supports'] = calc_bucket_extremes(df_sorted, membership, spotPrice)
+    levels.update(calc_bucket_flip_pain_points(df_sorted, membership))
+
+    ladder_membership = membership.copy()
+    if 'All' in buckets:
+        ladder_membership[:, buckets.index('All')] = True
+    if solver == 'brent':
+        surfaces = get_bucket_exposure_zeros(df_sorted, dict(zip(buckets, ladder_membership.T)),
+                                             fromStrike, toStrike, dtype=dtype, exposure=exposure)
+    else:
+        surfaces = get_bucket_greek_surfaces(df_sorted, dict(zip(buckets, ladder_membership.T)), fromStrike,
+                                             toStrike, greeks=('gamma', 'vanna'), dtype=dtype, exposure=exposure)
+    levels['zero_gamma'] = [surfaces[name]['zero_gamma'] for name in buckets]
+    levels['zero_vanna'] = [surfaces[name]['zero_vanna'] for name in buckets]
+    return levels
+
+# Fields of the GEX ladder record and of the per bucket flow level records
+GEX_LADDER_FIELDS = ('symbol', 'processTime', 'max_call_strike', 'max_put_strike', 'max_call_strike_0',
+                     'max_put_strike_0', 'call_wall_0', 'put_wall_0', 'max_call_strike_1', 'max_put_strike_1',
+                     'call_wall_1', 'put_wall_1', 'call_wall', 'put_wall', 'avg_wall_0', 'avg_wall_1', 'avg_wall',
+                     'spotPrice')
+BUCKET_LEVEL_FIELDS = ('symbol', 'expiration', 'processTime', *BUCKET_METRICS, 'spotPrice')
+
+class LevelRecord:
+    """
+    Slotted record of named level values, FIELDS in order. Cheaper to build than a dictionary
+    of the same keys and converted to one only when serialized.
+    """
+    __slots__ = ()
+    FIELDS = ()
+
+    def __init__(self, *args, **kwargs):
+        for name, value in zip(self.FIELDS, args):
+            setattr(self, name, value)
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    def values(self):
+        return [getattr(self, name) for name in self.FIELDS]
+
+    def to_dict(self):
+        return dict(zip(self.FIELDS, self.values()))
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.values() == other.values()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{k}={v!r}' for k, v in self.to_dict().items())})"
+
+class GexLadderLevels(LevelRecord):
+    """Call / put walls and max GEX strikes of the whole chain and the first two expirations."""
+    __slots__ = GEX_LADDER_FIELDS
+    FIELDS = GEX_LADDER_FIELDS
+
+class BucketLevels(LevelRecord):
+    """BUCKET_METRICS of one expiry bucket."""
+    __slots__ = BUCKET_LEVEL_FIELDS
+    FIELDS = BUCKET_LEVEL_FIELDS
+
+    def to_dict(self):
+        """Flow level record of the bucket, the metrics carry the BUCKET_SUFFIXES suffix of the bucket."""
+        suffix = BUCKET_SUFFIXES.get(self.expiration, '')
+        keys = [key if key in ('symbol', 'expiration', 'processTime', 'spotPrice') else key + suffix
+                for key in self.FIELDS]
+        return dict(zip(keys, self.values()))
+
+class GexLevels:
+    """Levels of one snapshot of a symbol: the GEX ladder and the BucketLevels of every bucket."""
+    __slots__ = ('ladder', 'buckets')
+
+    def __init__(self, ladder, buckets):
+        self.ladder = ladder
+        self.buckets = buckets
+
+    def to_records(self):
+        """(GEX ladder record, list of flow level records), as returned by get_gex_and_flow_levels."""
+        return self.ladder.to_dict(), [bucket.to_dict() for bucket in self.buckets]
+
+class GexLevelBatch:
+    """
+    Columnar levels of many snapshots, e.g. several symbols or a replay over time.
+
+    Values are appended to one list per field, the records and DataFrames are only built
+    by to_records() / to_frames(), in the shapes of get_levels.
+    """
+
+    def __init__(self, levels=()):
+        self.ladder = {name: [] for name in GEX_LADDER_FIELDS}
+        self.buckets = {name: [] for name in BUCKET_LEVEL_FIELDS}
+        for snapshot in levels:
+            self.append(snapshot)
+
+    def __len__(self):
+        return len(self.ladder['symbol'])
+
+    def append(self, levels):
+        """Add the GexLevels of one snapshot."""
+        for name, values in self.ladder.items():
+            values.append(getattr(levels.ladder, name))
+        for bucket in levels.buckets:
+            for name, values in self.buckets.items():
+                values.append(getattr(bucket, name))
+
+    def to_records(self, instrument=None):
+        """
+        (GEX ladder records, flow level records) with the keys of get_gex_and_flow_levels.
+
+        :param instrument: Round the values to the tick size of this symbol like get_levels, None to keep them.
+        """
+        ladder = [dict(zip(GEX_LADDER_FIELDS, row)) for row in zip(*self.ladder.values())]
+        buckets = [BucketLevels(*row).to_dict() for row in zip(*self.buckets.values())]
+        if instrument is not None:
+            ladder, buckets = round_records(ladder, instrument), round_records(buckets, instrument)
+        return ladder, buckets
+
+    def to_frames(self, instrument=None):
+        """(gex_ladder, gex_flow_and_levels) DataFrames as returned by get_levels."""
+        ladder, buckets = self.to_records(instrument)
+        return pd.DataFrame(ladder), pd.DataFrame(buckets)
+
+# Columns of the full chain used by the GEX ladder when the chain is filtered
+GEX_LADDER_COLUMNS = ['ExpirationDate', 'StrikePrice', 'NetGexCall', 'NetGexCall1', 'NetGexPut', 'NetGexPut1']
+# Columns of the chain used by calc_gex_levels: GEX ladder, bucket sums and walls, pain points and the
+# zero gamma / vanna ladder inputs (Calls and Puts are the contract keys of the incremental engines)
+GEX_LEVEL_COLUMNS = list(dict.fromkeys(
+    GEX_LADDER_COLUMNS + ['Calls', 'Puts', 'daysTillExp', 'CallIV', 'PutIV', 'TotalGamma',
+                          'TotalVolume', 'TotalOpenInterest'] + BUCKET_SUM_COLUMNS + WALL_COLUMNS))
+
+def calc_gex_levels(symbol, today, options=None, exposure=calc_exposure_surface, chain_filter=None, full_ladder=True,
+                    solver=None, aggregates=calc_bucket_aggregates):
+    """
+    Calculate the GEX ladder and the flow levels of every BUCKET_SUFFIXES bucket for a symbol.
+
+    :param symbol: CBOE symbol.
+    :param today: Time of the snapshot (processTime and the next expirations).
+    :param options: CBOE JSON or OptionChain, fetched when None.
+    :param exposure: calc_exposure_surface or an IncrementalExposureSurface.
+    :param chain_filter: Keyword arguments of filter_option_chain applied before the derived
+                         metrics are computed. None uses OPTION_CHAIN_FILTER, {} keeps the whole chain.
+                         A filter that keeps no contract falls back to the whole chain.
+    :param full_ladder: With a chain_filter, still take the GEX ladder walls and max strikes
+                        from every contract (only their GEX columns are computed on the full
+                        chain). The other levels use the filtered contracts, the 'All' zero
+                        gamma / vanna ladder included.
+    :param solver: Zero gamma / vanna solver, 'grid' or 'brent'. None uses ZERO_SOLVER.
+    :param aggregates: calc_bucket_aggregates or an IncrementalBucketAggregates, see make_incremental_levels
+                       for the incremental exposure and aggregates of one symbol.
+    :return: (GexLevels, DataFrame of the GEX_LEVEL_COLUMNS of the contracts used)
+    """
     print("Getting Gex and Flow Levels")
-    df, dfAgg, spotPrice = get_cboe_option_data(symbol)
-    strikes = dfAgg.index.values
+    chain = get_option_chain(symbol, options)
+    chain_filter = OPTION_CHAIN_FILTER if chain_filter is None else chain_filter
+    if chain_filter:
+        filtered = filter_option_chain(chain, **chain_filter)
+        print(f"Option chain filtered to {filtered.diagnostics['filtered']['kept']} of "
+              f"{filtered.diagnostics['filtered']['total']} rows")
+        if len(filtered) == 0:
+            # Nothing to take levels from, e.g. a min_oi above every contract
+            print(f"Option chain filter {chain_filter} keeps no {symbol} contract, using the unfiltered chain")
+        else:
+            chain = filtered
+    spotPrice = chain.spotPrice
+    # Only the metrics of the levels are computed, the frame shares the chain arrays
+    df = chain.to_frame(GEX_LEVEL_COLUMNS)
+    ladderDf = chain.full.to_frame(GEX_LADDER_COLUMNS) if full_ladder and chain.full is not chain else df
     fromStrike = 0.9 * spotPrice
     toStrike = 1.1 * spotPrice
 
@@ -686,558 +2156,492 @@ def get_gex_and_flow_levels(symbol, today):
 
     # Gex Ladder
     print("Calculating GEX Ladder")
-    first_expiration_data, second_expiration_data, call_wall_0, put_wall_0, call_wall_1, put_wall_1, call_wall, put_wall, avg_wall_0, avg_wall_1, avg_wall = calculate_gex_ladder(df)
-    max_call_strike = df.loc[df['NetGexCall1'].idxmax()]['StrikePrice']
-    max_put_strike = df.loc[df['NetGexPut1'].idxmax()]['StrikePrice']
+    first_expiration_data, second_expiration_data, call_wall_0, put_wall_0, call_wall_1, put_wall_1, call_wall, put_wall, avg_wall_0, avg_wall_1, avg_wall = calculate_gex_ladder(ladderDf)
+    max_call_strike = ladderDf.loc[ladderDf['NetGexCall1'].idxmax()]['StrikePrice']
+    max_put_strike = ladderDf.loc[ladderDf['NetGexPut1'].idxmax()]['StrikePrice']
     max_call_strike_0 = first_expiration_data.loc[first_expiration_data['NetGexCall1'].idxmax()]['StrikePrice']
     max_put_strike_0 = first_expiration_data.loc[first_expiration_data['NetGexPut1'].idxmax()]['StrikePrice']
     max_call_strike_1 = second_expiration_data.loc[second_expiration_data['NetGexCall1'].idxmax()]['StrikePrice']
     max_put_strike_1 = second_expiration_data.loc[second_expiration_data['NetGexPut1'].idxmax()]['StrikePrice']
 
-    df_sorted = df.sort_values(by=['ExpirationDate', 'StrikePrice'])
-
-    # Filter the dataframe to get only the strikes between fromStrike and toStrike
-    df_filtered = df_sorted[(df_sorted['StrikePrice'] >= fromStrike) & (df_sorted['StrikePrice'] <= toStrike)]
+    print("Calculating Flow, Gamma and Vanna Levels")
+    buckets = tuple(BUCKET_SUFFIXES)
+    columns = calc_bucket_level_columns(df, spotPrice, fromStrike, toStrike, buckets, today, exposure, chain.dtype,
+                                        ZERO_SOLVER if solver is None else solver, aggregates)
+
+    print("Calculating Expiration Levels")
+    processTime = today.strftime('%Y-%m-%d %H:%M:00')
+    gexLadder = GexLadderLevels(
+        symbol, processTime, max_call_strike, max_put_strike, max_call_strike_0, max_put_strike_0,
+        call_wall_0, put_wall_0, max_call_strike_1, max_put_strike_1, call_wall_1, put_wall_1,
+        call_wall, put_wall, avg_wall_0, avg_wall_1, avg_wall, spotPrice)
+    bucketLevels = [
+        BucketLevels(symbol, expiration, processTime, *[columns[metric][b] for metric in BUCKET_METRICS], spotPrice)
+        for b, expiration in enumerate(buckets)
+    ]
+    return GexLevels(gexLadder, bucketLevels), df
+
+def get_gex_and_flow_levels(symbol, today, options=None, exposure=calc_exposure_surface, chain_filter=None,
+                            solver=None, aggregates=calc_bucket_aggregates):
+    """
+    Levels of calc_gex_levels as dictionaries.
 
-    # Create a dataframe for next expiration, next Friday and next weekly and next monthly
-    nextExpiry = df_filtered.loc[df_filtered['ExpirationDate'] > datetime.now(), 'ExpirationDate'].min()
-    secondExpiry = df_filtered.loc[df_filtered['ExpirationDate'] > nextExpiry, 'ExpirationDate'].min()
-    nextMonthlyExp = df_filtered.loc[df_filtered['IsThirdFriday'], 'ExpirationDate'].min()
-    nextWeeklyExp = get_next_friday(nextExpiry)
+    :return: (gexLadder, allExpiration, firstExpiration, secondExpiration, weeklyExpiration,
+              monthlyExpiration, df), the flow level keys carry the suffix of their bucket.
+    """
+    levels, df = calc_gex_levels(symbol, today, options, exposure, chain_filter, solver=solver, aggregates=aggregates)
+    gexLadder, expirationLevels = levels.to_records()
+    return (gexLadder, *expirationLevels, df)
+
+# Levels that must agree within one tick between the float32 and float64 modes
+FLOAT32_CHECKED_LEVELS = (['max_call_strike', 'max_put_strike', 'max_call_strike_0', 'max_put_strike_0', 'call_wall_0',
+                           'put_wall_0', 'max_call_strike_1', 'max_put_strike_1', 'call_wall_1', 'put_wall_1',
+                           'call_wall', 'put_wall', 'avg_wall_0', 'avg_wall_1', 'avg_wall',
+                           'zero_gamma', 'zero_vanna', 'zero_gamma1', 'gamma_flip1', 'gamma_flip2',
+                           'pain_volume_strike', 'pain_oi_strike', 'zero_pos_strike', 'zero_neg_strike']
+                          + [key for key, _, _ in WALL_LEVELS])
+
+def validate_float32_levels(symbol, today=None, options=None, tick_size=None):
+    """
+    Run the levels of one snapshot in float64 and in float32 and check that the zero gamma,
+    wall and pain point levels (FLOAT32_CHECKED_LEVELS) stay within one tick.
+
+    :param symbol: CBOE symbol.
+    :param today: Time of the snapshot, defaults to now.
+    :param options: CBOE JSON or OptionChain, fetched when None.
+    :param tick_size: Tolerance, defaults to the tick size of the symbol.
+    :return: Dictionary with 'failures' (list of (key, bucket, float64 level, float32 level)),
+             'max_difference', and for both types the 'chain_bytes' (fields and metrics) and
+             'peak_bytes' (traced peak of the level calculation).
+    """
+    import gc
+    import tracemalloc
+
+    today = today or pd.Timestamp.now()
+    tick_size = tick_size or get_tick_size(symbol)
+    chain = get_option_chain(symbol, options)
+
+    results = {}
+    for dtype in (np.float64, np.float32):
+        typed = OptionChain(chain.arrays, chain.spotPrice, chain.currentPrice, dtype, dict(chain.diagnostics), chain.asOf)
+        # Garbage of the previous run would be freed inside the traced run otherwise
+        gc.collect()
+        tracemalloc.start()
+        try:
+            levels, _ = calc_gex_levels(symbol, today, typed, chain_filter={})
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        results[np.dtype(dtype).name] = {'levels': levels, 'chain_bytes': typed.nbytes, 'peak_bytes': peak}
+
+    expected, actual = results['float64']['levels'], results['float32']['levels']
+    pairs = [('ladder', expected.ladder, actual.ladder)]
+    pairs += [(a.expiration, a, b) for a, b in zip(expected.buckets, actual.buckets)]
+    failures, max_difference = [], 0.0
+    for bucket, a, b in pairs:
+        for key in FLOAT32_CHECKED_LEVELS:
+            if key not in a.FIELDS:
+                continue
+            x, y = getattr(a, key), getattr(b, key)
+            if x is None or y is None or pd.isna(x) or pd.isna(y):
+                if not ((x is None or pd.isna(x)) and (y is None or pd.isna(y))):
+                    failures.append((key, bucket, x, y))
+                continue
+            difference = abs(float(x) - float(y))
+            max_difference = max(max_difference, difference)
+            if difference > tick_size:
+                failures.append((key, bucket, x, y))
+
+    report = {'failures': failures, 'max_difference': max_difference}
+    for name in ('float64', 'float32'):
+        report[name] = {key: results[name][key] for key in ('chain_bytes', 'peak_bytes')}
+    saved = 1 - report['float32']['peak_bytes'] / max(report['float64']['peak_bytes'], 1)
+    print(f"float32 levels of {symbol}: {len(failures)} outside one tick ({tick_size}), max difference "
+          f"{max_difference:.4f}, chain {report['float64']['chain_bytes'] / 2**20:.1f}MB -> "
+          f"{report['float32']['chain_bytes'] / 2**20:.1f}MB, peak memory saved {saved:.0%}")
+    return report
+
+# Tick size per instrument for rounding the levels
+TICK_SIZES = {'MES': 0.25, 'MNQ': 0.25, 'M2K': 0.1, 'SPY': 0.01, 'QQQ': 0.01, 'IWM': 0.01}
+
+# Flow levels that are rounded to 4 decimals instead of the tick size, for every bucket suffix
+FLOW_ROUND_KEYS = ["callFlow", "deltaFlow", "putFlow", "callOrderFlow", "putOrderFlow", "deltaOrderFlow",
+                   "ethBlue", "ethPurple", "callbid_vol", "putbid_vol", "tot_vol", "calloi_vol", "putoi_vol",
+                   "tot_oi", "tot_vol_ratio", "tot_oi_ratio"]
+ROUND_EXCLUDE_KEYS = frozenset([key + suffix for suffix in ('_1', '_2', '_w', '_m', '') for key in FLOW_ROUND_KEYS]
+                               + ["priceRatio"])
+
+def get_tick_size(symbol):
+    if symbol in ('_SPX', '_NDX', '_RUT'):
+        return 0.01  # Two increments of 0.01 for the cash indices
+    elif symbol.isalpha():  # Assume all equities are alphabetic symbols
+        return 0.01
+    else:
+        return TICK_SIZES.get(symbol, None)  # Return from predefined values if available
 
-    # Create a dataframe for next expiration, next Friday and next weekly and next monthly
-    dfNext = df_filtered.loc[df_filtered['ExpirationDate'] == nextExpiry]
-    dfSecond = df_filtered.loc[df_filtered['ExpirationDate'] == secondExpiry]
-    dfMonthly = df_filtered.loc[df_filtered['ExpirationDate'] == nextMonthlyExp]
-    dfWeekly = df_filtered.loc[df_filtered['ExpirationDate'] == nextWeeklyExp]
+def round_to_ticks(values, instrument, tick_size):
+    if tick_size is None:
+        raise ValueError(f"Unsupported instrument: {instrument}")
+    return np.round(values / tick_size) * tick_size
 
+@functools.lru_cache(maxsize=256)
+def get_rounding_plan(instrument, keys, exclude_keys=ROUND_EXCLUDE_KEYS):
+    """
+    Compile how the values of a record schema are rounded, once per (instrument, keys, exclude_keys).
 
-    print("Calculating Flow Levels")
-    vCallPrice, vPutPrice, vCallOiPrice, vPutOiPrice, vAvgPrice, vAvgOiPrice, vRes1Price, vSup1Price, vRes2Price, vSup2Price, vRes3Price, vSup3Price,  \
-        vRes4Price, vSup4Price, resistances, supports, \
-        redOi, greenOi, deltaOi, redVol, greenVol, deltaVol, ethBlue, ethPurple = calculate_flow_levels_for_expiration(df_filtered, spotPrice)
+    :return: (tick size of the instrument, tuple with True for the keys rounded to 4 decimals)
+    """
+    return get_tick_size(instrument), tuple(key in exclude_keys for key in keys)
+
+def round_nested_values(obj, instrument, tick_size, exclude_keys):
+    """Round the scalars of nested dictionaries and lists one by one."""
+    if isinstance(obj, dict):
+        return {
+            key: (
+                round(value, 4) if key in exclude_keys else round_nested_values(value, instrument, tick_size, exclude_keys)
+            ) if isinstance(value, (int, float)) else round_nested_values(value, instrument, tick_size, exclude_keys)
+            for key, value in obj.items()
+        }
+    elif isinstance(obj, list):
+        return [round_nested_values(item, instrument, tick_size, exclude_keys) for item in obj]
+    elif isinstance(obj, (int, float)):
+        return float(round_to_ticks(obj, instrument, tick_size))
+    else:
+        return obj
+
+# Value types rounded as a NumPy vector, ints keep their type when rounded to decimals
+ROUND_FLOAT_TYPES = {float, np.float64, np.float32}
+ROUND_NUMBER_TYPES = ROUND_FLOAT_TYPES | {int, bool}
+
+def round_column(values, decimals, instrument, tick_size, exclude_keys):
+    """Round the values of one key across records, as a NumPy vector when they are all numbers."""
+    types = set(map(type, values))
+    if types <= ROUND_FLOAT_TYPES or (not decimals and types <= ROUND_NUMBER_TYPES):
+        values = np.asarray(values, dtype=np.float64)
+        return (np.round(values, 4) if decimals else round_to_ticks(values, instrument, tick_size)).tolist()
+    if decimals:
+        return [round(value, 4) if isinstance(value, (int, float)) else
+                round_nested_values(value, instrument, tick_size, exclude_keys) for value in values]
+    return [round_nested_values(value, instrument, tick_size, exclude_keys) for value in values]
+
+def round_records(records, instrument, exclude_keys=ROUND_EXCLUDE_KEYS):
+    """
+    Round a batch of level records with a cached rounding plan per schema.
+    Records with the same keys are rounded together, one NumPy vector per key.
 
-    vCallPrice_1, vPutPrice_1, vCallOiPrice_1, vPutOiPrice_1, vAvgPrice_1, vAvgOiPrice_1, vRes1Price_1, vSup1Price_1, vRes2Price_1, vSup2Price_1, vRes3Price_1, vSup3Price_1,  \
-        vRes4Price_1, vSup4Price_1, resistances_1, supports_1, \
-        redOi_1, greenOi_1, deltaOi_1, redVol_1, greenVol_1, deltaVol_1, ethBlue_1, ethPurple_1 = calculate_flow_levels_for_expiration(dfNext, spotPrice)   
-    
-    vCallPrice_2, vPutPrice_2, vCallOiPrice_2, vPutOiPrice_2, vAvgPrice_2, vAvgOiPrice_2, vRes1Price_2, vSup1Price_2, vRes2Price_2, vSup2Price_2, vRes3Price_2, vSup3Price_2, \
-    vRes4Price_2, vSup4Price_2, resistances_2, supports_2, \
-        redOi_2, greenOi_2, deltaOi_2, redVol_2, greenVol_2, deltaVol_2, ethBlue_2, ethPurple_2 = calculate_flow_levels_for_expiration(dfSecond, spotPrice)  
-    
-    vCallPrice_w, vPutPrice_w, vCallOiPrice_w, vPutOiPrice_w, vAvgPrice_w, vAvgOiPrice_w, vRes1Price_w, vSup1Price_w, vRes2Price_w, vSup2Price_w, vRes3Price_w, vSup3Price_w, \
-    vRes4Price_w, vSup4Price_w, resistances_w, supports_w, \
-        redOi_w, greenOi_w, deltaOi_w, redVol_w, greenVol_w, deltaVol_w, ethBlue_w, ethPurple_w = calculate_flow_levels_for_expiration(dfWeekly, spotPrice)
-    
-    vCallPrice_m, vPutPrice_m, vCallOiPrice_m, vPutOiPrice_m, vAvgPrice_m, vAvgOiPrice_m, vRes1Price_m, vSup1Price_m, vRes2Price_m, vSup2Price_m, vRes3Price_m, vSup3Price_m,  \
-    vRes4Price_m, vSup4Price_m, resistances_m, supports_m, \
-    redOi_m, greenOi_m, deltaOi_m, redVol_m, greenVol_m, deltaVol_m, ethBlue_m, ethPurple_m = calculate_flow_levels_for_expiration(dfMonthly, spotPrice)
-
-    print("Calculating Gamma Levels")
-    zeroGamma = find_zero_gamma_levels(df, fromStrike, toStrike)
-    zeroGamma_1 = find_zero_gamma_levels(dfNext, fromStrike, toStrike)
-    zeroGamma_2 = find_zero_gamma_levels(dfSecond, fromStrike, toStrike)
-    zeroGamma_w = find_zero_gamma_levels(dfWeekly, fromStrike, toStrike)
-    zeroGamma_m = find_zero_gamma_levels(dfMonthly, fromStrike, toStrike)
-
-    print("Calculating Vanna Levels")
-    zeroVanna = find_zero_vanna_levels(df, fromStrike, toStrike)
-    zeroVanna_1 = find_zero_vanna_levels(dfNext, fromStrike, toStrike)
-    zeroVanna_2 = find_zero_vanna_levels(dfSecond, fromStrike, toStrike)
-    zeroVanna_w = find_zero_vanna_levels(dfWeekly, fromStrike, toStrike)
-    zeroVanna_m = find_zero_vanna_levels(dfMonthly, fromStrike, toStrike)
-
-    print("Calculating Additional Gex Levels")
-    call_resistance_oi, put_support_oi, call_resistance_vol, put_support_vol, call_resistance_gex_oi, put_support_gex_oi, call_resistance_gex_vol, \
-        put_support_gex_vol, call_resistance_wall, put_support_wall, call_resistance_net_gex_oi, put_support_net_gex_oi,  \
-        call_resistance_net_gex_vol, put_support_net_gex_vol, call_resistance_vol_oi, put_support_vol_oi, call_resistance_net_vol_oi, put_support_net_vol_oi, \
-        callbid_vol, putbid_vol, volume, calloi_vol, putoi_vol, open_interest = get_additional_gex_values(df_filtered, spotPrice)
-
-    call_resistance_oi_1, put_support_oi_1, call_resistance_vol_1, put_support_vol_1, call_resistance_gex_oi_1, put_support_gex_oi_1, call_resistance_gex_vol_1, \
-        put_support_gex_vol_1, call_resistance_wall_1, put_support_wall_1, call_resistance_net_gex_oi_1, put_support_net_gex_oi_1,  \
-        call_resistance_net_gex_vol_1, put_support_net_gex_vol_1, call_resistance_vol_oi_1, put_support_vol_oi_1, call_resistance_net_vol_oi_1, put_support_net_vol_oi_1, \
-        callbid_vol_1, putbid_vol_1, volume_1, calloi_vol_1, putoi_vol_1, open_interest_1 = get_additional_gex_values(dfNext, spotPrice)
-
-    call_resistance_oi_2, put_support_oi_2, call_resistance_vol_2, put_support_vol_2, call_resistance_gex_oi_2, put_support_gex_oi_2, call_resistance_gex_vol_2, \
-        put_support_gex_vol_2, call_resistance_wall_2, put_support_wall_2, call_resistance_net_gex_oi_2, put_support_net_gex_oi_2,  \
-        call_resistance_net_gex_vol_2, put_support_net_gex_vol_2, call_resistance_vol_oi_2, put_support_vol_oi_2, call_resistance_net_vol_oi_2, put_support_net_vol_oi_2, \
-        callbid_vol_2, putbid_vol_2, volume_2, calloi_vol_2, putoi_vol_2, open_interest_2 = get_additional_gex_values(dfSecond, spotPrice)
-    
-    call_resistance_oi_w, put_support_oi_w, call_resistance_vol_w, put_support_vol_w, call_resistance_gex_oi_w, put_support_gex_oi_w, call_resistance_gex_vol_w, \
-        put_support_gex_vol_w, call_resistance_wall_w, put_support_wall_w, call_resistance_net_gex_oi_w, put_support_net_gex_oi_w,  \
-        call_resistance_net_gex_vol_w, put_support_net_gex_vol_w, call_resistance_vol_oi_w, put_support_vol_oi_w, call_resistance_net_vol_oi_w, put_support_net_vol_oi_w, \
-        callbid_vol_w, putbid_vol_w, volume_w, calloi_vol_w, putoi_vol_w, open_interest_w = get_additional_gex_values(dfWeekly, spotPrice)
-    
-    call_resistance_oi_m, put_support_oi_m, call_resistance_vol_m, put_support_vol_m, call_resistance_gex_oi_m, put_support_gex_oi_m, call_resistance_gex_vol_m, \
-        put_support_gex_vol_m, call_resistance_wall_m, put_support_wall_m, call_resistance_net_gex_oi_m, put_support_net_gex_oi_m,  \
-        call_resistance_net_gex_vol_m, put_support_net_gex_vol_m, call_resistance_vol_oi_m, put_support_vol_oi_m, call_resistance_net_vol_oi_m, put_support_net_vol_oi_m, \
-        callbid_vol_m, putbid_vol_m, volume_m, calloi_vol_m, putoi_vol_m, open_interest_m = get_additional_gex_values(dfMonthly, spotPrice)
-    
-    zero_gamma, tot_vol, tot_oi, gamma_flip1, gamma_flip2, pain_volume_strike, pain_oi_strike, zero_pos_strike, zero_neg_strike = get_flip_pain_points(df_filtered)
+    :param records: List of dictionaries.
+    :param instrument: The instrument (e.g., 'MES', 'MNQ', 'M2K').
+    :param exclude_keys: Keys to round to 4 decimals instead of the nearest tick.
+    :return: List of rounded dictionaries, in the same order.
+    """
+    exclude_keys = frozenset(exclude_keys)
+    schemas = {}
+    for i, record in enumerate(records):
+        schemas.setdefault(tuple(record), []).append(i)
+
+    rounded = [None] * len(records)
+    for keys, rows in schemas.items():
+        tick_size, decimals = get_rounding_plan(instrument, keys, exclude_keys)
+        columns = [round_column([records[i][key] for i in rows], decimal, instrument, tick_size, exclude_keys)
+                   for key, decimal in zip(keys, decimals)]
+        for j, i in enumerate(rows):
+            rounded[i] = dict(zip(keys, [column[j] for column in columns]))
+    return rounded
 
-    zero_gamma_1, tot_vol_1, tot_oi_1, gamma_flip1_1, gamma_flip2_1, pain_volume_strike_1, pain_oi_strike_1, zero_pos_strike_1, zero_neg_strike_1 = get_flip_pain_points(dfNext)
+def round_dict_values(data, instrument, exclude_keys=None):
+    """
+    Round all numerical values in a nested dictionary to the nearest tick based on the instrument.
+    Round excluded keys to 4 decimal places.
 
-    zero_gamma_2, tot_vol_2, tot_oi_2, gamma_flip1_2, gamma_flip2_2, pain_volume_strike_2, pain_oi_strike_2, zero_pos_strike_2, zero_neg_strike_2 = get_flip_pain_points(dfSecond)
+    :param data: Dictionary (or list of dictionaries) with numerical values.
+    :param instrument: The instrument (e.g., 'MES', 'MNQ', 'M2K').
+    :param exclude_keys: List of keys to round to 4 decimal places instead of nearest tick.
+    :return: Rounded dictionary.
+    """
+    # Default exclude_keys to an empty list if None
+    exclude_keys = frozenset(exclude_keys or [])
+    if isinstance(data, dict):
+        return round_records([data], instrument, exclude_keys)[0]
+    if isinstance(data, list) and all(isinstance(item, dict) for item in data):
+        return round_records(data, instrument, exclude_keys)
+    return round_nested_values(data, instrument, get_tick_size(instrument), exclude_keys)
+
+def get_levels(symbol, options=None, engines=None):
+    """
+    GEX ladder and flow levels of a symbol now.
 
-    zero_gamma_w, tot_vol_w, tot_oi_w, gamma_flip1_w, gamma_flip2_w, pain_volume_strike_w, pain_oi_strike_w, zero_pos_strike_w, zero_neg_strike_w = get_flip_pain_points(dfWeekly)
+    :param engines: make_incremental_levels() engines of the symbol, kept by the caller
+                    between snapshots, for an incremental recomputation.
+    :return: (gex_ladder DataFrame, flow levels DataFrame, DataFrame of the contracts used)
+    """
+    print("Getting GEX and Flow Levels")
+    # processTime in naive New York time whatever the timezone of the server
+    today = pd.Timestamp.now(tz=MARKET_TIMEZONE).tz_localize(None)
+    levels, df = calc_gex_levels(symbol, today, options, **(engines or {}))
 
-    zero_gamma_m, tot_vol_m, tot_oi_m, gamma_flip1_m, gamma_flip2_m, pain_volume_strike_m, pain_oi_strike_m, zero_pos_strike_m, zero_neg_strike_m = get_flip_pain_points(dfMonthly)
-        
-    print("Calculating All Expiration Levels")
-    gexLadder = {
-        'symbol': symbol,
-        'processTime': today.strftime('%Y-%m-%d %H:%M:00'),
-        'max_call_strike': max_call_strike,
-        'max_put_strike': max_put_strike,
-        'max_call_strike_0': max_call_strike_0,
-        'max_put_strike_0': max_put_strike_0,
-        'call_wall_0': call_wall_0,
-        'put_wall_0': put_wall_0,
-        'max_call_strike_1': max_call_strike_1,
-        'max_put_strike_1': max_put_strike_1,
-        'call_wall_1': call_wall_1,
-        'put_wall_1': put_wall_1,
-        'call_wall': call_wall,
-        'put_wall': put_wall,
-        'avg_wall_0': avg_wall_0,
-        'avg_wall_1': avg_wall_1,
-        'avg_wall': avg_wall,
-        'spotPrice': spotPrice,
-    }
-    
-    allExpiration = {
-        'symbol': symbol,
-        'expiration': 'All',
-        'processTime': today.strftime('%Y-%m-%d %H:%M:00'),
-        'vol_call': vCallPrice,
-        'vol_put': vPutPrice,
-        'oi_call': vCallOiPrice,
-        'oi_put': vPutOiPrice,
-        'vol_avg': vAvgPrice,
-        'oi_avg': vAvgOiPrice,
-        'vol_resistance1': vRes1Price,
-        'vol_support1': vSup1Price,
-        'vol_resistance2': vRes2Price,
-        'vol_support2': vSup2Price,
-        'vol_resistance3': vRes3Price,
-        'vol_support3': vSup3Price,
-        'vol_resistance4': vRes4Price,
-        'vol_support4': vSup4Price,
-        'resistances': [x for x in resistances],
-        'supports': [x for x in supports],
-        'zero_gamma': zeroGamma,
-        'zero_vanna': zeroVanna,
-        'callFlow': greenOi,
-        'deltaFlow': deltaOi,
-        'putFlow': redOi,
-        'callOrderFlow': greenVol,
-        'putOrderFlow': redVol,
-        'deltaOrderFlow': deltaVol,
-        'ethBlue': ethBlue,
-        'ethPurple': ethPurple,
-        'call_resistance_oi': call_resistance_oi,
-        'put_support_oi': put_support_oi,
-        'call_resistance_vol': call_resistance_vol,
-        'put_support_vol': put_support_vol,
-        'call_resistance_gex_oi': call_resistance_gex_oi,
-        'put_support_gex_oi': put_support_gex_oi,
-        'call_resistance_gex_vol': call_resistance_gex_vol,
-        'put_support_gex_vol': put_support_gex_vol,
-        'call_resistance_wall': call_resistance_wall,
-        'put_support_wall': put_support_wall,
-        'call_resistance_net_gex_oi': call_resistance_net_gex_oi,
-        'put_support_net_gex_oi': put_support_net_gex_oi,
-        'call_resistance_net_gex_vol': call_resistance_net_gex_vol,
-        'put_support_net_gex_vol': put_support_net_gex_vol,
-        'call_resistance_vol_oi': call_resistance_vol_oi,
-        'put_support_vol_oi': put_support_vol_oi,
-        'call_resistance_net_vol_oi': call_resistance_net_vol_oi,
-        'put_support_net_vol_oi': put_support_net_vol_oi,
-        'callbid_vol': callbid_vol,
-        'putbid_vol': putbid_vol,
-        'tot_vol': volume,
-        'calloi_vol': calloi_vol,
-        'putoi_vol': putoi_vol,
-        'tot_oi': open_interest,
-        'zero_gamma1': zero_gamma,
-        'gamma_flip1': gamma_flip1,
-        'gamma_flip2': gamma_flip2,
-        'pain_volume_strike': pain_volume_strike,
-        'pain_oi_strike': pain_oi_strike,
-        'zero_pos_strike': zero_pos_strike,
-        'zero_neg_strike': zero_neg_strike,
-        'tot_vol_ratio': tot_vol,
-        'tot_oi_ratio': tot_oi,
-        'spotPrice': spotPrice,
-    }
+    # Round the new data based on tick size
+    gex_ladder, gex_flow_and_levels = GexLevelBatch([levels]).to_frames(symbol)
+    return gex_ladder, gex_flow_and_levels, df
 
-    print("Calculating First Expiration Levels")
-    firstExpiration = {
-        'symbol': symbol,
-        'expiration': 'First',
-        'processTime': today.strftime('%Y-%m-%d %H:%M:00'),
-        'vol_call_1': vCallPrice_1,
-        'vol_put_1': vPutPrice_1,
-        'oi_call_1': vCallOiPrice_1,
-        'oi_put_1': vPutOiPrice_1,
-        'vol_avg_1': vAvgPrice_1,
-        'oi_avg_1': vAvgOiPrice_1,
-        'vol_resistance1_1': vRes1Price_1,
-        'vol_support1_1': vSup1Price_1,
-        'vol_resistance2_1': vRes2Price_1,
-        'vol_support2_1': vSup2Price_1,
-        'vol_resistance3_1': vRes3Price_1,
-        'vol_support3_1': vSup3Price_1,
-        'vol_resistance4_1': vRes4Price_1,
-        'vol_support4_1': vSup4Price_1,
-        'resistances_1': [x for x in resistances_1],
-        'supports_1': [x for x in supports_1],
-        'zero_gamma_1': zeroGamma_1,
-        'zero_vanna_1': zeroVanna_1,
-        'callFlow_1': greenOi_1,
-        'deltaFlow_1': deltaOi_1,
-        'putFlow_1': redOi_1,
-        'callOrderFlow_1': greenVol_1,
-        'putOrderFlow_1': redVol_1,
-        'deltaOrderFlow_1': deltaVol_1,
-        'ethBlue_1': ethBlue_1,
-        'ethPurple_1': ethPurple_1,
-        'call_resistance_oi_1': call_resistance_oi_1,
-        'put_support_oi_1': put_support_oi_1,
-        'call_resistance_vol_1': call_resistance_vol_1,
-        'put_support_vol_1': put_support_vol_1,
-        'call_resistance_gex_oi_1': call_resistance_gex_oi_1,
-        'put_support_gex_oi_1': put_support_gex_oi_1,
-        'call_resistance_gex_vol_1': call_resistance_gex_vol_1,
-        'put_support_gex_vol_1': put_support_gex_vol_1,
-        'call_resistance_wall_1': call_resistance_wall_1,
-        'put_support_wall_1': put_support_wall_1,
-        'call_resistance_net_gex_oi_1': call_resistance_net_gex_oi_1,
-        'put_support_net_gex_oi_1': put_support_net_gex_oi_1,
-        'call_resistance_net_gex_vol_1': call_resistance_net_gex_vol_1,
-        'put_support_net_gex_vol_1': put_support_net_gex_vol_1,
-        'call_resistance_vol_oi_1': call_resistance_vol_oi_1,
-        'put_support_vol_oi_1': put_support_vol_oi_1,
-        'call_resistance_net_vol_oi_1': call_resistance_net_vol_oi_1,
-        'put_support_net_vol_oi_1': put_support_net_vol_oi_1,
-        'callbid_vol_1': callbid_vol_1,
-        'putbid_vol_1': putbid_vol_1,
-        'tot_vol_1': volume_1,
-        'calloi_vol_1': calloi_vol_1,
-        'putoi_vol_1': putoi_vol_1,
-        'tot_oi_1': open_interest_1,
-        'zero_gamma1_1': zero_gamma_1,
-        'gamma_flip1_1': gamma_flip1_1,
-        'gamma_flip2_1': gamma_flip2_1,
-        'pain_volume_strike_1': pain_volume_strike_1,
-        'pain_oi_strike_1': pain_oi_strike_1,
-        'zero_pos_strike_1': zero_pos_strike_1,
-        'zero_neg_strike_1': zero_neg_strike_1,
-        'tot_vol_ratio_1': tot_vol_1,
-        'tot_oi_ratio_1': tot_oi_1,
-        'spotPrice': spotPrice,
-    }
+def get_level_records(symbol, options=None, engines=None):
+    """
+    Rounded GEX ladder and flow level records of a symbol now, as the collector stores them.
 
-    print("Calculating Second Expiration Levels")
-    secondExpiration = {
-        'symbol': symbol,
-        'expiration': 'Second',
-        'processTime': today.strftime('%Y-%m-%d %H:%M:00'),
-        'vol_call_2': vCallPrice_2,
-        'vol_put_2': vPutPrice_2,
-        'oi_call_2': vCallOiPrice_2,
-        'oi_put_2': vPutOiPrice_2,
-        'vol_avg_2': vAvgPrice_2,
-        'oi_avg_2': vAvgOiPrice_2,
-        'vol_resistance1_2': vRes1Price_2,
-        'vol_support1_2': vSup1Price_2,
-        'vol_resistance2_2': vRes2Price_2,
-        'vol_support2_2': vSup2Price_2,
-        'vol_resistance3_2': vRes3Price_2,
-        'vol_support3_2': vSup3Price_2,
-        'vol_resistance4_2': vRes4Price_2,
-        'vol_support4_2': vSup4Price_2,
-        'resistances_2': [x for x in resistances_2],
-        'supports_2': [x for x in supports_2],
-        'zero_gamma_2': zeroGamma_2,
-        'zero_vanna_2': zeroVanna_2,
-        'callFlow_2': greenOi_2,
-        'deltaFlow_2': deltaOi_2,
-        'putFlow_2': redOi_2,
-        'callOrderFlow_2': greenVol_2,
-        'putOrderFlow_2': redVol_2,
-        'deltaOrderFlow_2': deltaVol_2,
-        'ethBlue_2': ethBlue_2,
-        'ethPurple_2': ethPurple_2,
-        'call_resistance_oi_2': call_resistance_oi_2,
-        'put_support_oi_2': put_support_oi_2,
-        'call_resistance_vol_2': call_resistance_vol_2,
-        'put_support_vol_2': put_support_vol_2,
-        'call_resistance_gex_oi_2': call_resistance_gex_oi_2,
-        'put_support_gex_oi_2': put_support_gex_oi_2,
-        'call_resistance_gex_vol_2': call_resistance_gex_vol_2,
-        'put_support_gex_vol_2': put_support_gex_vol_2,
-        'call_resistance_wall_2': call_resistance_wall_2,
-        'put_support_wall_2': put_support_wall_2,
-        'call_resistance_net_gex_oi_2': call_resistance_net_gex_oi_2,
-        'put_support_net_gex_oi_2': put_support_net_gex_oi_2,
-        'call_resistance_net_gex_vol_2': call_resistance_net_gex_vol_2,
-        'put_support_net_gex_vol_2': put_support_net_gex_vol_2,
-        'call_resistance_vol_oi_2': call_resistance_vol_oi_2,
-        'put_support_vol_oi_2': put_support_vol_oi_2,
-        'call_resistance_net_vol_oi_2': call_resistance_net_vol_oi_2,
-        'put_support_net_vol_oi_2': put_support_net_vol_oi_2,
-        'callbid_vol_2': callbid_vol_2,
-        'putbid_vol_2': putbid_vol_2,
-        'tot_vol_2': volume_2,
-        'calloi_vol_2': calloi_vol_2,
-        'putoi_vol_2': putoi_vol_2,
-        'tot_oi_2': open_interest_2,
-        'zero_gamma1_2': zero_gamma_2,
-        'gamma_flip1_2': gamma_flip1_2,
-        'gamma_flip2_2': gamma_flip2_2,
-        'pain_volume_strike_2': pain_volume_strike_2,
-        'pain_oi_strike_2': pain_oi_strike_2,
-        'zero_pos_strike_2': zero_pos_strike_2,
-        'zero_neg_strike_2': zero_neg_strike_2,
-        'tot_vol_ratio_2': tot_vol_2,
-        'tot_oi_ratio_2': tot_oi_2,
-        'spotPrice': spotPrice,
-    }
+    Unlike get_levels neither DataFrames nor the contracts are built, so a process pool
+    worker only sends the records back. Missing levels are None (null in JSON).
 
-    print("Calculating Weekly Expiration Levels")
-    weeklyExpiration = {
-        'symbol': symbol,
-        'expiration': 'Weekly',
-        'processTime': today.strftime('%Y-%m-%d %H:%M:00'),
-        'vol_call_w': vCallPrice_w,
-        'vol_put_w': vPutPrice_w,
-        'oi_call_w': vCallOiPrice_w,
-        'oi_put_w': vPutOiPrice_w,
-        'vol_avg_w': vAvgPrice_w,
-        'oi_avg_w': vAvgOiPrice_w,
-        'vol_resistance1_w': vRes1Price_w,
-        'vol_support1_w': vSup1Price_w,
-        'vol_resistance2_w': vRes2Price_w,
-        'vol_support2_w': vSup2Price_w,
-        'vol_resistance3_w': vRes3Price_w,
-        'vol_support3_w': vSup3Price_w,
-        'vol_resistance4_w': vRes4Price_w,
-        'vol_support4_w': vSup4Price_w,
-        'resistances_w': [x for x in resistances_w],
-        'supports_w': [x for x in supports_w],
-        'zero_gamma_w': zeroGamma_w,
-        'zero_vanna_w': zeroVanna_w,
-        'callFlow_w': greenOi_w,
-        'deltaFlow_w': deltaOi_w,
-        'putFlow_w': redOi_w,
-        'callOrderFlow_w': greenVol_w,
-        'putOrderFlow_w': redVol_w,
-        'deltaOrderFlow_w': deltaVol_w,
-        'ethBlue_w': ethBlue_w,
-        'ethPurple_w': ethPurple_w,
-        'call_resistance_oi_w': call_resistance_oi_w,
-        'put_support_oi_w': put_support_oi_w,
-        'call_resistance_vol_w': call_resistance_vol_w,
-        'put_support_vol_w': put_support_vol_w,
-        'call_resistance_gex_oi_w': call_resistance_gex_oi_w,
-        'put_support_gex_oi_w': put_support_gex_oi_w,
-        'call_resistance_gex_vol_w': call_resistance_gex_vol_w,
-        'put_support_gex_vol_w': put_support_gex_vol_w,
-        'call_resistance_wall_w': call_resistance_wall_w,
-        'put_support_wall_w': put_support_wall_w,
-        'call_resistance_net_gex_oi_w': call_resistance_net_gex_oi_w,
-        'put_support_net_gex_oi_w': put_support_net_gex_oi_w,
-        'call_resistance_net_gex_vol_w': call_resistance_net_gex_vol_w,
-        'put_support_net_gex_vol_w': put_support_net_gex_vol_w,
-        'call_resistance_vol_oi_w': call_resistance_vol_oi_w,
-        'put_support_vol_oi_w': put_support_vol_oi_w,
-        'call_resistance_net_vol_oi_w': call_resistance_net_vol_oi_w,
-        'put_support_net_vol_oi_w': put_support_net_vol_oi_w,
-        'callbid_vol_w': callbid_vol_w,
-        'putbid_vol_w': putbid_vol_w,
-        'tot_vol_w': volume_w,
-        'calloi_vol_w': calloi_vol_w,
-        'putoi_vol_w': putoi_vol_w,
-        'tot_oi_w': open_interest_w,
-        'zero_gamma1_w': zero_gamma_w,
-        'gamma_flip1_w': gamma_flip1_w,
-        'gamma_flip2_w': gamma_flip2_w,
-        'pain_volume_strike_w': pain_volume_strike_w,
-        'pain_oi_strike_w': pain_oi_strike_w,
-        'zero_pos_strike_w': zero_pos_strike_w,
-        'zero_neg_strike_w': zero_neg_strike_w,
-        'tot_vol_ratio_w': tot_vol_w,
-        'tot_oi_ratio_w': tot_oi_w,
-        'spotPrice': spotPrice,
-    }
+    :param engines: make_incremental_levels() engines of the symbol, see get_levels.
+    :return: (list with the GEX ladder record, list of flow level records)
+    """
+    today = pd.Timestamp.now(tz=MARKET_TIMEZONE).tz_localize(None)
+    levels, _ = calc_gex_levels(symbol, today, options, **(engines or {}))
+    return GexLevelBatch([levels]).to_records(symbol)
 
-    print ("Calculating Monthly Expiration Levels")
-    monthlyExpiration = {
-        'symbol': symbol,
-        'expiration': 'Monthly',
-        'processTime': today.strftime('%Y-%m-%d %H:%M:00'),
-        'vol_call_m': vCallPrice_m,
-        'vol_put_m': vPutPrice_m,
-        'oi_call_m': vCallOiPrice_m,
-        'oi_put_m': vPutOiPrice_m,
-        'vol_avg_m': vAvgPrice_m,
-        'oi_avg_m': vAvgOiPrice_m,
-        'vol_resistance1_m': vRes1Price_m,
-        'vol_support1_m': vSup1Price_m,
-        'vol_resistance2_m': vRes2Price_m,
-        'vol_support2_m': vSup2Price_m,
-        'vol_resistance3_m': vRes3Price_m,
-        'vol_support3_m': vSup3Price_m,
-        'vol_resistance4_m': vRes4Price_m,
-        'vol_support4_m': vSup4Price_m,
-        'resistances_m': [x for x in resistances_m],
-        'supports_m': [x for x in supports_m],
-        'zero_gamma_m': zeroGamma_m,
-        'zero_vanna_m': zeroVanna_m,
-        'callFlow_m': greenOi_m,
-        'deltaFlow_m': deltaOi_m,
-        'putFlow_m': redOi_m,
-        'callOrderFlow_m': greenVol_m,
-        'putOrderFlow_m': redVol_m,
-        'deltaOrderFlow_m': deltaVol_m,
-        'ethBlue_m': ethBlue_m,
-        'ethPurple_m': ethPurple_m,
-        'call_resistance_oi_m': call_resistance_oi_m,
-        'put_support_oi_m': put_support_oi_m,
-        'call_resistance_vol_m': call_resistance_vol_m,
-        'put_support_vol_m': put_support_vol_m,
-        'call_resistance_gex_oi_m': call_resistance_gex_oi_m,
-        'put_support_gex_oi_m': put_support_gex_oi_m,
-        'call_resistance_gex_vol_m': call_resistance_gex_vol_m,
-        'put_support_gex_vol_m': put_support_gex_vol_m,
-        'call_resistance_wall_m': call_resistance_wall_m,
-        'put_support_wall_m': put_support_wall_m,
-        'call_resistance_net_gex_oi_m': call_resistance_net_gex_oi_m,
-        'put_support_net_gex_oi_m': put_support_net_gex_oi_m,
-        'call_resistance_net_gex_vol_m': call_resistance_net_gex_vol_m,
-        'put_support_net_gex_vol_m': put_support_net_gex_vol_m,
-        'call_resistance_vol_oi_m': call_resistance_vol_oi_m,
-        'put_support_vol_oi_m': put_support_vol_oi_m,
-        'call_resistance_net_vol_oi_m': call_resistance_net_vol_oi_m,
-        'put_support_net_vol_oi_m': put_support_net_vol_oi_m,
-        'callbid_vol_m': callbid_vol_m,
-        'putbid_vol_m': putbid_vol_m,
-        'tot_vol_m': volume_m,
-        'calloi_vol_m': calloi_vol_m,
-        'putoi_vol_m': putoi_vol_m,
-        'tot_oi_m': open_interest_m,
-        'zero_gamma1_m': zero_gamma_m,
-        'gamma_flip1_m': gamma_flip1_m,
-        'gamma_flip2_m': gamma_flip2_m,
-        'pain_volume_strike_m': pain_volume_strike_m,
-        'pain_oi_strike_m': pain_oi_strike_m,
-        'zero_pos_strike_m': zero_pos_strike_m,
-        'zero_neg_strike_m': zero_neg_strike_m,
-        'tot_vol_ratio_m': tot_vol_m,
-        'tot_oi_ratio_m': tot_oi_m,
-        'spotPrice': spotPrice,
-    }
-    
-    #gex_flow_levels = pd.DataFrame()
-    #gex_flow_levels = pd.concat([gex_flow_levels, pd.DataFrame([esData])])
-    # Round values to two decimal places
-    #columns_to_round = [col for col in gex_flow_levels.columns if col != 'priceRatio']
-    #gex_flow_levels[columns_to_round] = gex_flow_levels[columns_to_round].round(2)
+# Symbols refreshed together by the async ingestion
+LEVEL_SYMBOLS = ['_SPX', '_NDX', '_RUT', 'SPY', 'QQQ', 'IWM']
+CBOE_MAX_CONNECTIONS = 8
 
-    #eturn gex_flow_levels, df
-    return gexLadder, allExpiration, firstExpiration, secondExpiration, weeklyExpiration, monthlyExpiration, df
+async def fetch_cboe_options_async(session, symbol, timeout=CBOE_REQUEST_TIMEOUT):
+    """
+    Fetch the raw CBOE delayed quotes JSON of a symbol over a shared aiohttp session.
 
-def round_dict_values(data, instrument, exclude_keys=None):
+    :param session: aiohttp.ClientSession holding the connection pool.
+    :param symbol: CBOE symbol, e.g. '_SPX' or 'SPY'.
+    :return: The decoded JSON payload.
     """
-    Round all numerical values in a nested dictionary to the nearest tick based on the instrument.
-    Round excluded keys to 2 decimal places.
+    async with session.get(CBOE_OPTIONS_URL + symbol + ".json", timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        response.raise_for_status()
+        return await response.json(content_type=None)
 
-    :param data: Dictionary with numerical values.
-    :param instrument: The instrument (e.g., 'MES', 'MNQ', 'M2K').
-    :param exclude_keys: List of keys to round to 2 decimal places instead of nearest tick.
-    :return: Rounded dictionary.
+async def iter_levels_async(symbols=LEVEL_SYMBOLS, executor=None, max_connections=CBOE_MAX_CONNECTIONS,
+                            engines=None):
+    """
+    Fetch the chains of many symbols concurrently and compute their levels in a process pool.
+
+    All requests go out at once over one pooled session, each payload is handed to the
+    executor as soon as it arrives, so a refresh takes about as long as the slowest symbol.
+    The raw JSON is parsed in the worker, which bypasses CBOE_SNAPSHOT_CACHE.
+
+    :param symbols: CBOE symbols to refresh.
+    :param executor: concurrent.futures executor, a ProcessPoolExecutor sized to the symbols by default.
+    :param max_connections: Size of the HTTP connection pool.
+    :param engines: Optional dictionary of symbol to make_incremental_levels() engines. Their
+                    state has to stay in this process, so they need a thread executor (a
+                    ThreadPoolExecutor by default), a process pool would update copies.
+    :return: Async iterator of (symbol, result, error) in completion order, result being the
+             get_level_records tuple (gex ladder records, flow level records), error the
+             exception or None.
     """
+    symbols = list(symbols)
+    if engines is not None and isinstance(executor, ProcessPoolExecutor):
+        raise ValueError("Incremental engines keep their state in this process, use a thread executor")
+    loop = asyncio.get_running_loop()
+    own_executor = executor is None
+    if own_executor:
+        pool = ProcessPoolExecutor if engines is None else ThreadPoolExecutor
+        executor = pool(max_workers=min(len(symbols), os.cpu_count() or 1) or 1)
+
+    async def refresh(session, symbol):
+        try:
+            options = await fetch_cboe_options_async(session, symbol)
+            args = (symbol, options) if engines is None else (symbol, options, engines[symbol])
+            return symbol, await loop.run_in_executor(executor, get_level_records, *args), None
+        except Exception as e:
+            return symbol, None, e
+
+    try:
+        connector = aiohttp.TCPConnector(limit=max_connections)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            for task in asyncio.as_completed([refresh(session, symbol) for symbol in symbols]):
+                yield await task
+    finally:
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+async def get_levels_async(symbols=LEVEL_SYMBOLS, executor=None, max_connections=CBOE_MAX_CONNECTIONS, engines=None):
+    """
+    Refresh the levels of many symbols concurrently, see iter_levels_async.
 
-    # Function to get tick size
-    def get_tick_size(symbol):
-        tick_sizes = {'MES': 0.25, 'MNQ': 0.25, 'M2K': 0.1, 'SPY' : 0.01, 'QQQ' : 0.01, 'IWM' : 0.01}
-        if symbol == '_SPX':
-            return 0.01  # Two increments of 0.01 for _SPX
-        elif symbol.isalpha():  # Assume all equities are alphabetic symbols
-            return 0.01
-        else:
-            return tick_sizes.get(symbol, None)  # Return from predefined values if available
-    
-    def round_to_ticks(value, instrument):
-        # Define tick sizes for instruments
-        tick_size = get_tick_size(instrument)
-        if tick_size is None:
-            raise ValueError(f"Unsupported instrument: {instrument}")
-        return round(value / tick_size) * tick_size
-
-    def round_nested(obj):
-        if isinstance(obj, dict):
-            return {
-                key: (
-                    round(value, 4) if key in exclude_keys else round_nested(value)
-                ) if isinstance(value, (int, float)) else round_nested(value)
-                for key, value in obj.items()
-            }
-        elif isinstance(obj, list):
-            return [round_nested(item) for item in obj]
-        elif isinstance(obj, (int, float)):
-            return round_to_ticks(obj, instrument)
+    :return: Dictionary of symbol to get_level_records tuple, failed symbols are reported and left out.
+    """
+    results = {}
+    async for symbol, result, error in iter_levels_async(symbols, executor, max_connections, engines):
+        if error is not None:
+            print(f"Failed to get levels for {symbol}: {error}")
         else:
-            return obj
+            results[symbol] = result
+    return results
 
-    # Default exclude_keys to an empty list if None
-    exclude_keys = exclude_keys or []
-    return round_nested(data)
+# GEX history log: fileName is the active JSON-lines segment, full segments are
+# renamed to <name>-<NNNNNN>.jsonl and listed in <fileName>.index with their time range
+GEX_LOG_SEGMENT_BYTES = 8 * 1024 * 1024
 
-def get_levels(symbol):
-    print("Getting GEX and Flow Levels")
-    today = pd.to_datetime(datetime.now())
-    gexLadder, allExpiration, firstExpiration, secondExpiration, weeklyExpiration, monthlyExpiration, df = get_gex_and_flow_levels(symbol, today)
+def write_json_atomic(fileName, data):
+    """Replace fileName with data as JSON, readers see either the old or the new file."""
+    tmpFileName = fileName + '.tmp'
+    with open(tmpFileName, 'w') as outfile:
+        json.dump(data, outfile)
+    os.replace(tmpFileName, fileName)
 
-    # Round the new data based on tick size
-    exclude_keys = ["callFlow_1", "deltaFlow_1", "putFlow_1", "callOrderFlow_1", "putOrderFlow_1",
-                    "deltaOrderFlow_1", "ethBlue_1", "ethPurple_1", "callbid_vol_1", "putbid_vol_1",
-                    "tot_vol_1", "calloi_vol_1", "putoi_vol_1", "tot_oi_1", "tot_vol_ratio_1", "tot_oi_ratio_1",
-                    "callFlow_2", "deltaFlow_2", "putFlow_2", "callOrderFlow_2", "putOrderFlow_2",
-                    "deltaOrderFlow_2", "ethBlue_2", "ethPurple_2", "callbid_vol_2", "putbid_vol_2",
-                    "tot_vol_2", "calloi_vol_2", "putoi_vol_2", "tot_oi_2", "tot_vol_ratio_2", "tot_oi_ratio_2",
-                    "callFlow_w", "deltaFlow_w", "putFlow_w", "callOrderFlow_w", "putOrderFlow_w",
-                    "deltaOrderFlow_w", "ethBlue_w", "ethPurple_w", "callbid_vol_w", "putbid_vol_w",
-                    "tot_vol_w", "calloi_vol_w", "putoi_vol_w", "tot_oi_w", "tot_vol_ratio_w", "tot_oi_ratio_w",
-                    "callFlow_m", "deltaFlow_m", "putFlow_m", "callOrderFlow_m", "putOrderFlow_m",
-                    "deltaOrderFlow_m", "ethBlue_m", "ethPurple_m", "callbid_vol_m", "putbid_vol_m",
-                    "tot_vol_m", "calloi_vol_m", "putoi_vol_m", "tot_oi_m", "tot_vol_ratio_m", "tot_oi_ratio_m",
-                    "callFlow", "deltaFlow", "putFlow", "callOrderFlow", "putOrderFlow",
-                    "deltaOrderFlow", "ethBlue", "ethPurple", "callbid_vol", "putbid_vol",
-                    "tot_vol", "calloi_vol", "putoi_vol", "tot_oi", "tot_vol_ratio", "tot_oi_ratio",
-                    "priceRatio"]  # Exclude "excluded" from rounding
-    gexLadder_new = round_dict_values(gexLadder, symbol, exclude_keys)
-
-    # Append the data into dataframe
-    gex_ladder = pd.DataFrame()
-    gex_ladder = pd.concat([gex_ladder, pd.DataFrame([gexLadder_new])])
-
-    gex_flow_and_levels = pd.DataFrame()
-    firstExpiration_new = round_dict_values(firstExpiration, symbol, exclude_keys)
-    secondExpiration_new = round_dict_values(secondExpiration, symbol, exclude_keys)
-    weeklyExpiration_new = round_dict_values(weeklyExpiration, symbol, exclude_keys)
-    monthlyExpiration_new = round_dict_values(monthlyExpiration, symbol, exclude_keys)
-    allExpiration_new = round_dict_values(allExpiration, symbol, exclude_keys)
-    gex_flow_and_levels = pd.concat([gex_flow_and_levels, pd.DataFrame([allExpiration_new, firstExpiration_new, secondExpiration_new, weeklyExpiration_new, monthlyExpiration_new])])
+def get_gex_log_index(fileName):
+    """
+    Sealed segments of a GEX log, oldest first: dicts with segment, first, last and records.
+    A line torn by a crash during append is skipped. The segment of an entry can be missing
+    when a crash happened between indexing and renaming it, readers skip those entries.
+    """
+    if not os.path.exists(fileName + '.index'):
+        return []
+    entries = []
+    with open(fileName + '.index', 'r') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return entries
+
+def get_next_gex_log_segment(fileName, index):
+    """Path of the next sealed segment, numbered after every indexed segment and every segment file on disk."""
+    base = os.path.splitext(fileName)[0]
+    prefix = os.path.basename(base) + '-'
+    names = [entry['segment'] for entry in index]
+    dataPath = os.path.dirname(fileName) or '.'
+    names += [name for name in os.listdir(dataPath) if name.startswith(prefix)]
+    numbers = [int(name[len(prefix):-len('.jsonl')]) for name in names
+               if name.startswith(prefix) and name.endswith('.jsonl') and name[len(prefix):-len('.jsonl')].isdigit()]
+    return f"{base}-{max(numbers, default=0) + 1:06d}.jsonl"
+
+def read_gex_log_segment(fileName):
+    """Records of one segment, skipping a line torn by a crash during append."""
+    records = []
+    with open(fileName, 'r') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
 
-    return gex_ladder, gex_flow_and_levels, df
+def seal_gex_log_segment(fileName, records=None):
+    """
+    Rename the active segment (or write records) to the next sealed segment and index it.
+
+    The index entry is written before the rename: a crash in between leaves an entry
+    without its file, which readers skip, while the records are still in the active
+    segment (or the file being converted). Sealed segments are never overwritten since
+    the next number also counts the segment files on disk.
+
+    :param fileName: The log file.
+    :param records: Records to seal instead of the active segment, used to convert a JSON array file.
+    """
+    segment = get_next_gex_log_segment(fileName, get_gex_log_index(fileName))
+    if records is None:
+        records = read_gex_log_segment(fileName)
+        source = fileName
+    else:
+        source = segment + '.tmp'
+        with open(source, 'w') as f:
+            f.writelines(json.dumps(record) + '\n' for record in records)
+
+    times = [record.get('processTime') for record in records if isinstance(record, dict)]
+    times = [t for t in times if t is not None]
+    entry = {'segment': os.path.basename(segment), 'first': min(times, default=None),
+             'last': max(times, default=None), 'records': len(records)}
+    append_gex_log_index(fileName, entry)
+    os.replace(source, segment)
+
+def append_gex_log_index(fileName, entry):
+    """Append an entry to the index of a GEX log and flush it to disk, after a torn last line if any."""
+    indexFileName = fileName + '.index'
+    torn = False
+    if os.path.exists(indexFileName) and os.path.getsize(indexFileName) > 0:
+        with open(indexFileName, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            torn = f.read(1) != b'\n'
+    with open(indexFileName, 'a') as f:
+        f.write(('\n' if torn else '') + json.dumps(entry) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+def append_gex_log(fileName, records, segment_bytes=GEX_LOG_SEGMENT_BYTES):
+    """
+    Append records to a GEX log, one JSON document per line.
+
+    The cost does not depend on the size of the history: the record is appended to the
+    active segment, which is sealed once it grows past segment_bytes. A file in the old
+    JSON array format is converted to a sealed segment on first append, an unreadable
+    one is kept as <fileName>.corrupt.
+
+    :param fileName: The log file.
+    :param records: List of JSON serializable records.
+    :param segment_bytes: Size of the active segment that triggers a rotation.
+    """
+    if os.path.exists(fileName) and os.path.getsize(fileName) > 0:
+        with open(fileName, 'rb') as f:
+            first = f.read(1)
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+
+        existing_data = None
+        if first == b'[' or (first == b'{' and last != b'\n'):
+            # Old JSON array (or dict) file, or an active segment whose last line was torn by a crash
+            with open(fileName, 'r') as f:
+                try:
+                    existing_data = json.load(f)
+                except json.JSONDecodeError:
+                    pass
+
+        if existing_data is not None:
+            seal_gex_log_segment(fileName, existing_data if isinstance(existing_data, list) else [existing_data])
+            os.remove(fileName)
+        elif first == b'[':
+            print(f"Unreadable GEX history {fileName}, moved to {fileName}.corrupt")
+            os.replace(fileName, fileName + '.corrupt')
+        elif os.path.getsize(fileName) >= segment_bytes:
+            seal_gex_log_segment(fileName)
+        elif last != b'\n':
+            # Terminate the torn line so the new records start on their own line
+            records = [None] + list(records)
+
+    lines = ['' if record is None else json.dumps(record) for record in records]
+    with open(fileName, 'a') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def read_gex_log(fileName, start=None, end=None):
+    """
+    Read the records of a GEX log whose processTime is between start and end (inclusive).
+    Sealed segments outside the range are not opened.
+
+    :return: List of records, oldest first.
+    """
+    start = None if start is None else pd.Timestamp(start).strftime('%Y-%m-%d %H:%M:%S')
+    end = None if end is None else pd.Timestamp(end).strftime('%Y-%m-%d %H:%M:%S')
+    dataPath = os.path.dirname(fileName)
+
+    segments = []
+    for entry in get_gex_log_index(fileName):
+        if entry['first'] is not None and ((end is not None and entry['first'] > end) or (start is not None and entry['last'] < start)):
+            continue
+        segment = os.path.join(dataPath, entry['segment'])
+        if os.path.exists(segment):
+            segments.append(segment)
+    if os.path.exists(fileName):
+        segments.append(fileName)
+
+    records = []
+    for segment in segments:
+        for record in read_gex_log_segment(segment):
+            processTime = record.get('processTime') if isinstance(record, dict) else None
+            if processTime is not None and ((start is not None and processTime < start) or (end is not None and processTime > end)):
+                continue
+            records.append(record)
+    return records
 
 def write_or_append_gex_data(instrument, new_data, fileName, dataPath, latestFileName):
     """
-    Write or append gexLadder data to a JSON file. Create directories if needed.
+    Append gexLadder data to a JSON-lines log (see append_gex_log). Create directories if needed.
     Rounds numerical values in new_data based on the instrument's tick size.
-    
+
     :param new_data: The dictionary or list object to write/append.
     :param fileName: The file to write or append to.
     :param dataPath: The directory path for the file.
@@ -1245,65 +2649,15 @@ def write_or_append_gex_data(instrument, new_data, fileName, dataPath, latestFil
     :param instrument: The instrument (e.g., 'MES', 'MNQ', 'M2K') for rounding.
     """
     # Round the new data based on tick size
-    exclude_keys = ["callFlow_1", "deltaFlow_1", "putFlow_1", "callOrderFlow_1", "putOrderFlow_1",
-                    "deltaOrderFlow_1", "ethBlue_1", "ethPurple_1", "callbid_vol_1", "putbid_vol_1",
-                    "tot_vol_1", "calloi_vol_1", "putoi_vol_1", "tot_oi_1", "tot_vol_ratio_1", "tot_oi_ratio_1",
-                    "callFlow_2", "deltaFlow_2", "putFlow_2", "callOrderFlow_2", "putOrderFlow_2",
-                    "deltaOrderFlow_2", "ethBlue_2", "ethPurple_2", "callbid_vol_2", "putbid_vol_2",
-                    "tot_vol_2", "calloi_vol_2", "putoi_vol_2", "tot_oi_2", "tot_vol_ratio_2", "tot_oi_ratio_2",
-                    "callFlow_w", "deltaFlow_w", "putFlow_w", "callOrderFlow_w", "putOrderFlow_w",
-                    "deltaOrderFlow_w", "ethBlue_w", "ethPurple_w", "callbid_vol_w", "putbid_vol_w",
-                    "tot_vol_w", "calloi_vol_w", "putoi_vol_w", "tot_oi_w", "tot_vol_ratio_w", "tot_oi_ratio_w",
-                    "callFlow_m", "deltaFlow_m", "putFlow_m", "callOrderFlow_m", "putOrderFlow_m",
-                    "deltaOrderFlow_m", "ethBlue_m", "ethPurple_m", "callbid_vol_m", "putbid_vol_m",
-                    "tot_vol_m", "calloi_vol_m", "putoi_vol_m", "tot_oi_m", "tot_vol_ratio_m", "tot_oi_ratio_m",
-                    "callFlow", "deltaFlow", "putFlow", "callOrderFlow", "putOrderFlow",
-                    "deltaOrderFlow", "ethBlue", "ethPurple", "callbid_vol", "putbid_vol",
-                    "tot_vol", "calloi_vol", "putoi_vol", "tot_oi", "tot_vol_ratio", "tot_oi_ratio",
-                    "priceRatio"]  # Exclude "excluded" from rounding
-    #new_data = round_dict_values(new_data, instrument)
-    new_data = round_dict_values(new_data, instrument, exclude_keys)
+    new_data = round_dict_values(new_data, instrument, ROUND_EXCLUDE_KEYS)
 
 
     # Convert new_data to an array if it's a single dictionary
     if isinstance(new_data, dict):
         new_data = [new_data]
 
-    # Check if the file exists
-    if os.path.exists(fileName):
-        # Read existing data
-        with open(fileName, 'r') as f:
-            try:
-                existing_data = json.load(f)
-            except json.JSONDecodeError:
-                existing_data = []  # Initialize as empty if the file is corrupted or empty
-
-        # Append or merge based on the structure of existing data
-        if isinstance(existing_data, list):
-            if isinstance(new_data, list):
-                existing_data.extend(new_data)  # Extend if both are lists
-            else:
-                existing_data.append(new_data)  # Append if new_data is a single dictionary
-        elif isinstance(existing_data, dict):
-            if isinstance(new_data, dict):
-                existing_data.update(new_data)  # Merge dictionaries
-            else:
-                raise ValueError(f"Cannot append list data to a dictionary in {fileName}.")
-        else:
-            raise ValueError(f"Unsupported data type in {fileName}: {type(existing_data)}.")
-
-        # Write back the updated data
-        with open(fileName, 'w') as f:
-            json.dump(existing_data, f, indent=4)
-    else:
-        # Create directory if needed
-        if not os.path.exists(dataPath):
-            os.makedirs(dataPath)
-        # Write new data to file
-        with open(fileName, "w") as outfile:
-            json.dump(new_data, outfile)
+    os.makedirs(dataPath, exist_ok=True)
+    append_gex_log(fileName, new_data)
 
     # Overwrite the latest gex data to the latest file
-    with open(latestFileName, "w") as outfile:
-        json.dump(new_data, outfile)
-
+    write_json_atomic(latestFileName, new_data)
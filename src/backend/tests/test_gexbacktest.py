@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+from helpers.gexbacktest import load_level_snapshots
+from helpers.gexcollector import GexLevelStore, get_gex_file_names
+from helpers.options import BUCKET_LEVEL_FIELDS, BucketLevels, write_or_append_gex_data
+
+
+def make_bucket_record(symbol, bucket, processTime, value):
+    """Flow level record of one bucket as the collector stores it, every metric set to value."""
+    fields = {name: value for name in BUCKET_LEVEL_FIELDS}
+    fields.update(symbol=symbol, expiration=bucket, processTime=processTime, spotPrice=100.0)
+    return BucketLevels(**fields).to_dict()
+
+
+def make_store(path, times, buckets=('All', 'First', 'Weekly')):
+    """Store with one record per bucket and time, the value of bucket b at time i is 100 * (b + 1) + i."""
+    records = [make_bucket_record('SPY', bucket, t, 100.0 * (b + 1) + i)
+               for i, t in enumerate(times) for b, bucket in enumerate(buckets)]
+    fileName, latestFileName, symbolPath = get_gex_file_names('SPY', 'flow_levels', str(path))
+    write_or_append_gex_data('SPY', records, fileName, symbolPath, latestFileName)
+    return GexLevelStore(str(path))
+
+
+def test_bucket_levels_are_read_from_suffixed_keys(tmp_path):
+    times = ['2026-03-02 10:00:00', '2026-03-02 10:01:00', '2026-03-02 10:02:00']
+    store = make_store(tmp_path, times)
+    for b, bucket in enumerate(('All', 'First', 'Weekly')):
+        loaded, values = load_level_snapshots(store, 'SPY', bucket=bucket, levels=['zero_gamma', 'gamma_flip1'])
+        np.testing.assert_array_equal(loaded, pd.DatetimeIndex(times).to_numpy())
+        expected = 100.0 * (b + 1) + np.arange(len(times))
+        np.testing.assert_array_equal(values, np.column_stack([expected, expected]))
+
+
+def test_unknown_bucket_raises(tmp_path):
+    store = make_store(tmp_path, ['2026-03-02 10:00:00'])
+    with pytest.raises(ValueError, match='Unknown bucket'):
+        load_level_snapshots(store, 'SPY', bucket='Daily')
+
+
+def test_missing_level_raises(tmp_path):
+    store = make_store(tmp_path, ['2026-03-02 10:00:00'])
+    with pytest.raises(ValueError, match='not_a_level_1'):
+        load_level_snapshots(store, 'SPY', bucket='First', levels=['zero_gamma', 'not_a_level'])
+
+
+def test_bucket_without_records_is_empty(tmp_path):
+    store = make_store(tmp_path, ['2026-03-02 10:00:00'], buckets=('All',))
+    times, values = load_level_snapshots(store, 'SPY', bucket='Monthly', levels=['zero_gamma'])
+    assert len(times) == 0 and values.shape == (0, 1)
+
+
+def test_date_end_includes_its_whole_day(tmp_path):
+    times = ['2026-06-29 15:59:00', '2026-06-30 09:30:00', '2026-06-30 16:00:00', '2026-07-01 09:30:00']
+    store = make_store(tmp_path, times)
+    loaded, _ = load_level_snapshots(store, 'SPY', '2026-06-30', '2026-06-30', levels=['zero_gamma'])
+    np.testing.assert_array_equal(loaded, pd.DatetimeIndex(times[1:3]).to_numpy())
+
+
+def test_end_with_a_time_is_inclusive(tmp_path):
+    times = ['2026-06-30 09:30:00', '2026-06-30 10:00:00', '2026-06-30 10:01:00']
+    store = make_store(tmp_path, times)
+    loaded, _ = load_level_snapshots(store, 'SPY', None, '2026-06-30 10:00', levels=['zero_gamma'])
+    np.testing.assert_array_equal(loaded, pd.DatetimeIndex(times[:2]).to_numpy())
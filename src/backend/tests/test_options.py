@@ -0,0 +1,498 @@
+import json
+import threading
+import time
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+from datetime import date, timedelta
+from helpers import blackscholes
+from helpers.blackscholes import IV_MAX, calc_black_scholes, calc_implied_vol
+from helpers.options import (BUCKET_SUFFIXES, LADDER_NUM_LEVELS, CboeSnapshotCache, ExposureCube, GEX_LEVEL_COLUMNS,
+                             OPTION_LEG_FIELDS, WALL_COLUMNS, IncrementalBucketAggregates, IncrementalExposureSurface,
+                             OptionChain, append_gex_log, append_gex_log_index, calc_bucket_aggregates,
+                             calc_cumulative_balance, calc_exposure_surface, calc_gex_levels, calc_greek_ladder,
+                             find_exposure_zeros, find_zero_gamma_levels, find_zero_vanna_levels,
+                             get_bucket_exposure_zeros, get_bucket_greek_surfaces, get_bucket_membership,
+                             get_days_till_exp, get_exposure_function, get_gex_log_index, get_ladder_levels,
+                             get_level_records, get_next_gex_log_segment, make_incremental_levels, make_ladder_inputs,
+                             pair_option_legs, parse_cboe_options, parse_occ_symbols, read_gex_log)
+
+
+def loop_cumulative_balance(df, column):
+    """The running balance as get_cboe_option_data and get_flip_pain_points computed it before the kernel."""
+    results = []
+    for i in range(len(df)):
+        cumulative_sum = df[column].iloc[:i + 1].sum()
+        remaining_sum = df[column].iloc[i + 1:].sum()
+        results.append(cumulative_sum - remaining_sum)
+    return np.array(results, dtype=np.float64)
+
+
+def make_frame(rows=50, index=None, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'CallBidOI': rng.uniform(0, 1000, rows),
+        'PutBidOI': rng.uniform(0, 1000, rows),
+        'TotalGamma': rng.normal(0, 1, rows),
+    }, index=index)
+    return df
+
+
+def test_single_column_matches_loop():
+    df = make_frame()
+    np.testing.assert_allclose(calc_cumulative_balance(df, 'CallBidOI'), loop_cumulative_balance(df, 'CallBidOI'),
+                               rtol=1e-12, atol=1e-9)
+
+
+def test_many_columns_match_loop():
+    df = make_frame()
+    columns = ['CallBidOI', 'PutBidOI', 'TotalGamma']
+    balance = calc_cumulative_balance(df, columns)
+    assert balance.shape == (len(df), len(columns))
+    for i, column in enumerate(columns):
+        np.testing.assert_allclose(balance[:, i], loop_cumulative_balance(df, column), rtol=1e-12, atol=1e-9)
+
+
+def test_nan_rows_are_skipped_like_the_loop():
+    df = make_frame()
+    df.iloc[[0, 7, 8, 49], 0] = np.nan
+    df.iloc[20:30, 2] = np.nan
+    for column in ('CallBidOI', 'TotalGamma'):
+        np.testing.assert_allclose(calc_cumulative_balance(df, column), loop_cumulative_balance(df, column),
+                                   rtol=1e-12, atol=1e-9)
+
+
+def test_non_default_index_uses_row_order():
+    df = make_frame(index=pd.Index(np.arange(50)[::-1] * 5 + 1000, name='StrikePrice'))
+    np.testing.assert_allclose(calc_cumulative_balance(df, 'PutBidOI'), loop_cumulative_balance(df, 'PutBidOI'),
+                               rtol=1e-12, atol=1e-9)
+
+
+def test_empty_frame():
+    df = make_frame(rows=0)
+    assert calc_cumulative_balance(df, 'CallBidOI').shape == (0,)
+    assert calc_cumulative_balance(df, ['CallBidOI', 'PutBidOI']).shape == (0, 2)
+
+
+def make_ladder_contracts(rows=200, seed=0):
+    rng = np.random.default_rng(seed)
+    return make_ladder_inputs(rng.uniform(80, 120, rows), rng.uniform(0.01, 1, rows), rng.uniform(0.1, 0.6, rows),
+                              rng.integers(1, 1000, rows).astype(np.float64))
+
+
+def test_ladder_vanna_is_the_derivative_of_delta_in_vol():
+    inputs = make_ladder_contracts()
+    S = np.linspace(90, 110, 5)[:, None]
+    vanna = calc_greek_ladder(S, inputs, ('vanna',), put=True, q=0.02)['vanna']
+    bump = 1e-5
+    up, down = (calc_black_scholes(S, inputs['K'], inputs['T'], inputs['vol'] + shift, q=0.02, put=True,
+                                   outputs=('delta',))['delta'] for shift in (bump, -bump))
+    np.testing.assert_allclose(vanna, (up - down) / (2 * bump), rtol=1e-5, atol=1e-8)
+
+
+def make_implied_vol_cases(rows=400, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.uniform(70, 130, rows), rng.uniform(0.02, 2, rows), rng.uniform(0.05, 1.5, rows),
+            rng.random(rows) < 0.5)
+
+
+def test_implied_vol_round_trip():
+    K, T, vol, put = make_implied_vol_cases()
+    price = calc_black_scholes(100.0, K, T, vol, 0.03, 0.01, put, ('price',))['price']
+    # Deep in the money prices without time value do not carry a volatility
+    intrinsic = np.maximum(np.where(put, -1, 1) * (100.0 * np.exp(-0.01 * T) - K * np.exp(-0.03 * T)), 0)
+    K, T, vol, put, price = (x[price - intrinsic > 1e-6] for x in (K, T, vol, put, price))
+    solved, converged = calc_implied_vol(price, 100.0, K, T, 0.03, 0.01, put)
+    assert converged.all()
+    # Deep out of the money prices are flat in the volatility, compare the prices they give
+    repriced = calc_black_scholes(100.0, K, T, solved, 0.03, 0.01, put, ('price',))['price']
+    np.testing.assert_allclose(repriced, price, rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(solved[price > 0.5], vol[price > 0.5], rtol=1e-6)
+
+
+def test_implied_vol_outside_no_arbitrage_bounds():
+    # Below the intrinsic value, above the spot, a put above the strike and an expired contract
+    price = np.array([9.0, 101.0, 121.0, 5.0])
+    K = np.array([90.0, 90.0, 120.0, 100.0])
+    T = np.array([0.5, 0.5, 0.5, 0.0])
+    put = np.array([False, False, True, False])
+    solved, converged = calc_implied_vol(price, 100.0, K, T, put=put)
+    assert np.isnan(solved).all() and not converged.any()
+
+
+def test_implied_vol_bisection_fallback(monkeypatch):
+    K, T, vol, put = make_implied_vol_cases(rows=50, seed=1)
+    price = calc_black_scholes(100.0, K, T, vol, put=put, outputs=('price',))['price']
+    # Newton steps from the top of the bracket, where vega is flat, overshoot below zero
+    monkeypatch.setattr(blackscholes, 'get_implied_vol_guess', lambda call, S_dq, K_dr, T: np.full(len(call), IV_MAX))
+    solved, converged = calc_implied_vol(price, 100.0, K, T, put=put)
+    assert converged.all()
+    repriced = calc_black_scholes(100.0, K, T, solved, put=put, outputs=('price',))['price']
+    np.testing.assert_allclose(repriced, price, rtol=1e-9, atol=1e-9)
+
+
+def make_cboe_payload(legs, close=100.0):
+    """CBOE delayed quotes JSON of legs given as (call_put, strike, days to expiry, quote fields)."""
+    options = []
+    for call_put, strike, days, fields in legs:
+        expiration = date.today() + timedelta(days=days)
+        option = dict.fromkeys(OPTION_LEG_FIELDS, 0.0)
+        option.update(option=f"SPY{expiration:%y%m%d}{call_put}{int(round(strike * 1000)):08d}", **fields)
+        options.append(option)
+    return {'data': {'options': options, 'close': close, 'current_price': close}}
+
+
+def test_missing_iv_is_only_filled_when_enabled():
+    payload = make_cboe_payload([('C', 100.0, 30, {'bid': 2.9, 'ask': 3.1, 'open_interest': 10.0}),
+                                 ('P', 100.0, 30, {'bid': 2.4, 'ask': 2.6, 'open_interest': 10.0})])
+    chain, _ = parse_cboe_options(payload, fill_iv=False)
+    assert chain['CallIV'][0] == 0 and 'iv_filled' not in chain.diagnostics
+
+    chain, _ = parse_cboe_options(payload, fill_iv=True, r=0.04, q=0.0)
+    assert chain.diagnostics['iv_filled'] == {'Call': 1, 'Put': 1}
+    T = get_days_till_exp(chain['ExpirationDate'], chain.asOf)[0]
+    for side, mid in (('Call', 3.0), ('Put', 2.5)):
+        price = calc_black_scholes(100.0, 100.0, T, chain[side + 'IV'][0], 0.04, 0.0, side == 'Put', ('price',))['price']
+        np.testing.assert_allclose(price, mid, rtol=1e-3)
+
+
+def make_option_chain(spot=100.0, num_strikes=61, num_expiries=4, seed=0):
+    """Paired chain of strikes 30% around spot on the next Fridays, with random quotes and greeks."""
+    rng = np.random.default_rng(seed)
+    fridays = pd.date_range(pd.Timestamp.today().normalize() + pd.Timedelta(days=1), periods=num_expiries, freq='W-FRI')
+    expirations = np.repeat((fridays + pd.Timedelta(hours=16)).to_numpy(), num_strikes)
+    strikes = np.tile(np.linspace(0.7 * spot, 1.3 * spot, num_strikes), num_expiries)
+    rows = len(strikes)
+    arrays = {'ExpirationDate': expirations, 'StrikePrice': strikes}
+    for side, flag in (('Call', 'C'), ('Put', 'P')):
+        arrays[side + 's'] = np.array([f"SPY{e:%y%m%d}{flag}{int(round(k * 1000)):08d}"
+                                       for e, k in zip(pd.DatetimeIndex(expirations), strikes)], dtype=object)
+        for field in ('LastSale', 'Net', 'Bid', 'Ask', 'Theo', 'Vega', 'Theta', 'Rho'):
+            arrays[side + field] = rng.uniform(0, 5, rows)
+        arrays[side + 'Vol'] = rng.integers(0, 500, rows).astype(np.float64)
+        arrays[side + 'OpenInt'] = rng.integers(0, 5000, rows).astype(np.float64)
+        arrays[side + 'IV'] = rng.uniform(0.1, 0.4, rows)
+        arrays[side + 'Delta'] = rng.uniform(0, 1, rows) * (1 if flag == 'C' else -1)
+        arrays[side + 'Gamma'] = rng.uniform(0, 0.05, rows)
+    return OptionChain(arrays, spot, spot)
+
+
+def modify_option_chain(chain, spot_move=0.5, seed=1):
+    """Next snapshot of chain: a few open interests, volumes and IVs change, a contract expires and spot moves."""
+    rng = np.random.default_rng(seed)
+    arrays = {name: values.copy() for name, values in chain.arrays.items()}
+    rows = rng.choice(len(chain), 12, replace=False)
+    arrays['CallOpenInt'][rows] += 100
+    arrays['PutVol'][rows[:6]] += 50
+    arrays['PutIV'][rows[6:]] *= 1.05
+    # The strongest put open interest below spot weakens, its wall has to be searched again
+    below = np.flatnonzero(arrays['StrikePrice'] < chain.spotPrice)
+    arrays['PutOpenInt'][below[np.argmax(arrays['PutOpenInt'][below])]] = 0
+    keep = np.ones(len(chain), dtype=bool)
+    keep[rows[0]] = False
+    arrays = {name: values[keep] for name, values in arrays.items()}
+    return OptionChain(arrays, chain.spotPrice + spot_move, chain.currentPrice + spot_move)
+
+
+def get_bucket_inputs(chain):
+    df = chain.to_frame(GEX_LEVEL_COLUMNS).sort_values(by=['ExpirationDate', 'StrikePrice'])
+    strikes = df['StrikePrice'].to_numpy()
+    window = (strikes >= 0.9 * chain.spotPrice) & (strikes <= 1.1 * chain.spotPrice)
+    return df, get_bucket_membership(df, window, list(BUCKET_SUFFIXES))
+
+
+def test_ladder_levels_stay_on_their_grid_when_spot_moves():
+    before = get_ladder_levels(0.9 * 5000, 1.1 * 5000)
+    after = get_ladder_levels(0.9 * 5000.5, 1.1 * 5000.5)
+    assert before[0] >= 4500 and before[-1] <= 5500 and len(before) >= 240
+    assert len(np.intersect1d(before, after)) >= len(before) - 1
+
+
+def test_incremental_surface_matches_full_on_modified_chain():
+    engine = IncrementalExposureSurface()
+    for chain in (make_option_chain(), modify_option_chain(make_option_chain())):
+        df, membership = get_bucket_inputs(chain)
+        levels = get_ladder_levels(0.9 * chain.spotPrice, 1.1 * chain.spotPrice)
+        curves = engine(df, levels, ('gamma', 'vanna'), membership=membership)
+    assert engine.stats['mode'] == 'incremental' and engine.stats['changed'] < len(df) // 4
+    expected = calc_exposure_surface(df, levels, ('gamma', 'vanna'), membership=membership)
+    for greek in ('gamma', 'vanna'):
+        np.testing.assert_allclose(curves[greek], expected[greek], rtol=1e-9, atol=1e-9 * np.abs(expected[greek]).max())
+    assert max(engine.verify(df, levels, ('gamma', 'vanna'), membership).values()) < 1e-9
+
+
+def test_incremental_aggregates_match_full_on_modified_chain():
+    engine = IncrementalBucketAggregates()
+    for chain in (make_option_chain(), modify_option_chain(make_option_chain())):
+        df, membership = get_bucket_inputs(chain)
+        sums, walls = engine(df, membership, chain.spotPrice)
+    assert engine.stats['mode'] == 'incremental' and engine.stats['walls_searched'] > 0
+    expected_sums, expected_walls = calc_bucket_aggregates(df, membership, chain.spotPrice)
+    for column, expected in expected_sums.items():
+        np.testing.assert_allclose(sums[column], expected, rtol=1e-12)
+    assert walls == expected_walls
+    errors = engine.verify(df, membership, chain.spotPrice)
+    assert errors['sums'] < 1e-12 and errors['walls'] == 0
+
+
+def test_incremental_levels_match_full_recompute():
+    engines = make_incremental_levels()
+    today = pd.Timestamp.now()
+    for chain in (make_option_chain(), modify_option_chain(make_option_chain())):
+        incremental, _ = calc_gex_levels('SPY', today, chain, chain_filter={}, **engines)
+    full, _ = calc_gex_levels('SPY', today, chain, chain_filter={})
+    assert engines['exposure'].stats['mode'] == 'incremental'
+    expected_ladder, expected_buckets = full.to_records()
+    ladder, buckets = incremental.to_records()
+    assert ladder == expected_ladder
+    for record, expected in zip(buckets, expected_buckets):
+        assert record.keys() == expected.keys()
+        for key, value in expected.items():
+            if isinstance(value, float):
+                np.testing.assert_allclose(record[key], value, rtol=1e-9)
+            else:
+                assert record[key] == value
+
+
+def test_level_records_are_plain_json():
+    ladder, buckets = get_level_records('SPY', make_option_chain())
+    assert len(ladder) == 1 and [record['expiration'] for record in buckets] == list(BUCKET_SUFFIXES)
+    # What a process pool worker sends back and the collector writes, without DataFrames or numpy scalars
+    json.dumps(ladder + buckets)
+
+
+def test_occ_symbols_decode_roots_of_any_length_and_decimal_strikes():
+    parsed = parse_occ_symbols(['SPXW241220C05000000', 'SPY250117P00412500', 'AAPL250620C00002500'])
+    assert parsed['valid'].all()
+    assert list(parsed['root']) == ['SPXW', 'SPY', 'AAPL']
+    np.testing.assert_array_equal(parsed['expiration'], np.array(['2024-12-20', '2025-01-17', '2025-06-20'],
+                                                                 dtype='datetime64[D]'))
+    assert list(parsed['call_put']) == ['C', 'P', 'C']
+    np.testing.assert_array_equal(parsed['strike'], [5000.0, 412.5, 2.5])
+
+
+def test_invalid_occ_symbols_are_flagged_without_breaking_the_batch():
+    # Too short, month 13, neither call nor put, a letter in the date, empty
+    invalid = ['SPX', 'SPXW241320C05000000', 'SPXW241220X05000000', 'SPXW2412A0C05000000', '']
+    parsed = parse_occ_symbols(['SPY250117P00412500'] + invalid)
+    assert list(parsed['valid']) == [True] + [False] * len(invalid)
+    assert np.isnat(parsed['expiration'][1:]).all() and np.isnan(parsed['strike'][1:]).all()
+    assert list(parsed['call_put'][1:]) == [''] * len(invalid)
+    assert parsed['strike'][0] == 412.5
+
+
+def make_option_legs(legs):
+    """Parsed CBOE legs as pair_option_legs gets them, legs being (root, expiration, strike, call_put, open_interest)."""
+    rows = []
+    for root, expiration, strike, call_put, open_interest in legs:
+        row = dict.fromkeys(OPTION_LEG_FIELDS, 1.0)
+        row.update(option=f"{root}{pd.Timestamp(expiration):%y%m%d}{call_put}{int(strike * 1000):08d}",
+                   open_interest=open_interest)
+        rows.append(dict(row, Root=root, ExpirationDate=pd.Timestamp(expiration), Strike=strike, CallPut=call_put))
+    return pd.DataFrame(rows)
+
+
+def test_unpaired_legs_are_kept_with_the_missing_side_zero_filled():
+    legs = make_option_legs([('SPY', '2026-01-16', 400.0, 'C', 10), ('SPY', '2026-01-16', 400.0, 'P', 20),
+                             ('SPY', '2026-01-16', 405.0, 'C', 30), ('SPY', '2026-01-16', 395.0, 'P', 40)])
+    df, diagnostics = pair_option_legs(legs)
+    assert list(df['StrikePrice']) == [395.0, 400.0, 405.0]
+    assert list(df['CallOpenInt']) == [0, 10, 30] and list(df['PutOpenInt']) == [40, 20, 0]
+    assert df['Calls'][0] == '' and df['Puts'][2] == ''
+    assert (df.loc[0, 'CallLastSale':'CallTheo'] == 0).all() and (df.loc[2, 'PutLastSale':'PutTheo'] == 0).all()
+    assert diagnostics == {'calls': 2, 'puts': 2, 'paired': 1, 'unmatched_calls': 1, 'unmatched_puts': 1,
+                           'duplicates': 0}
+
+
+def test_legs_pair_on_root_and_expiration_and_duplicates_keep_the_first():
+    legs = make_option_legs([('SPXW', '2026-01-16', 5000.0, 'C', 1), ('SPX', '2026-01-16', 5000.0, 'P', 2),
+                             ('SPXW', '2026-01-16', 5000.0, 'C', 3), ('SPXW', '2026-01-23', 5000.0, 'P', 4)])
+    df, diagnostics = pair_option_legs(legs)
+    # No contract shares root, expiration and strike with its other side: three rows with one leg each
+    assert len(df) == 3 and diagnostics['paired'] == 0 and diagnostics['duplicates'] == 1
+    assert list(df['CallOpenInt']) == [1, 0, 0] and list(df['PutOpenInt']) == [0, 4, 2]
+
+
+class FakeCboe:
+    """Stands in for requests.get: answers with the queued (status, payload, etag), recording the request headers."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def __call__(self, url, headers=None, timeout=None):
+        self.requests.append(headers)
+        status, payload, etag = self.responses.pop(0)
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(payload).encode()
+        response.headers['ETag'] = etag
+        return response
+
+
+def make_cache_payload(open_interest):
+    return make_cboe_payload([('C', 100.0, 30, {'open_interest': open_interest}),
+                              ('P', 100.0, 30, {'open_interest': open_interest})])
+
+
+def test_snapshot_cache_serves_fresh_snapshots_and_revalidates_stale_ones(monkeypatch):
+    cboe = FakeCboe((200, make_cache_payload(1.0), '"a"'), (304, None, '"a"'), (200, make_cache_payload(2.0), '"b"'))
+    monkeypatch.setattr(requests, 'get', cboe)
+    cache = CboeSnapshotCache(ttl=60)
+
+    chain, _ = cache.get('SPY')
+    assert cache.get('SPY')[0] is chain and len(cboe.requests) == 1
+
+    # Past the ttl the snapshot is revalidated with its ETag, a 304 keeps the parsed chain
+    cache.entries['SPY']['fetched_at'] -= 61
+    assert cache.get('SPY')[0] is chain
+    assert cboe.requests[1]['If-None-Match'] == '"a"' and cache.stats['not_modified'] == 1
+
+    cache.entries['SPY']['fetched_at'] -= 61
+    assert cache.get('SPY')[0]['CallOpenInt'][0] == 2.0
+    assert cache.stats == {'hits': 1, 'misses': 3, 'not_modified': 1, 'shared': 0}
+
+
+def test_concurrent_misses_share_one_request(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    cboe = FakeCboe((200, make_cache_payload(1.0), '"a"'))
+
+    def slow_get(*args, **kwargs):
+        started.set()
+        release.wait(5)
+        return cboe(*args, **kwargs)
+
+    monkeypatch.setattr(requests, 'get', slow_get)
+    cache = CboeSnapshotCache()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('SPY')[0])) for _ in range(3)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while cache.stats['shared'] < 2:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(cboe.requests) == 1 and len(results) == 3 and all(chain is results[0] for chain in results)
+
+
+def test_failed_request_is_not_cached(monkeypatch):
+    cboe = FakeCboe((500, {}, None), (200, make_cache_payload(1.0), '"a"'))
+    monkeypatch.setattr(requests, 'get', cboe)
+    cache = CboeSnapshotCache()
+    with pytest.raises(requests.HTTPError):
+        cache.get('SPY')
+    assert not cache.pending and 'SPY' not in cache.entries
+    assert cache.get('SPY')[0]['CallOpenInt'][0] == 1.0
+
+
+def make_log_records(start, count):
+    """One record a minute from minute start."""
+    return [{'processTime': f"2026-03-02 10:{minute:02d}:00", 'zero_gamma': float(minute)}
+            for minute in range(start, start + count)]
+
+
+def test_gex_log_rotates_into_indexed_segments(tmp_path):
+    fileName = str(tmp_path / 'SPY_flow_levels.jsonl')
+    for record in make_log_records(0, 40):
+        append_gex_log(fileName, [record], segment_bytes=200)
+    index = get_gex_log_index(fileName)
+    assert len(index) > 1
+    assert [entry['segment'] for entry in index] == [f"SPY_flow_levels-{n:06d}.jsonl" for n in range(1, len(index) + 1)]
+    assert all(previous['last'] < entry['first'] for previous, entry in zip(index, index[1:]))
+    assert sum(entry['records'] for entry in index) < 40
+
+    assert read_gex_log(fileName) == make_log_records(0, 40)
+    assert read_gex_log(fileName, '2026-03-02 10:10', '2026-03-02 10:19') == make_log_records(10, 10)
+
+
+def test_torn_last_line_is_skipped_and_the_log_keeps_appending(tmp_path):
+    fileName = str(tmp_path / 'SPY_flow_levels.jsonl')
+    append_gex_log(fileName, make_log_records(0, 3))
+    # A crash in the middle of the next append
+    with open(fileName, 'a') as f:
+        f.write('{"processTime": "2026-03-02 10:0')
+    assert read_gex_log(fileName) == make_log_records(0, 3)
+
+    append_gex_log(fileName, make_log_records(3, 2))
+    assert read_gex_log(fileName) == make_log_records(0, 5)
+
+
+def test_crash_between_indexing_and_renaming_a_segment_loses_nothing(tmp_path):
+    fileName = str(tmp_path / 'SPY_flow_levels.jsonl')
+    append_gex_log(fileName, make_log_records(0, 3))
+    # seal_gex_log_segment indexed the active segment, then crashed before renaming it
+    assert get_next_gex_log_segment(fileName, []) == str(tmp_path / 'SPY_flow_levels-000001.jsonl')
+    append_gex_log_index(fileName, {'segment': 'SPY_flow_levels-000001.jsonl', 'first': '2026-03-02 10:00:00',
+                                    'last': '2026-03-02 10:02:00', 'records': 3})
+    assert read_gex_log(fileName) == make_log_records(0, 3)
+
+    append_gex_log(fileName, make_log_records(3, 2), segment_bytes=1)
+    assert get_gex_log_index(fileName)[-1]['segment'] == 'SPY_flow_levels-000002.jsonl'
+    assert read_gex_log(fileName) == make_log_records(0, 5)
+
+
+def test_brent_zeros_agree_with_the_grid():
+    df, _ = get_bucket_inputs(make_option_chain())
+    for greek, grid_solver in (('gamma', find_zero_gamma_levels), ('vanna', find_zero_vanna_levels)):
+        zeros = find_exposure_zeros(df, 90.0, 110.0, greek, num_levels=LADDER_NUM_LEVELS)
+        step = zeros['levels'][1] - zeros['levels'][0]
+        assert abs(zeros['crossings'][0] - grid_solver(df, 90.0, 110.0)) < step
+        # Every crossing is a sign change of the exposure within one tick
+        exposure = get_exposure_function(df, greek)
+        assert all(exposure(c - 0.01) * exposure(c + 0.01) <= 0 for c in zeros['crossings'])
+
+
+def test_brent_bucket_zeros_match_the_grid_for_an_empty_bucket():
+    df, membership = get_bucket_inputs(make_option_chain())
+    buckets = {'All': membership[:, 0], 'Empty': np.zeros(len(df), dtype=bool)}
+    brent = get_bucket_exposure_zeros(df, buckets, 90.0, 110.0)
+    grid = get_bucket_greek_surfaces(df, buckets, 90.0, 110.0, ('gamma', 'vanna'))
+    assert brent['Empty']['zero_gamma'] is None and brent['Empty']['zero_vanna'] is None
+    assert grid['Empty']['zero_gamma'] is None and grid['Empty']['zero_vanna'] is None
+    # The grouped coarse grid refines the same brackets as a search on the bucket alone
+    assert brent['All']['zero_gamma'] == find_exposure_zeros(df, 90.0, 110.0, rows=buckets['All'])['crossings'][0]
+
+
+def make_cube_frame(rows=500, seed=0):
+    """Chain rows with repeated (strike, expiration) cells, NaNs and unsorted order."""
+    rng = np.random.default_rng(seed)
+    expirations = pd.to_datetime(['2026-01-16', '2026-01-09', '2026-02-20'])
+    df = pd.DataFrame({
+        'StrikePrice': rng.choice(np.arange(90.0, 110.5, 2.5), rows),
+        'ExpirationDate': rng.choice(expirations, rows),
+        'CallOpenInt': rng.integers(0, 100, rows).astype(np.float64),
+        'PutVol': rng.integers(0, 100, rows).astype(np.float64),
+    })
+    df.loc[rng.choice(rows, 20, replace=False), 'PutVol'] = np.nan
+    return df
+
+
+def test_exposure_cube_sums_match_a_pivot_table():
+    df = make_cube_frame()
+    cube = ExposureCube.from_chain(df, ('CallOpenInt', 'PutVol'))
+    for metric in ('CallOpenInt', 'PutVol'):
+        expected = df.pivot_table(index='StrikePrice', columns='ExpirationDate', values=metric, aggfunc='sum',
+                                  fill_value=0, dropna=False)
+        pd.testing.assert_frame_equal(cube.to_frame(metric), expected, check_names=False, check_freq=False)
+        np.testing.assert_allclose(cube.by_strike(metric), df.groupby('StrikePrice')[metric].sum().to_numpy())
+        np.testing.assert_allclose(cube[metric].sum(), df[metric].sum())
+
+
+def test_exposure_cube_slices():
+    df = make_cube_frame()
+    cube = ExposureCube.from_chain(df, ('CallOpenInt',))
+    january = df[df['ExpirationDate'] == '2026-01-16'].groupby('StrikePrice')['CallOpenInt'].sum()
+    np.testing.assert_allclose(cube.expiration('CallOpenInt', '2026-01-16'),
+                               january.reindex(cube.strikes, fill_value=0))
+    through_january = df[df['ExpirationDate'] <= '2026-01-16'].groupby('StrikePrice')['CallOpenInt'].sum()
+    np.testing.assert_allclose(cube.cumulative('CallOpenInt', '2026-01-16'),
+                               through_january.reindex(cube.strikes, fill_value=0))
+
+    strikes, band = cube.strike_band('CallOpenInt', 95.0, 100.0)
+    assert list(strikes) == [95.0, 97.5, 100.0] and band.shape == (3, 3)
+    with pytest.raises(KeyError):
+        cube.expiration('CallOpenInt', '2026-01-17')